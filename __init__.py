@@ -15,7 +15,7 @@ bl_info = {
 ########################## Divider ##########################
 from . import panel
 from .bone_tools import armature_replace, bone_and_vertex_groups, bone_pose, bone_edit
-from .attribute_tools import vertex_groups, shapekey, uv, vertex_colors, extra_object_info, face_bool
+from .attribute_tools import vertex_groups, shapekey, uv, vertex_colors, extra_object_info, face_bool, mapping_store, surface_map
 from .other_tools import misc, rename_tools
 from .material_tools import material, bake_node_groups, material_batch, material_snapshot
 
@@ -51,6 +51,8 @@ def register():
     bone_pose.register()
     bone_edit.register()
     armature_replace.register()
+    mapping_store.register()
+    surface_map.register()
     vertex_groups.register()
     shapekey.register()
     uv.register()
@@ -73,6 +75,8 @@ def unregister():
     bone_edit.unregister()
     armature_replace.unregister()
     vertex_groups.unregister()
+    surface_map.unregister()
+    mapping_store.unregister()
     shapekey.unregister()
     uv.unregister()
     vertex_colors.unregister()
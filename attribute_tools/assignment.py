@@ -0,0 +1,174 @@
+# type: ignore
+import numpy as np
+from mathutils.kdtree import KDTree
+from typing import Callable, List, Tuple
+
+# 匹配模式（供各匹配重命名操作符的 EnumProperty 使用）
+MATCH_MODE_ITEMS = [
+    ('OPTIMAL', "全局最优", "匈牙利/Jonker-Volgenant 算法求全局最优一一匹配"),
+    ('KDTREE', "KD树剪枝", "先用KD树筛选近邻候选，再按连通分量分别求最优匹配（适合500+组）"),
+    ('GREEDY', "贪婪", "按顺序为每一项选择剩余的最佳匹配（旧算法）"),
+]
+
+
+def linear_sum_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    线性分配问题（最小化总代价），最短增广路径版匈牙利算法 (Jonker-Volgenant)。
+    每一步对所有列的松弛与势能更新都是向量化的，复杂度 O(n² m)。
+    支持矩形矩阵，返回 (row_indices, col_indices)，按行索引升序。
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    # 使用 1 起始的索引，列 0 为虚拟列
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)    # p[j]: 分配到列 j 的行（0 表示未分配）
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            improve = free & (reduced < minv[1:])
+            minv[1:][improve] = reduced[improve]
+            way[1:][improve] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+
+        # 沿增广路径翻转
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.flatnonzero(p[1:])
+    rows = p[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def optimal_matches(similarity: np.ndarray, threshold: float) -> List[Tuple[int, int, float]]:
+    """
+    在相似度矩阵上求全局最优一一匹配（最大化相似度总和）。
+    低于阈值的配对视为不可匹配，返回 [(row, col, similarity)]。
+    """
+    if similarity.size == 0:
+        return []
+    valid = similarity >= threshold
+    cost = np.where(valid, -similarity, 0.0)
+    rows, cols = linear_sum_assignment(cost)
+    keep = valid[rows, cols]
+    return [(int(r), int(c), float(similarity[r, c])) for r, c in zip(rows[keep], cols[keep])]
+
+
+def greedy_matches(similarity: np.ndarray, threshold: float) -> List[Tuple[int, int, float]]:
+    """按行顺序贪婪匹配：每行取剩余列中满足阈值的最大相似度"""
+    matches: List[Tuple[int, int, float]] = []
+    if similarity.size == 0:
+        return matches
+    available = np.ones(similarity.shape[1], dtype=bool)
+    for row in range(similarity.shape[0]):
+        candidates = np.where(available & (similarity[row] >= threshold), similarity[row], -np.inf)
+        col = int(np.argmax(candidates))
+        if np.isfinite(candidates[col]):
+            available[col] = False
+            matches.append((row, col, float(similarity[row, col])))
+    return matches
+
+
+def kdtree_candidates(points_rows: np.ndarray, points_cols: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """用 KD 树为每一行查找 k 个最近的列，返回候选边 (rows, cols)"""
+    tree = KDTree(len(points_cols))
+    for j, co in enumerate(points_cols.tolist()):
+        tree.insert(co, j)
+    tree.balance()
+
+    k = max(1, min(k, len(points_cols)))
+    rows: List[int] = []
+    cols: List[int] = []
+    for i, co in enumerate(points_rows.tolist()):
+        for _co, j, _dist in tree.find_n(co, k):
+            rows.append(i)
+            cols.append(j)
+    return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+
+
+def _bipartite_components(rows: np.ndarray, cols: np.ndarray, n_rows: int, n_cols: int) -> np.ndarray:
+    """候选边构成的二部图的连通分量标签（行节点 0..n_rows-1，列节点随后）"""
+    labels = np.arange(n_rows + n_cols)
+    a = rows
+    b = cols + n_rows
+    # 迭代最小标签传播直至收敛
+    while True:
+        edge_min = np.minimum(labels[a], labels[b])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, a, edge_min)
+        np.minimum.at(new_labels, b, edge_min)
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def pruned_matches(points_rows: np.ndarray,
+                   points_cols: np.ndarray,
+                   pair_similarity: Callable[[np.ndarray, np.ndarray], np.ndarray],
+                   threshold: float,
+                   k: int = 8) -> List[Tuple[int, int, float]]:
+    """
+    KD 树剪枝的最优匹配：
+    1. 用 KD 树为每一行筛选 k 个近邻列作为候选
+    2. 只对候选边计算相似度（pair_similarity(rows, cols) → (E,)），并过滤阈值
+    3. 候选图按连通分量拆分，每个分量单独求最优分配
+    """
+    if len(points_rows) == 0 or len(points_cols) == 0:
+        return []
+    rows, cols = kdtree_candidates(points_rows, points_cols, k)
+    sims = pair_similarity(rows, cols)
+    keep = sims >= threshold
+    rows, cols, sims = rows[keep], cols[keep], sims[keep]
+    if len(rows) == 0:
+        return []
+
+    n_rows, n_cols = len(points_rows), len(points_cols)
+    labels = _bipartite_components(rows, cols, n_rows, n_cols)
+    edge_labels = labels[rows]
+
+    matches: List[Tuple[int, int, float]] = []
+    for label in np.unique(edge_labels):
+        in_comp = edge_labels == label
+        comp_rows, comp_cols, comp_sims = rows[in_comp], cols[in_comp], sims[in_comp]
+        row_ids, row_local = np.unique(comp_rows, return_inverse=True)
+        col_ids, col_local = np.unique(comp_cols, return_inverse=True)
+        sub = np.full((len(row_ids), len(col_ids)), -np.inf)
+        sub[row_local, col_local] = comp_sims
+        for r, c, sim in optimal_matches(sub, threshold):
+            matches.append((int(row_ids[r]), int(col_ids[c]), sim))
+
+    matches.sort()
+    return matches
@@ -0,0 +1,361 @@
+# type: ignore
+import bpy
+import os
+import json
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+from bpy.app.handlers import persistent
+from bpy_extras.io_utils import ExportHelper, ImportHelper
+
+# 映射记录以紧凑的 JSON 字符串存储在 item.data 中：[[left, right, similarity], ...]
+# 解码结果与名称索引按字符串缓存，查找为 O(1)
+
+PAGE_SIZE = 20
+
+# 场景属性名 → 映射库 JSON 中的键
+MAPPING_KINDS = {
+    'VERTEX_GROUP': ('xqfa_vertex_group_mappings', 'vertex_group_mappings'),
+    'SHAPE_KEY': ('xqfa_shape_key_mappings', 'shape_key_mappings'),
+}
+
+LIBRARY_VERSION = 1
+
+Pair = Tuple[str, str, str]
+
+
+@lru_cache(maxsize=128)
+def _decode(blob: str) -> Tuple[Pair, ...]:
+    if not blob:
+        return ()
+    return tuple((str(l), str(r), str(s)) for l, r, s in json.loads(blob))
+
+
+@lru_cache(maxsize=128)
+def _lookup(blob: str, direction: str) -> Dict[str, str]:
+    pairs = _decode(blob)
+    if direction == "LEFT_TO_RIGHT":
+        return {l: r for l, r, _s in pairs}
+    return {r: l for l, r, _s in pairs}
+
+
+def encode_pairs(pairs) -> str:
+    """(left, right, similarity) 列表 → 紧凑 JSON 字符串"""
+    return json.dumps([[l, r, s] for l, r, s in pairs], ensure_ascii=False, separators=(',', ':'))
+
+
+def _legacy_pairs(item) -> List[Pair]:
+    """读取旧版本以 CollectionProperty 存储的 pairs（仍保存在 ID 属性中）"""
+    legacy = item.get('pairs')
+    if not legacy:
+        return []
+    return [(p.get('left_name', ''), p.get('right_name', ''), p.get('similarity', '')) for p in legacy]
+
+
+def set_pairs(item, pairs) -> None:
+    """写入映射记录"""
+    pairs = list(pairs)
+    item.data = encode_pairs(pairs)
+    item.count = len(pairs)
+
+
+def get_pairs(item) -> Tuple[Pair, ...]:
+    """读取映射记录（缓存）"""
+    if not item.data and 'pairs' in item:
+        return tuple(_legacy_pairs(item))
+    return _decode(item.data)
+
+
+def get_lookup(item, direction: str) -> Dict[str, str]:
+    """旧名称 → 新名称 的字典索引。direction: LEFT_TO_RIGHT / RIGHT_TO_LEFT"""
+    if not item.data and 'pairs' in item:
+        pairs = _legacy_pairs(item)
+        if direction == "LEFT_TO_RIGHT":
+            return {l: r for l, r, _s in pairs}
+        return {r: l for l, r, _s in pairs}
+    return _lookup(item.data, direction)
+
+
+def get_order(item, side: str) -> List[str]:
+    """按映射记录顺序返回左侧 (LEFT) 或右侧 (RIGHT) 的名称列表"""
+    column = 0 if side == "LEFT" else 1
+    return [pair[column] for pair in get_pairs(item)]
+
+
+def migrate_legacy_mappings(scene) -> int:
+    """把旧版 pairs 集合转换为紧凑存储，返回转换的记录数"""
+    migrated = 0
+    for scene_prop, _key in MAPPING_KINDS.values():
+        mappings = getattr(scene, scene_prop, None)
+        if mappings is None:
+            continue
+        for item in mappings:
+            if 'pairs' not in item:
+                continue
+            if not item.data:
+                set_pairs(item, _legacy_pairs(item))
+            del item['pairs']
+            migrated += 1
+    return migrated
+
+
+TEMP_NAME_PREFIX = "__xqfa_tmp_"
+
+
+def plan_renames(current_names: List[str], lookup: Dict[str, str]) -> Dict[str, Any]:
+    """
+    根据 名称→索引 表一次性计算某个集合（顶点组/形态键）的全部重命名。
+    返回:
+    - renames:   [(index, old_name, new_name)] 需要执行的重命名
+    - unchanged: 映射目标与原名相同的数量
+    - conflicts: [(old_name, new_name)] 目标名称被保留原名的项（未参与重命名或自身冲突）占用，或多个项映射到同一目标
+    - missing:   映射中在该集合里找不到的数量
+    """
+    name_to_index = {name: i for i, name in enumerate(current_names)}
+    conflicts: List[Tuple[str, str]] = []
+    unchanged = 0
+
+    candidates = []
+    for old_name, new_name in lookup.items():
+        index = name_to_index.get(old_name)
+        if index is None:
+            continue
+        if old_name == new_name:
+            unchanged += 1
+            continue
+        candidates.append((index, old_name, new_name))
+
+    # 反复检查直到不再有新的冲突：冲突项保留原名，会占用其原名称，
+    # 以它为目标的其它重命名在下一轮也成为冲突
+    active = candidates
+    while True:
+        renamed_sources = {old_name for _i, old_name, _n in active}
+        # 重命名后仍保留原名的项（未参与重命名或冲突）会占用名称
+        occupied = {name for name in current_names if name not in renamed_sources}
+        accepted = []
+        rejected = []
+        for index, old_name, new_name in active:
+            if new_name in occupied:
+                rejected.append((old_name, new_name))
+                continue
+            occupied.add(new_name)
+            accepted.append((index, old_name, new_name))
+        active = accepted
+        if not rejected:
+            break
+        conflicts.extend(rejected)
+    renames = active
+
+    matched = len(candidates) + unchanged
+    return {
+        'renames': renames,
+        'unchanged': unchanged,
+        'conflicts': conflicts,
+        'missing': len(lookup) - matched,
+    }
+
+
+def apply_renames(collection, renames: List[Tuple[int, str, str]]) -> int:
+    """
+    两阶段重命名，避免 A↔B 互换等情况下 Blender 自动追加 .001：
+    1. 全部改为临时名称
+    2. 再改为最终名称
+    collection 为支持按索引访问且元素有 name 属性的集合（顶点组、形态键）。
+    """
+    items = [collection[index] for index, _old, _new in renames]
+    for i, item in enumerate(items):
+        item.name = f"{TEMP_NAME_PREFIX}{i}"
+    for item, (_index, _old, new_name) in zip(items, renames):
+        item.name = new_name
+    return len(items)
+
+
+def format_rename_summary(summaries: List[Dict[str, Any]]) -> List[str]:
+    """每个物体一行的重命名汇总"""
+    lines = []
+    for s in summaries:
+        line = f"{s['object']}: 重命名 {s['renamed']}, 未变 {s['unchanged']}, 缺失 {s['missing']}"
+        if s['conflicts']:
+            line += f", 冲突 {len(s['conflicts'])}"
+        lines.append(line)
+    return lines
+
+
+def apply_mapping_to_objects(objects, get_collection: Callable[[Any], Any],
+                             lookup: Dict[str, str], label: str) -> Tuple[str, str]:
+    """
+    先为所有物体计算重命名计划，再统一执行两阶段重命名，打印每个物体的结果（含冲突明细）。
+    get_collection(obj) 返回要重命名的集合（顶点组、形态键），label 用于打印标题。
+    返回 (报告级别, 报告信息)。
+    """
+    plans = []
+    for obj in objects:
+        collection = get_collection(obj)
+        plans.append((obj, collection, plan_renames([entry.name for entry in collection], lookup)))
+
+    summaries = []
+    for obj, collection, plan in plans:
+        renamed = apply_renames(collection, plan['renames'])
+        summaries.append({
+            'object': obj.name,
+            'renamed': renamed,
+            'unchanged': plan['unchanged'],
+            'missing': plan['missing'],
+            'conflicts': plan['conflicts'],
+        })
+
+    lines = format_rename_summary(summaries)
+    print(f"\n{label}映射应用结果 ({len(objects)} 个物体):")
+    for line, summary in zip(lines, summaries):
+        print(f"  {line}")
+        for old_name, new_name in summary['conflicts']:
+            print(f"    ✕ {old_name} → {new_name} (目标名称已被占用)")
+
+    affected_objs = sum(1 for s in summaries if s['renamed'] > 0)
+    total_conflicts = sum(len(s['conflicts']) for s in summaries)
+    detail = "; ".join(lines)
+    level = 'WARNING' if total_conflicts else 'INFO'
+    return level, f"影响 {affected_objs}/{len(objects)} 个物体 ({detail})"
+
+
+@persistent
+def _on_load_post(dummy):
+    """文件加载后转换旧版映射记录"""
+    for scene in bpy.data.scenes:
+        migrate_legacy_mappings(scene)
+
+
+def draw_pairs(layout, item) -> None:
+    """分页绘制映射记录（代替 template_list，避免为每条记录创建 RNA 项）"""
+    pairs = get_pairs(item)
+    page_count = max(1, (len(pairs) + PAGE_SIZE - 1) // PAGE_SIZE)
+    page = min(item.page, page_count - 1)
+
+    col = layout.column(align=True)
+    for left, right, _similarity in pairs[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]:
+        row = col.row(align=True)
+        row.label(text=left)
+        row.label(text="↔")
+        row.label(text=right)
+
+    if page_count > 1:
+        row = layout.row(align=True)
+        row.prop(item, "page", text=f"页 (共 {page_count})")
+
+
+def draw_library_buttons(layout, kind: str) -> None:
+    """绘制映射库的导入/导出按钮"""
+    op = layout.operator(O_MappingLibraryImport.bl_idname, text="", icon="IMPORT")
+    op.kind = kind
+    op = layout.operator(O_MappingLibraryExport.bl_idname, text="", icon="EXPORT")
+    op.kind = kind
+
+
+def _kinds(kind: str) -> List[str]:
+    return list(MAPPING_KINDS.keys()) if kind == 'ALL' else [kind]
+
+
+KIND_ITEMS = [
+    ('ALL', "全部", "顶点组与形态键映射"),
+    ('VERTEX_GROUP', "顶点组", "仅顶点组映射"),
+    ('SHAPE_KEY', "形态键", "仅形态键映射"),
+]
+
+
+class O_MappingLibraryExport(bpy.types.Operator, ExportHelper):
+    bl_idname = "xqfa.mapping_library_export"
+    bl_label = "导出映射库"
+    bl_description = "将当前场景的映射记录导出为 JSON 映射库文件"
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(
+        default="*.json",
+        options={'HIDDEN'},
+    )
+
+    kind: bpy.props.EnumProperty(name="类型", items=KIND_ITEMS, default='ALL')
+
+    def execute(self, context):
+        scene = context.scene
+        library = {'version': LIBRARY_VERSION}
+        total = 0
+        for kind in _kinds(self.kind):
+            scene_prop, key = MAPPING_KINDS[kind]
+            mappings = getattr(scene, scene_prop, None)
+            if mappings is None:
+                continue
+            library[key] = [
+                {'label': item.label, 'pairs': [list(p) for p in get_pairs(item)]}
+                for item in mappings
+            ]
+            total += len(mappings)
+
+        try:
+            with open(self.filepath, 'w', encoding='utf-8') as f:
+                json.dump(library, f, ensure_ascii=False, indent=1)
+        except Exception as e:
+            self.report({'ERROR'}, f"导出映射库失败: {e}")
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, f"已导出 {total} 条映射记录: {self.filepath}")
+        return {'FINISHED'}
+
+
+class O_MappingLibraryImport(bpy.types.Operator, ImportHelper):
+    bl_idname = "xqfa.mapping_library_import"
+    bl_label = "导入映射库"
+    bl_description = "从 JSON 映射库文件导入映射记录（追加到当前场景）"
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(
+        default="*.json",
+        options={'HIDDEN'},
+    )
+
+    kind: bpy.props.EnumProperty(name="类型", items=KIND_ITEMS, default='ALL')
+
+    def execute(self, context):
+        if not self.filepath or not os.path.exists(self.filepath):
+            self.report({'ERROR'}, "请选择有效的映射库文件")
+            return {'CANCELLED'}
+
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                library = json.load(f)
+        except Exception as e:
+            self.report({'ERROR'}, f"读取映射库失败: {e}")
+            return {'CANCELLED'}
+
+        scene = context.scene
+        total = 0
+        for kind in _kinds(self.kind):
+            scene_prop, key = MAPPING_KINDS[kind]
+            mappings = getattr(scene, scene_prop, None)
+            if mappings is None:
+                continue
+            for record in library.get(key, []):
+                item = mappings.add()
+                item.label = record.get('label', '') or f"映射 {len(mappings)}"
+                item.expanded = False
+                set_pairs(item, ((p[0], p[1], p[2] if len(p) > 2 else "") for p in record.get('pairs', [])))
+                total += 1
+
+        self.report({'INFO'}, f"已导入 {total} 条映射记录")
+        return {'FINISHED'}
+
+
+classes = (
+    O_MappingLibraryExport,
+    O_MappingLibraryImport,
+)
+
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+    if _on_load_post not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(_on_load_post)
+
+
+def unregister():
+    if _on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_on_load_post)
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
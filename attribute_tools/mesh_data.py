@@ -0,0 +1,676 @@
+# type: ignore
+import bpy
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from .weight_matrix import VertexWeightMatrix, add_group_weights, expand_ranges
+from .assignment import optimal_matches
+
+# 直接在网格数据层合并/分离物体：用 foreach_get 读取缓冲区，在 NumPy 中拼接或取子集，
+# 再用 foreach_set 一次性写入新网格。不经过 bpy.ops，不改变选择与活动物体。
+
+# 通用属性的读写格式：data_type → (foreach 属性名, 分量数, dtype)
+ATTRIBUTE_FORMATS = {
+    'FLOAT': ('value', 1, np.float32),
+    'INT': ('value', 1, np.int32),
+    'INT8': ('value', 1, np.int32),
+    'BOOLEAN': ('value', 1, bool),
+    'FLOAT2': ('vector', 2, np.float32),
+    'INT16_2D': ('value', 2, np.int32),
+    'INT32_2D': ('value', 2, np.int32),
+    'FLOAT_VECTOR': ('vector', 3, np.float32),
+    'FLOAT_COLOR': ('color', 4, np.float32),
+    'BYTE_COLOR': ('color_srgb', 4, np.float32),   # 按存储的 sRGB 值读写，避免线性转换的精度损失
+    'QUATERNION': ('value', 4, np.float32),
+}
+
+# 单独处理的内置属性（其余以 "." 开头的内部属性不复制）
+SKIPPED_ATTRIBUTES = {'position', 'material_index', 'custom_normal'}
+
+# 形态键需要保留的属性
+SHAPE_KEY_PROPS = ('slider_min', 'slider_max', 'value', 'vertex_group', 'mute', 'lock_shape', 'interpolation')
+
+
+def _transform_points(co: np.ndarray, matrix: Optional[np.ndarray]) -> np.ndarray:
+    if matrix is None:
+        return co
+    return (co @ matrix[:3, :3].T + matrix[:3, 3]).astype(np.float32)
+
+
+def _transform_normals(normals: np.ndarray, matrix: Optional[np.ndarray]) -> np.ndarray:
+    if matrix is None:
+        return normals
+    normal_matrix = np.linalg.inv(matrix[:3, :3]).T
+    result = normals @ normal_matrix.T
+    lengths = np.linalg.norm(result, axis=1, keepdims=True)
+    return (result / np.maximum(lengths, 1e-12)).astype(np.float32)
+
+
+class MeshBuffers:
+    """
+    网格数据缓冲区（全部为 NumPy 数组）：
+    - co (V,3)、edges (E,2)、edge_seams (E,)
+    - corner_verts / corner_edges (L,)、face_starts / face_sizes / material_index (P,)
+    - attributes: 名称 → (domain, data_type, (N, C) 数组)
+    - corner_normals (L,3) 拐角法线，has_custom_normals 为 True 时作为自定义法线写回
+    - weights: VertexWeightMatrix，group_locks 为各组的锁定状态
+    - shape_keys: [{'name', 'co', 'relative_key', 及 SHAPE_KEY_PROPS}]，第一个为基础形态键
+    """
+
+    def __init__(self):
+        self.co = np.zeros((0, 3), dtype=np.float32)
+        self.edges = np.zeros((0, 2), dtype=np.int32)
+        self.edge_seams = np.zeros(0, dtype=bool)
+        self.corner_verts = np.zeros(0, dtype=np.int32)
+        self.corner_edges = np.zeros(0, dtype=np.int32)
+        self.face_starts = np.zeros(0, dtype=np.int32)
+        self.face_sizes = np.zeros(0, dtype=np.int32)
+        self.material_index = np.zeros(0, dtype=np.int32)
+        self.materials: List[Optional[bpy.types.Material]] = []
+        self.attributes: Dict[str, Tuple[str, str, np.ndarray]] = {}
+        self.corner_normals = np.zeros((0, 3), dtype=np.float32)
+        self.has_custom_normals = False
+        self.weights = VertexWeightMatrix(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                                          np.zeros(0, dtype=np.float32), [])
+        self.group_locks: Dict[str, bool] = {}
+        self.shape_keys: List[Dict[str, any]] = []
+        self.active_uv: Optional[str] = None
+        self.render_uv: Optional[str] = None
+        self.active_color: Optional[str] = None
+        self.default_color: Optional[str] = None
+
+    @property
+    def num_verts(self) -> int:
+        return len(self.co)
+
+    def domain_size(self, domain: str) -> int:
+        return {
+            'POINT': len(self.co),
+            'EDGE': len(self.edges),
+            'FACE': len(self.face_starts),
+            'CORNER': len(self.corner_verts),
+        }.get(domain, 0)
+
+    @classmethod
+    def from_object(cls, obj: bpy.types.Object, matrix: Optional[np.ndarray] = None) -> "MeshBuffers":
+        """
+        读取物体的网格数据。matrix 为 4x4 变换（如变换到另一物体的局部空间），
+        作用于顶点、形态键坐标与自定义法线。
+        """
+        mesh = obj.data
+        buf = cls()
+        num_verts = len(mesh.vertices)
+        num_edges = len(mesh.edges)
+        num_loops = len(mesh.loops)
+        num_faces = len(mesh.polygons)
+
+        co = np.empty(num_verts * 3, dtype=np.float32)
+        mesh.vertices.foreach_get('co', co)
+        buf.co = _transform_points(co.reshape(-1, 3), matrix)
+
+        edges = np.empty(num_edges * 2, dtype=np.int32)
+        mesh.edges.foreach_get('vertices', edges)
+        buf.edges = edges.reshape(-1, 2)
+        buf.edge_seams = np.empty(num_edges, dtype=bool)
+        mesh.edges.foreach_get('use_seam', buf.edge_seams)
+
+        buf.corner_verts = np.empty(num_loops, dtype=np.int32)
+        mesh.loops.foreach_get('vertex_index', buf.corner_verts)
+        buf.corner_edges = np.empty(num_loops, dtype=np.int32)
+        mesh.loops.foreach_get('edge_index', buf.corner_edges)
+
+        buf.face_starts = np.empty(num_faces, dtype=np.int32)
+        mesh.polygons.foreach_get('loop_start', buf.face_starts)
+        buf.face_sizes = np.empty(num_faces, dtype=np.int32)
+        mesh.polygons.foreach_get('loop_total', buf.face_sizes)
+        buf.material_index = np.empty(num_faces, dtype=np.int32)
+        mesh.polygons.foreach_get('material_index', buf.material_index)
+        buf.materials = list(mesh.materials)
+
+        for attr in mesh.attributes:
+            name = attr.name
+            if name.startswith('.') or name in SKIPPED_ATTRIBUTES:
+                continue
+            fmt = ATTRIBUTE_FORMATS.get(attr.data_type)
+            if fmt is None:
+                continue
+            prop, components, dtype = fmt
+            data = np.empty(len(attr.data) * components, dtype=dtype)
+            attr.data.foreach_get(prop, data)
+            buf.attributes[name] = (attr.domain, attr.data_type, data.reshape(-1, components))
+
+        buf.has_custom_normals = mesh.has_custom_normals
+        normals = np.empty(num_loops * 3, dtype=np.float32)
+        mesh.corner_normals.foreach_get('vector', normals)
+        buf.corner_normals = _transform_normals(normals.reshape(-1, 3), matrix)
+
+        if mesh.uv_layers.active:
+            buf.active_uv = mesh.uv_layers.active.name
+        buf.render_uv = next((uv.name for uv in mesh.uv_layers if uv.active_render), None)
+        buf.active_color = mesh.color_attributes.active_color_name or None
+        buf.default_color = mesh.color_attributes.default_color_name or None
+
+        buf.weights = VertexWeightMatrix.from_object(obj)
+        buf.group_locks = {vg.name: vg.lock_weight for vg in obj.vertex_groups}
+
+        if mesh.shape_keys:
+            for kb in mesh.shape_keys.key_blocks:
+                key_co = np.empty(num_verts * 3, dtype=np.float32)
+                kb.data.foreach_get('co', key_co)
+                key = {
+                    'name': kb.name,
+                    'co': _transform_points(key_co.reshape(-1, 3), matrix),
+                    'relative_key': kb.relative_key.name,
+                }
+                for prop in SHAPE_KEY_PROPS:
+                    key[prop] = getattr(kb, prop)
+                buf.shape_keys.append(key)
+        return buf
+
+    @classmethod
+    def concatenate(cls, parts: List["MeshBuffers"]) -> "MeshBuffers":
+        """按顺序拼接多个网格（等同 join）：材质、属性、顶点组、形态键按名称合并"""
+        buf = cls()
+        vert_offsets = np.cumsum([0] + [p.num_verts for p in parts])
+        edge_offsets = np.cumsum([0] + [len(p.edges) for p in parts])
+        loop_offsets = np.cumsum([0] + [len(p.corner_verts) for p in parts])
+
+        buf.co = np.concatenate([p.co for p in parts])
+        buf.edges = np.concatenate([p.edges + vert_offsets[i] for i, p in enumerate(parts)]).astype(np.int32)
+        buf.edge_seams = np.concatenate([p.edge_seams for p in parts])
+        buf.corner_verts = np.concatenate([p.corner_verts + vert_offsets[i] for i, p in enumerate(parts)]).astype(np.int32)
+        buf.corner_edges = np.concatenate([p.corner_edges + edge_offsets[i] for i, p in enumerate(parts)]).astype(np.int32)
+        buf.face_starts = np.concatenate([p.face_starts + loop_offsets[i] for i, p in enumerate(parts)]).astype(np.int32)
+        buf.face_sizes = np.concatenate([p.face_sizes for p in parts])
+        buf.corner_normals = np.concatenate([p.corner_normals for p in parts])
+        buf.has_custom_normals = any(p.has_custom_normals for p in parts)
+
+        # 材质槽：按材质合并，各部分的 material_index 重映射到合并后的槽
+        material_slots: List[Optional[bpy.types.Material]] = []
+        index_parts = []
+        for p in parts:
+            slot_map = []
+            for mat in p.materials:
+                if mat not in material_slots:
+                    material_slots.append(mat)
+                slot_map.append(material_slots.index(mat))
+            if slot_map:
+                slot_map = np.array(slot_map, dtype=np.int32)
+                index_parts.append(slot_map[np.clip(p.material_index, 0, len(slot_map) - 1)])
+            else:
+                index_parts.append(np.zeros_like(p.material_index))
+        buf.materials = material_slots
+        buf.material_index = np.concatenate(index_parts).astype(np.int32)
+
+        # 通用属性：以第一次出现的域与类型为准，缺失或类型不符的部分填 0
+        for p in parts:
+            for name, (domain, data_type, _data) in p.attributes.items():
+                if name in buf.attributes:
+                    continue
+                components = ATTRIBUTE_FORMATS[data_type][1]
+                dtype = ATTRIBUTE_FORMATS[data_type][2]
+                chunks = []
+                for q in parts:
+                    entry = q.attributes.get(name)
+                    if entry and entry[0] == domain and entry[1] == data_type:
+                        chunks.append(entry[2])
+                    else:
+                        chunks.append(np.zeros((q.domain_size(domain), components), dtype=dtype))
+                buf.attributes[name] = (domain, data_type, np.concatenate(chunks))
+
+        first = next((p for p in parts if p.active_uv), None)
+        buf.active_uv = first.active_uv if first else None
+        first = next((p for p in parts if p.render_uv), None)
+        buf.render_uv = first.render_uv if first else None
+        first = next((p for p in parts if p.active_color), None)
+        buf.active_color = first.active_color if first else None
+        first = next((p for p in parts if p.default_color), None)
+        buf.default_color = first.default_color if first else None
+
+        buf.weights = VertexWeightMatrix.concatenate([p.weights for p in parts])
+        for p in parts:
+            for name, locked in p.group_locks.items():
+                buf.group_locks[name] = buf.group_locks.get(name, False) or locked
+
+        buf.shape_keys = cls._concatenate_shape_keys(parts)
+        return buf
+
+    @staticmethod
+    def _concatenate_shape_keys(parts: List["MeshBuffers"]) -> List[Dict[str, any]]:
+        """合并形态键：各部分的基础形态键合并为一个，缺少某形态键的部分使用自身的基础坐标"""
+        keyed = [p for p in parts if p.shape_keys]
+        if not keyed:
+            return []
+        basis_name = keyed[0].shape_keys[0]['name']
+
+        keys: List[Dict[str, any]] = []
+        key_index: Dict[str, int] = {}
+        for p in keyed:
+            part_basis = p.shape_keys[0]['name']
+            for i, key in enumerate(p.shape_keys):
+                name = basis_name if i == 0 else key['name']
+                if name in key_index:
+                    continue
+                key_index[name] = len(keys)
+                merged = dict(key)
+                merged['name'] = name
+                if key['relative_key'] == part_basis:
+                    merged['relative_key'] = basis_name
+                keys.append(merged)
+
+        for key in keys:
+            chunks = []
+            for p in parts:
+                part_keys = {k['name']: k for k in p.shape_keys[1:]}
+                if key['name'] == basis_name and p.shape_keys:
+                    chunks.append(p.shape_keys[0]['co'])
+                elif key['name'] in part_keys:
+                    chunks.append(part_keys[key['name']]['co'])
+                else:
+                    chunks.append(p.co)
+            key['co'] = np.concatenate(chunks)
+        return keys
+
+    def subset(self, face_mask: np.ndarray) -> "MeshBuffers":
+        """取面子集（以及这些面用到的顶点、边、拐角），保留全部材质槽"""
+        buf = MeshBuffers()
+        faces = np.flatnonzero(face_mask)
+        loops = expand_ranges(self.face_starts[faces], self.face_sizes[faces])
+
+        verts = np.unique(self.corner_verts[loops])
+        edges = np.unique(self.corner_edges[loops])
+        vert_map = np.full(self.num_verts, -1, dtype=np.int32)
+        vert_map[verts] = np.arange(len(verts), dtype=np.int32)
+        edge_map = np.full(len(self.edges), -1, dtype=np.int32)
+        edge_map[edges] = np.arange(len(edges), dtype=np.int32)
+
+        buf.co = self.co[verts]
+        buf.edges = vert_map[self.edges[edges]]
+        buf.edge_seams = self.edge_seams[edges]
+        buf.corner_verts = vert_map[self.corner_verts[loops]]
+        buf.corner_edges = edge_map[self.corner_edges[loops]]
+        buf.face_sizes = self.face_sizes[faces]
+        buf.face_starts = (np.cumsum(buf.face_sizes) - buf.face_sizes).astype(np.int32)
+        buf.material_index = self.material_index[faces]
+        buf.materials = list(self.materials)
+        buf.corner_normals = self.corner_normals[loops]
+        buf.has_custom_normals = self.has_custom_normals
+
+        selection = {'POINT': verts, 'EDGE': edges, 'FACE': faces, 'CORNER': loops}
+        for name, (domain, data_type, data) in self.attributes.items():
+            if domain in selection:
+                buf.attributes[name] = (domain, data_type, data[selection[domain]])
+
+        buf.active_uv = self.active_uv
+        buf.render_uv = self.render_uv
+        buf.active_color = self.active_color
+        buf.default_color = self.default_color
+
+        buf.weights = self.weights.select_vertices(verts)
+        buf.group_locks = dict(self.group_locks)
+        buf.shape_keys = [dict(key, co=key['co'][verts]) for key in self.shape_keys]
+        return buf
+
+    def to_mesh(self, name: str) -> bpy.types.Mesh:
+        """一次性创建新的网格数据块（顶点组与形态键属于物体层，见 write_object_data）"""
+        mesh = bpy.data.meshes.new(name)
+        mesh.vertices.add(len(self.co))
+        mesh.vertices.foreach_set('co', self.co.ravel())
+        mesh.edges.add(len(self.edges))
+        mesh.edges.foreach_set('vertices', self.edges.ravel())
+        mesh.edges.foreach_set('use_seam', self.edge_seams)
+        mesh.loops.add(len(self.corner_verts))
+        mesh.loops.foreach_set('vertex_index', self.corner_verts)
+        mesh.loops.foreach_set('edge_index', self.corner_edges)
+        mesh.polygons.add(len(self.face_starts))
+        mesh.polygons.foreach_set('loop_start', self.face_starts)
+        mesh.polygons.foreach_set('material_index', self.material_index)
+
+        for mat in self.materials:
+            mesh.materials.append(mat)
+
+        for attr_name, (domain, data_type, data) in self.attributes.items():
+            attr = mesh.attributes.get(attr_name)
+            if attr is None or attr.domain != domain or attr.data_type != data_type:
+                attr = mesh.attributes.new(attr_name, data_type, domain)
+            attr.data.foreach_set(ATTRIBUTE_FORMATS[data_type][0], data.ravel())
+
+        if self.active_uv and self.active_uv in mesh.uv_layers:
+            mesh.uv_layers.active = mesh.uv_layers[self.active_uv]
+        if self.render_uv and self.render_uv in mesh.uv_layers:
+            mesh.uv_layers[self.render_uv].active_render = True
+        if self.active_color and self.active_color in mesh.color_attributes:
+            mesh.color_attributes.active_color_name = self.active_color
+        if self.default_color and self.default_color in mesh.color_attributes:
+            mesh.color_attributes.default_color_name = self.default_color
+
+        mesh.update()
+        if self.has_custom_normals:
+            mesh.normals_split_custom_set(self.corner_normals)
+        return mesh
+
+    def write_object_data(self, obj: bpy.types.Object) -> int:
+        """在物体上重建顶点组与形态键（物体需已使用 to_mesh 生成的网格），返回 vg.add 调用次数"""
+        add_calls = 0
+        vgroups = obj.vertex_groups
+        for g, name in enumerate(self.weights.group_names):
+            vg = vgroups.new(name=name)
+            verts, weights = self.weights.group_entries(g)
+            add_calls += add_group_weights(vg, verts, weights)
+            if self.group_locks.get(name):
+                vg.lock_weight = True
+
+        if self.shape_keys:
+            key_blocks = []
+            for key in self.shape_keys:
+                kb = obj.shape_key_add(name=key['name'], from_mix=False)
+                kb.data.foreach_set('co', key['co'].ravel())
+                for prop in SHAPE_KEY_PROPS:
+                    setattr(kb, prop, key[prop])
+                key_blocks.append(kb)
+            blocks = obj.data.shape_keys.key_blocks
+            for kb, key in zip(key_blocks, self.shape_keys):
+                relative = blocks.get(key['relative_key'])
+                if relative is not None:
+                    kb.relative_key = relative
+        return add_calls
+
+
+def _relative_matrix(target: bpy.types.Object, obj: bpy.types.Object) -> Optional[np.ndarray]:
+    """obj 局部空间 → target 局部空间的 4x4 矩阵；两者相同时返回 None"""
+    if obj == target:
+        return None
+    return np.array(target.matrix_world.inverted_safe() @ obj.matrix_world)
+
+
+def remove_objects(objects: List[bpy.types.Object]) -> None:
+    """删除物体（包括未链接到场景的临时物体），并删除不再被使用的网格"""
+    objects = list(objects)
+    meshes = {obj.data for obj in objects if obj.type == 'MESH'}
+    for obj in objects:
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in meshes:
+        if mesh.users == 0:
+            bpy.data.meshes.remove(mesh)
+
+
+def _copy_id_properties(source, target) -> None:
+    """复制 ID 的自定义属性"""
+    for name, value in source.items():
+        target[name] = value.to_dict() if hasattr(value, 'to_dict') else value
+
+
+def _copy_animation_data(source, target) -> None:
+    """复制 ID 的动作（含动作槽）与驱动器；数据路径按名称引用形态键时在新数据块上依然有效"""
+    anim = source.animation_data
+    if anim is None:
+        return
+    new_anim = target.animation_data or target.animation_data_create()
+    new_anim.action = anim.action
+    if anim.action is not None and hasattr(anim, 'action_slot'):
+        new_anim.action_slot = anim.action_slot
+    for fcurve in anim.drivers:
+        new_anim.drivers.from_existing(src_driver=fcurve)
+
+
+def _retarget_drivers(old_id, new_id) -> None:
+    """把指向 old_id 的驱动器变量改为指向 new_id"""
+    for collection in (bpy.data.shape_keys, bpy.data.objects, bpy.data.meshes):
+        for owner in collection:
+            anim = owner.animation_data
+            if anim is None:
+                continue
+            for fcurve in anim.drivers:
+                for variable in fcurve.driver.variables:
+                    for target in variable.targets:
+                        if target.id == old_id:
+                            target.id = new_id
+
+
+def _transfer_mesh_data(old_mesh: bpy.types.Mesh, new_mesh: bpy.types.Mesh) -> None:
+    """
+    新网格接管旧网格的自定义属性、动画与驱动器；形态键数据块的 use_relative、eval_time、
+    自定义属性、动画曲线与驱动器也一并转移，其它 ID 中指向旧数据块的引用改为指向新数据块。
+    """
+    _copy_id_properties(old_mesh, new_mesh)
+    _copy_animation_data(old_mesh, new_mesh)
+
+    old_key = old_mesh.shape_keys
+    new_key = new_mesh.shape_keys
+    if old_key is not None and new_key is not None:
+        new_key.use_relative = old_key.use_relative
+        new_key.eval_time = old_key.eval_time
+        _copy_id_properties(old_key, new_key)
+        _copy_animation_data(old_key, new_key)
+        _retarget_drivers(old_key, new_key)
+    old_mesh.user_remap(new_mesh)
+
+
+def join_objects(target: bpy.types.Object, others: List[bpy.types.Object]) -> bpy.types.Object:
+    """
+    数据层合并（等同 bpy.ops.object.join）：其它物体变换到 target 的局部空间后拼接，
+    生成的网格替换 target 的网格（接管原网格的名称、自定义属性、动画与形态键驱动器），其它物体被删除。
+    """
+    parts = [MeshBuffers.from_object(obj, _relative_matrix(target, obj)) for obj in [target] + list(others)]
+    merged = MeshBuffers.concatenate(parts)
+
+    old_mesh = target.data
+    mesh_name = old_mesh.name
+    target.data = merged.to_mesh(mesh_name)
+    merged.write_object_data(target)
+    _transfer_mesh_data(old_mesh, target.data)
+
+    remove_objects([obj for obj in others if obj != target])
+    if old_mesh.users == 0:
+        bpy.data.meshes.remove(old_mesh)
+    # 原网格删除后名称才空出来
+    target.data.name = mesh_name
+    return target
+
+
+def _part_name(original_name: str, mat: Optional[bpy.types.Material], naming_mode: str) -> str:
+    mat_name = mat.name if mat else original_name
+    if naming_mode == 'MATERIAL':
+        return mat_name
+    return f"{original_name}_{mat_name}"
+
+
+def separate_by_material(obj: bpy.types.Object,
+                         naming_mode: str = 'MATERIAL',
+                         in_place: bool = True) -> List[bpy.types.Object]:
+    """
+    数据层按材质分离（等同 bpy.ops.mesh.separate(type='MATERIAL')），每个部分只保留自己的材质。
+    - in_place=True:  第一部分替换原物体的网格，其余部分为原物体的副本（保留修改器等）并链接到相同集合
+    - in_place=False: 原物体不变，所有部分为未链接到场景的临时物体（用后需自行删除）
+    naming_mode: MATERIAL（材质名）/ ORIGINAL_MATERIAL（原名_材质名）
+    """
+    buffers = MeshBuffers.from_object(obj)
+    original_name = obj.name
+    used_slots = np.unique(buffers.material_index)
+
+    results: List[bpy.types.Object] = []
+    old_mesh = obj.data
+    for i, slot in enumerate(used_slots.tolist()):
+        part = buffers.subset(buffers.material_index == slot)
+        mat = buffers.materials[slot] if slot < len(buffers.materials) else None
+        part.materials = [mat] if mat else []
+        part.material_index = np.zeros_like(part.material_index)
+
+        name = _part_name(original_name, mat, naming_mode)
+        mesh = part.to_mesh(name)
+        if in_place and i == 0:
+            part_obj = obj
+            part_obj.data = mesh
+        elif in_place:
+            part_obj = obj.copy()
+            part_obj.data = mesh
+            for collection in obj.users_collection:
+                collection.objects.link(part_obj)
+        else:
+            part_obj = bpy.data.objects.new(name, mesh)
+            part_obj.matrix_world = obj.matrix_world
+        part_obj.name = name
+        part.write_object_data(part_obj)
+        results.append(part_obj)
+
+    if in_place and old_mesh != obj.data and old_mesh.users == 0:
+        bpy.data.meshes.remove(old_mesh)
+    return results
+
+
+
+def material_statistics(obj: bpy.types.Object) -> Dict[str, np.ndarray]:
+    """
+    向量化统计每个材质槽的数据（数组按槽索引，长度为 max(槽数, 1)）：
+    - verts: 唯一顶点数    - faces: 面数
+    - area / area_share: 面积及其占总面积的比例（与缩放无关）
+    - uv_min / uv_max: 活动 UV 的包围盒 (S,2)
+    """
+    mesh = obj.data
+    num_faces = len(mesh.polygons)
+    num_loops = len(mesh.loops)
+    num_slots = max(len(mesh.materials), 1)
+
+    material_index = np.empty(num_faces, dtype=np.int32)
+    mesh.polygons.foreach_get('material_index', material_index)
+    loop_start = np.empty(num_faces, dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', loop_start)
+    loop_total = np.empty(num_faces, dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loop_total)
+    area = np.empty(num_faces, dtype=np.float32)
+    mesh.polygons.foreach_get('area', area)
+    corner_verts = np.empty(num_loops, dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', corner_verts)
+
+    material_index = np.clip(material_index, 0, num_slots - 1)
+    loops = expand_ranges(loop_start, loop_total)
+    loop_material = np.repeat(material_index, loop_total)
+
+    # 唯一的 (材质, 顶点) 组合
+    keys = np.unique(loop_material.astype(np.int64) * len(mesh.vertices) + corner_verts[loops])
+    verts = np.bincount(keys // max(len(mesh.vertices), 1), minlength=num_slots)[:num_slots]
+    faces = np.bincount(material_index, minlength=num_slots)[:num_slots]
+    area_sum = np.bincount(material_index, weights=area, minlength=num_slots)[:num_slots]
+    total_area = area_sum.sum()
+
+    uv_min = np.zeros((num_slots, 2))
+    uv_max = np.zeros((num_slots, 2))
+    uv_layer = mesh.uv_layers.active
+    if uv_layer is not None and num_loops:
+        uv = np.empty(num_loops * 2, dtype=np.float32)
+        uv_layer.data.foreach_get('uv', uv)
+        uv = uv.reshape(-1, 2)[loops]
+        uv_min = np.full((num_slots, 2), np.inf)
+        uv_max = np.full((num_slots, 2), -np.inf)
+        np.minimum.at(uv_min, loop_material, uv)
+        np.maximum.at(uv_max, loop_material, uv)
+        empty = faces == 0
+        uv_min[empty] = 0.0
+        uv_max[empty] = 0.0
+
+    return {
+        'verts': verts,
+        'faces': faces,
+        'area': area_sum,
+        'area_share': area_sum / total_area if total_area > 0 else np.zeros(num_slots),
+        'uv_min': uv_min,
+        'uv_max': uv_max,
+    }
+
+
+def _relative_difference(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """两组计数两两之间的相对差 |a - b| / max(a, b, 1)，(len(a), len(b))"""
+    a = a[:, None].astype(np.float64)
+    b = b[None, :].astype(np.float64)
+    return np.abs(a - b) / np.maximum(np.maximum(a, b), 1.0)
+
+
+def match_material_signatures(stats_a: Dict[str, np.ndarray],
+                              stats_b: Dict[str, np.ndarray],
+                              slots_a: List[int],
+                              slots_b: List[int],
+                              tolerance: float = 0.05) -> List[Tuple[int, int, str]]:
+    """
+    按材质签名匹配两个物体的材质槽，返回 [(slot_a, slot_b, 'EXACT' / 'NEAREST')]。
+    1. 签名 (唯一顶点数, 面数) 完全相同的槽通过字典直接配对（同签名按槽顺序）
+    2. 剩余的槽按 顶点数/面数/面积占比/UV 包围盒 的综合差异求最优匹配，
+       顶点数相对差超过 tolerance 的配对不可匹配
+    """
+    matches: List[Tuple[int, int, str]] = []
+
+    signatures: Dict[Tuple[int, int], List[int]] = {}
+    for slot in slots_b:
+        key = (int(stats_b['verts'][slot]), int(stats_b['faces'][slot]))
+        signatures.setdefault(key, []).append(slot)
+
+    rest_a: List[int] = []
+    for slot in slots_a:
+        key = (int(stats_a['verts'][slot]), int(stats_a['faces'][slot]))
+        candidates = signatures.get(key)
+        if candidates:
+            matches.append((slot, candidates.pop(0), 'EXACT'))
+        else:
+            rest_a.append(slot)
+
+    used_b = {slot_b for _slot_a, slot_b, _kind in matches}
+    rest_b = [slot for slot in slots_b if slot not in used_b]
+    if not rest_a or not rest_b or tolerance <= 0.0:
+        return matches
+
+    ia = np.array(rest_a)
+    ib = np.array(rest_b)
+    vert_diff = _relative_difference(stats_a['verts'][ia], stats_b['verts'][ib])
+    face_diff = _relative_difference(stats_a['faces'][ia], stats_b['faces'][ib])
+    area_diff = np.abs(stats_a['area_share'][ia][:, None] - stats_b['area_share'][ib][None, :])
+    uv_diff = (np.abs(stats_a['uv_min'][ia][:, None] - stats_b['uv_min'][ib][None, :]).sum(axis=2)
+               + np.abs(stats_a['uv_max'][ia][:, None] - stats_b['uv_max'][ib][None, :]).sum(axis=2))
+    distance = vert_diff + 0.5 * face_diff + area_diff + 0.25 * uv_diff
+
+    similarity = np.where(vert_diff <= tolerance, 1.0 / (1.0 + distance), 0.0)
+    for row, col, _sim in optimal_matches(similarity, 1e-6):
+        matches.append((rest_a[row], rest_b[col], 'NEAREST'))
+    return matches
+
+
+def write_vertex_selection(mesh: bpy.types.Mesh, mask: np.ndarray) -> None:
+    """
+    按顶点掩码直接写入选择状态（物体模式）：顶点用 foreach_set，
+    边与面的选择由其顶点是否全部选中推导，同样一次写入。
+    """
+    mask = np.asarray(mask, dtype=bool)
+    mesh.vertices.foreach_set('select', mask)
+
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get('vertices', edges)
+    mesh.edges.foreach_set('select', mask[edges.reshape(-1, 2)].all(axis=1))
+
+    num_faces = len(mesh.polygons)
+    if num_faces:
+        corner_verts = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get('vertex_index', corner_verts)
+        face_starts = np.empty(num_faces, dtype=np.int32)
+        mesh.polygons.foreach_get('loop_start', face_starts)
+        mesh.polygons.foreach_set('select', np.logical_and.reduceat(mask[corner_verts], face_starts))
+    mesh.update()
+
+
+def read_topology(mesh: bpy.types.Mesh) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(corner_verts (L,), face_starts (P,), face_sizes (P,))"""
+    corner_verts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', corner_verts)
+    face_starts = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', face_starts)
+    face_sizes = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', face_sizes)
+    return corner_verts, face_starts, face_sizes
+
+
+def corner_neighbors(face_starts: np.ndarray, face_sizes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """每个拐角所在的面，以及同一面内的上一个/下一个拐角索引"""
+    num_corners = int(face_sizes.sum())
+    corner_face = np.repeat(np.arange(len(face_starts)), face_sizes)
+    corners = np.arange(num_corners)
+    local = corners - face_starts[corner_face]
+    size = face_sizes[corner_face]
+    next_corner = np.where(local == size - 1, corners - local, corners + 1)
+    prev_corner = np.where(local == 0, corners + size - 1, corners - 1)
+    return corner_face, prev_corner, next_corner
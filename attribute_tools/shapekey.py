@@ -1,9 +1,23 @@
 # type: ignore
 import bpy
+import bmesh
+import os
 import numpy as np
 import time
 from typing import Dict, Tuple, Set, List, Optional
 from bpy.props import IntProperty, FloatProperty, PointerProperty
+from bpy_extras.io_utils import ExportHelper, ImportHelper
+from .mapping_store import (set_pairs, get_pairs, get_lookup, get_order, draw_pairs, draw_library_buttons,
+                            plan_renames, apply_renames, apply_mapping_to_objects)
+from .symmetry import AXIS_ITEMS, AXIS_INDEX, get_symmetry_map, mirror_vectors, flip_side_name
+from .shapekey_tensor import (ShapeKeyTensor, DEFAULT_CHUNK_BYTES, read_key_coords, footprint_cell, delta_signatures,
+                              signature_distance, match_names, MASK_OPERATION_ITEMS, affected_masks, combine_masks)
+from .mesh_data import write_vertex_selection
+from .surface_map import get_correspondence, map_vectors
+from .shapekey_data import reorder_shape_keys, clean_shape_keys, format_bytes
+from .shapekey_io import PRECISION_ITEMS, export_shape_keys, ShapeKeyFile, import_shape_keys
+from .shapekey_algebra import parse_expressions, evaluate_expressions, write_expression_results
+from .assignment import optimal_matches
 
 class XQFA_Utils:
     @staticmethod
@@ -14,29 +28,12 @@ class XQFA_Utils:
     def is_armature(scene, obj):
         return obj.type == "ARMATURE"
 
-class XqfaShapeKeyPairItem(bpy.types.PropertyGroup):
-    left_name: bpy.props.StringProperty(name="左")
-    right_name: bpy.props.StringProperty(name="右")
-    similarity: bpy.props.StringProperty(name="相似度", default="")
-
-
 class XqfaShapeKeyMappingItem(bpy.types.PropertyGroup):
     expanded: bpy.props.BoolProperty(name="展开", default=False)
     label: bpy.props.StringProperty(name="标题")
-    pairs: bpy.props.CollectionProperty(type=XqfaShapeKeyPairItem)
-    active_pair_index: bpy.props.IntProperty(default=0)
-
-
-class SKPairList(bpy.types.UIList):
-    def draw_item(self, context, layout, data, item, icon, active_data, active_propname):
-        if self.layout_type in {'DEFAULT', 'COMPACT'}:
-            row = layout.row(align=True)
-            row.label(text=item.left_name)
-            row.label(text="↔")
-            row.label(text=item.right_name)
-        elif self.layout_type in {'GRID'}:
-            layout.alignment = 'CENTER'
-            layout.label(text="")
+    data: bpy.props.StringProperty(name="映射数据", description="紧凑存储的映射记录 (JSON)", default="")
+    count: bpy.props.IntProperty(name="数量", default=0)
+    page: bpy.props.IntProperty(name="页", default=0, min=0)
 
 
 class DATA_PT_shape_key_tools(bpy.types.Panel):
@@ -59,6 +56,11 @@ class DATA_PT_shape_key_tools(bpy.types.Panel):
         col.operator(O_ShapeKeysSelectAffectedVertices.bl_idname, text=O_ShapeKeysSelectAffectedVertices.bl_label, icon="VERTEXSEL")
         col.operator(O_ShapeKeysClean.bl_idname, text=O_ShapeKeysClean.bl_label, icon="BRUSH_DATA")
         col.operator(O_ShapeKeysTransfer.bl_idname, text=O_ShapeKeysTransfer.bl_label, icon="SHAPEKEY_DATA")
+        col.operator(O_ShapeKeysMirror.bl_idname, text=O_ShapeKeysMirror.bl_label, icon="MOD_MIRROR")
+        col.operator(O_ShapeKeysExpression.bl_idname, text=O_ShapeKeysExpression.bl_label, icon="MODIFIER")
+        row = col.row(align=True)
+        row.operator(O_ShapeKeysExportSparse.bl_idname, text=O_ShapeKeysExportSparse.bl_label, icon="EXPORT")
+        row.operator(O_ShapeKeysImportSparse.bl_idname, text=O_ShapeKeysImportSparse.bl_label, icon="IMPORT")
 
         row = col.row(align=True)
         row.prop(context.scene, "sk_source_mesh", text = "", icon="MESH_DATA")
@@ -75,6 +77,7 @@ class DATA_PT_shape_key_tools(bpy.types.Panel):
             else:
                 row.label(text="错误: 物体没有骨架修改器", icon='ERROR')
         row.operator(XQFA_OT_ApplyAsShapekey.bl_idname, icon="SHAPEKEY_DATA")
+        col.operator(XQFA_OT_BakeActionShapeKeys.bl_idname, text=XQFA_OT_BakeActionShapeKeys.bl_label, icon="ACTION")
 
         self._draw_mappings(context)
 
@@ -83,12 +86,17 @@ class DATA_PT_shape_key_tools(bpy.types.Panel):
         mappings = getattr(scene, 'xqfa_shape_key_mappings', None)
         if mappings is None:
             return
+        layout = self.layout
         if len(mappings) == 0:
+            row = layout.row(align=True)
+            row.label(text="映射记录", icon="COLLAPSEMENU")
+            draw_library_buttons(row, 'SHAPE_KEY')
             return
-        layout = self.layout
         layout.separator()
         box = layout.box()
-        box.label(text="映射记录", icon="COLLAPSEMENU")
+        row = box.row(align=True)
+        row.label(text="映射记录", icon="COLLAPSEMENU")
+        draw_library_buttons(row, 'SHAPE_KEY')
         for idx, item in enumerate(mappings):
             row = box.row(align=True)
             icon = "TRIA_DOWN" if item.expanded else "TRIA_RIGHT"
@@ -96,7 +104,7 @@ class DATA_PT_shape_key_tools(bpy.types.Panel):
             if not item.label:
                 item.label = f"映射 {idx + 1}"
             row.prop(item, "label", text="")
-            row.label(text=f"({len(item.pairs)}项)")
+            row.label(text=f"({item.count}项)")
             row.separator(factor=1.0)
             op_lr = row.operator(O_ShapeKeyMappingApply.bl_idname, text="", icon="FORWARD")
             op_lr.index = idx
@@ -112,21 +120,76 @@ class DATA_PT_shape_key_tools(bpy.types.Panel):
             op_r_order.direction = "RIGHT"
             row.operator(O_ShapeKeyMappingRemove.bl_idname, text="", icon="X").index = idx
             if item.expanded:
-                box.template_list(
-                    "SKPairList",
-                    f"sk_pairs_{idx}",
-                    item,
-                    "pairs",
-                    item,
-                    "active_pair_index",
-                    type='DEFAULT',
-                )
+                draw_pairs(box, item)
+
+
+def match_rename_shape_keys(obj_a: bpy.types.Object,
+                            obj_b: bpy.types.Object,
+                            threshold: float = 0.94,
+                            feature_weights: Optional[Dict[str, float]] = None) -> Dict[str, any]:
+    """
+    用 A 物体的形态键名称重命名 B 物体中匹配的形态键。
+    按偏移特征（加权中心、平均位移、最大位移、影响范围位图）计算相似度矩阵，
+    再求全局最优一一匹配；重命名通过临时名称两阶段完成，互换名称也不会冲突。
+    不依赖选择与活动物体，可在其它流程中直接调用。
+    """
+    cell = footprint_cell(obj_a, obj_b)
+    sig_a = delta_signatures(obj_a, cell)
+    sig_b = delta_signatures(obj_b, cell)
+
+    if not sig_a['names']:
+        raise Exception("A物体没有可用的形态键（只有基础形态键）")
+    if not sig_b['names']:
+        raise Exception("B物体没有可用的形态键（只有基础形态键）")
+
+    similarity_matrix = 1.0 / (1.0 + signature_distance(sig_b, sig_a, feature_weights))  # N_b x N_a
+    pairs = optimal_matches(similarity_matrix, threshold)
+
+    match_lookup: Dict[str, Tuple[Optional[str], str]] = {name: (None, "no match") for name in sig_b['names']}
+    for row, col, similarity in pairs:
+        match_lookup[sig_b['names'][row]] = (sig_a['names'][col], f"{similarity:.3f}")
+
+    shape_keys_b = obj_b.data.shape_keys.key_blocks
+    original_sk_names = [sk.name for sk in shape_keys_b]
+
+    plan = plan_renames(original_sk_names, {b_name: a_name for b_name, (a_name, _s) in match_lookup.items() if a_name})
+    conflicts = {old_name for old_name, _new_name in plan['conflicts']}
+    renamed_count = apply_renames(shape_keys_b, plan['renames'])
+
+    pair_items: List[Tuple[str, str, str]] = []
+    for orig_name in original_sk_names:
+        if orig_name not in match_lookup:
+            continue
+
+        a_name, similarity_str = match_lookup[orig_name]
+        if a_name and orig_name not in conflicts:
+            pair_items.append((orig_name, a_name, similarity_str))
+        else:
+            pair_items.append((orig_name, orig_name, "conflict" if a_name else similarity_str))
+
+    return {
+        'renamed_count': renamed_count,
+        'pair_items': pair_items,
+        'total_a': len(sig_a['names']),
+        'total_b': len(sig_b['names'])
+    }
+
+
+def store_shape_key_mapping(scene: bpy.types.Scene, label: str, pair_items) -> None:
+    """把匹配结果保存为场景中的形态键映射记录"""
+    if not hasattr(scene, 'xqfa_shape_key_mappings'):
+        return
+    mappings = scene.xqfa_shape_key_mappings
+    item = mappings.add()
+    item.label = label if label else f"映射 {len(mappings)}"
+    item.expanded = False
+    set_pairs(item, pair_items)
 
 
 class O_ShapeKeysMatchRename(bpy.types.Operator):
     bl_idname = "xqfa.shape_keys_match_rename"
     bl_label = "匹配重命名"
-    bl_description = ("基于顶点平均位置匹配重命名活动物体的形态键（需选择2个网格物体）\n"
+    bl_description = ("基于偏移特征（影响区域中心、位移方向与大小、影响范围）匹配重命名活动物体的形态键（需选择2个网格物体）\n"
                      "用于按参考模型的形态键名称重命名当前模型的形态键")
 
     similarity_threshold: bpy.props.FloatProperty(
@@ -159,11 +222,11 @@ class O_ShapeKeysMatchRename(bpy.types.Operator):
         try:
             obj_a, obj_b = self._validate_input(context)
 
-            result = self._rename_matching_shape_keys(obj_a, obj_b)
+            result = match_rename_shape_keys(obj_a, obj_b, self.similarity_threshold)
 
             self._print_detailed_results(obj_a, obj_b, result)
 
-            self._store_mapping(context, obj_a, obj_b, result)
+            store_shape_key_mapping(context.scene, self.mapping_name, result['pair_items'])
 
             elapsed_time = time.time() - start_time
             time_msg = f"总耗时: {elapsed_time:.2f}秒"
@@ -180,21 +243,6 @@ class O_ShapeKeysMatchRename(bpy.types.Operator):
             self.report({'ERROR'}, f"{str(e)} (耗时: {elapsed_time:.2f}秒)")
             return {'CANCELLED'}
 
-    def _store_mapping(self, context, obj_a, obj_b, result):
-        scene = context.scene
-        if not hasattr(scene, 'xqfa_shape_key_mappings'):
-            return
-        mappings = scene.xqfa_shape_key_mappings
-        item = mappings.add()
-        item.label = self.mapping_name if self.mapping_name else f"映射 {len(mappings)}"
-        item.expanded = False
-        pair_items = result.get('pair_items', [])
-        for left_name, right_name, similarity in pair_items:
-            p = item.pairs.add()
-            p.left_name = left_name
-            p.right_name = right_name
-            p.similarity = similarity
-    
     def _validate_input(self, context: bpy.types.Context) -> Tuple[bpy.types.Object, bpy.types.Object]:
         """验证输入并返回两个有形态键的网格物体"""
         selected_objs = context.selected_objects
@@ -217,104 +265,6 @@ class O_ShapeKeysMatchRename(bpy.types.Operator):
             
         return obj_a, obj_b
     
-    def _get_shape_key_centers(self, obj: bpy.types.Object) -> Dict[str, np.ndarray]:
-        """获取每个形态键的顶点平均位置"""
-        centers = {}
-        mesh = obj.data
-        shape_keys = mesh.shape_keys.key_blocks
-        
-        # 获取基础网格顶点坐标
-        base_verts = np.zeros(len(mesh.vertices) * 3)
-        mesh.vertices.foreach_get('co', base_verts)
-        base_verts = base_verts.reshape(-1, 3)
-        
-        for sk in shape_keys:
-            if sk == sk.relative_key:  # 跳过基础形态键
-                continue
-                
-            # 获取形态键的相对顶点坐标
-            sk_verts = np.zeros(len(mesh.vertices) * 3)
-            sk.data.foreach_get('co', sk_verts)
-            sk_verts = sk_verts.reshape(-1, 3)
-            
-            # 计算绝对顶点位置
-            abs_verts = base_verts + sk_verts
-            
-            # 转换为全局坐标
-            matrix = np.array(obj.matrix_world)
-            global_verts = np.dot(abs_verts, matrix[:3, :3].T) + matrix[:3, 3]
-            
-            # 计算平均位置
-            centers[sk.name] = np.mean(global_verts, axis=0)
-        
-        return centers
-    
-    def _calculate_similarity(self, pos_a: np.ndarray, pos_b: np.ndarray) -> float:
-        """计算两个位置之间的相似度（基于距离）"""
-        distance = np.linalg.norm(pos_a - pos_b)
-        return 1.0 / (1.0 + distance)
-    
-    def _rename_matching_shape_keys(self,
-                                  obj_a: bpy.types.Object,
-                                  obj_b: bpy.types.Object) -> Dict[str, any]:
-        """匹配并重命名形态键"""
-        centers_a = self._get_shape_key_centers(obj_a)
-        centers_b = self._get_shape_key_centers(obj_b)
-
-        if not centers_a:
-            raise Exception("A物体没有可用的形态键（只有基础形态键）")
-        if not centers_b:
-            raise Exception("B物体没有可用的形态键（只有基础形态键）")
-
-        match_lookup: Dict[str, Tuple[Optional[str], str]] = {}
-        matched_a_keys: Set[str] = set()
-
-        for b_name, b_center in centers_b.items():
-            best_match_name = None
-            best_similarity = 0.0
-
-            for a_name, a_center in centers_a.items():
-                if a_name in matched_a_keys:
-                    continue
-
-                similarity = self._calculate_similarity(a_center, b_center)
-                if similarity > best_similarity and similarity >= self.similarity_threshold:
-                    best_similarity = similarity
-                    best_match_name = a_name
-
-            if best_match_name:
-                matched_a_keys.add(best_match_name)
-                match_lookup[b_name] = (best_match_name, f"{best_similarity:.3f}")
-            else:
-                match_lookup[b_name] = (None, "no match")
-
-        shape_keys_b = obj_b.data.shape_keys.key_blocks
-        original_sk_names = [sk.name for sk in shape_keys_b]
-
-        renamed_count = 0
-        pair_items: List[Tuple[str, str, str]] = []
-
-        for orig_name in original_sk_names:
-            sk = shape_keys_b[orig_name]
-            if sk == sk.relative_key:
-                continue
-
-            match_info = match_lookup.get(orig_name, (None, "-"))
-            a_name, similarity_str = match_info
-            if a_name:
-                shape_keys_b[orig_name].name = a_name
-                pair_items.append((orig_name, a_name, similarity_str))
-                renamed_count += 1
-            else:
-                pair_items.append((orig_name, orig_name, similarity_str))
-
-        return {
-            'renamed_count': renamed_count,
-            'pair_items': pair_items,
-            'total_a': len(centers_a),
-            'total_b': len(centers_b)
-        }
-    
     def _print_detailed_results(self,
                               obj_a: bpy.types.Object,
                               obj_b: bpy.types.Object,
@@ -395,33 +345,10 @@ class O_ShapeKeyMappingApply(bpy.types.Operator):
             self.report({'ERROR'}, "请先选择有形态键的网格物体")
             return {'CANCELLED'}
 
-        if self.direction == "LEFT_TO_RIGHT":
-            lookup = [(p.left_name, p.right_name) for p in item.pairs]
-        else:
-            lookup = [(p.right_name, p.left_name) for p in item.pairs]
-
-        total_renamed = 0
-        total_skipped = 0
-        affected_objs = 0
-
-        for obj in selected_objs:
-            sk_blocks = obj.data.shape_keys.key_blocks
-            obj_renamed = 0
-            for old_name, new_name in lookup:
-                idx = sk_blocks.find(old_name)
-                if idx == -1:
-                    total_skipped += 1
-                    continue
-                try:
-                    sk_blocks[idx].name = new_name
-                    obj_renamed += 1
-                except Exception:
-                    total_skipped += 1
-            if obj_renamed > 0:
-                total_renamed += obj_renamed
-                affected_objs += 1
-
-        self.report({'INFO'}, f"影响 {affected_objs}/{len(selected_objs)} 个物体：已重命名 {total_renamed} 项，跳过 {total_skipped} 项")
+        lookup = get_lookup(item, self.direction)
+
+        level, message = apply_mapping_to_objects(selected_objs, lambda obj: obj.data.shape_keys.key_blocks, lookup, "形态键")
+        self.report({level}, message)
         return {'FINISHED'}
 
 
@@ -447,7 +374,7 @@ class O_ShapeKeyMappingReorder(bpy.types.Operator):
             return {'CANCELLED'}
 
         item = mappings[self.index]
-        if not item.pairs:
+        if not get_pairs(item):
             self.report({'WARNING'}, "此映射记录为空")
             return {'CANCELLED'}
 
@@ -456,7 +383,7 @@ class O_ShapeKeyMappingReorder(bpy.types.Operator):
             self.report({'ERROR'}, "请先选择网格物体")
             return {'CANCELLED'}
 
-        desired_names = [p.left_name if self.direction == "LEFT" else p.right_name for p in item.pairs]
+        desired_names = get_order(item, self.direction)
 
         total_matched = 0
         total_added = 0
@@ -474,62 +401,11 @@ class O_ShapeKeyMappingReorder(bpy.types.Operator):
         return {'FINISHED'}
 
     def _reorder_shape_keys(self, target_obj, desired_order):
-        if not target_obj.data.shape_keys or len(target_obj.data.shape_keys.key_blocks) == 0:
-            target_obj.shape_key_add(name="Basis", from_mix=False)
-
-        key_blocks = target_obj.data.shape_keys.key_blocks
-        num_verts = len(target_obj.data.vertices)
-
-        shape_data = {}
-        for sk in key_blocks:
-            coords = np.empty(num_verts * 3, dtype=np.float32)
-            sk.data.foreach_get('co', coords)
-            shape_data[sk.name] = coords
-
-        original_names = [sk.name for sk in key_blocks]
-        basis_name = key_blocks[0].name
-
-        for i in range(len(key_blocks) - 1, 0, -1):
-            target_obj.shape_key_remove(key_blocks[i])
-
-        matched = 0
-        added = 0
-        extra = 0
-        used_names = {basis_name}
-
-        for name in desired_order:
-            if name in used_names:
-                continue
-
-            new_sk = target_obj.shape_key_add(name=name, from_mix=False)
-            if name in shape_data:
-                coords = shape_data.pop(name)
-                new_sk.data.foreach_set('co', coords)
-                new_sk.data.update()
-                matched += 1
-            else:
-                added += 1
-            used_names.add(name)
-
-        for extra_name in list(shape_data.keys()):
-            if extra_name == basis_name:
-                continue
-            if extra_name in used_names:
-                continue
-            new_sk = target_obj.shape_key_add(name=extra_name, from_mix=False)
-            coords = shape_data.pop(extra_name)
-            new_sk.data.foreach_set('co', coords)
-            new_sk.data.update()
-            extra += 1
-            used_names.add(extra_name)
-
-        return {
-            'matched': matched,
-            'added': added,
-            'extra': extra,
-            'original_total': len(original_names),
-            'order_total': len(desired_order),
-        }
+        original_total = len(target_obj.data.shape_keys.key_blocks) if target_obj.data.shape_keys else 0
+        result = reorder_shape_keys(target_obj, desired_order)
+        result['original_total'] = original_total
+        result['order_total'] = len(desired_order)
+        return result
 
 
 class O_ShapeKeysSortMatch(bpy.types.Operator):
@@ -590,83 +466,25 @@ class O_ShapeKeysSortMatch(bpy.types.Operator):
     def _reorder_shape_keys_exact(self, source_obj, target_obj):
         source_sks = source_obj.data.shape_keys.key_blocks
         target_sks = target_obj.data.shape_keys.key_blocks if target_obj.data.shape_keys else None
-        
+
         # 记录目标物体原有的形态键名称
-        original_keys = set()
-        if target_sks:
-            original_keys = {sk.name for sk in target_sks}
-        
-        # 确保目标物体有形态键
-        if not target_sks:
-            target_obj.shape_key_add(name="Basis", from_mix=False)
-            target_sks = target_obj.data.shape_keys.key_blocks
-        
-        # 我们需要知道每个形态键应该移动到的位置
-        desired_order = []
-        added_count = 0
-        matched_count = 0
-        
-        # 首先处理基础形态键
-        basis_sk = target_sks.get("Basis")
-        if not basis_sk:
-            basis_sk = target_sks[0] if len(target_sks) > 0 else target_obj.shape_key_add(name="Basis", from_mix=False)
-        
-        # 确保基础形态键在第一位
-        if basis_sk != target_sks[0]:
-            target_obj.active_shape_key_index = basis_sk.index
-            for _ in range(basis_sk.index):
-                bpy.ops.object.shape_key_move(type='UP')
-        
-        # 遍历源物体的形态键顺序
-        for src_sk in source_sks:
-            if src_sk.name == "Basis":
-                continue  # 基础形态键已经在第一位
-            
-            # 检查目标物体是否有该形态键
-            if src_sk.name in target_sks:
-                # 已有形态键，记录需要移动到的位置
-                desired_order.append(src_sk.name)
-                matched_count += 1
-            else:
-                # 没有该形态键，添加一个新的空形态键
-                new_sk = target_obj.shape_key_add(name=src_sk.name, from_mix=False)
-                desired_order.append(new_sk.name)
-                added_count += 1
-        
-        # 添加目标物体独有的形态键到末尾
-        kept_count = 0
-        for tgt_sk in target_sks:
-            if tgt_sk.name not in desired_order and tgt_sk.name != "Basis":
-                desired_order.append(tgt_sk.name)
-                kept_count += 1
-        
-        # 现在按照desired_order重新排列形态键
-        # 由于Blender没有直接重排API，我们需要通过移动来实现
-        for desired_index, sk_name in enumerate(desired_order):
-            if desired_index == 0:
-                continue  # 基础形态键已经在第一位
-            
-            current_index = target_sks.find(sk_name)
-            if current_index == -1:
-                continue  # 不应该发生
-            
-            # 计算需要移动的次数
-            move_count = current_index - desired_index
-            if move_count <= 0:
-                continue  # 已经在正确位置或更靠前
-            
-            # 移动形态键到正确位置
-            target_obj.active_shape_key_index = current_index
-            for _ in range(move_count):
-                bpy.ops.object.shape_key_move(type='UP')
-        
+        original_keys = {sk.name for sk in target_sks} if target_sks else set()
+
+        # 基础形态键优先使用名为 "Basis" 的形态键
+        basis_name = "Basis" if "Basis" in original_keys or not target_sks else target_sks[0].name
+
+        # 按源物体的形态键顺序一次性重建（缺少的新建空键，多余的保留在最后）
+        desired_order = [sk.name for sk in source_sks if sk.name != "Basis"]
+        result = reorder_shape_keys(target_obj, desired_order, basis=basis_name)
+
         return {
-            'matched': matched_count,
-            'added': added_count,
-            'kept': kept_count,
+            'matched': result['matched'],
+            'added': result['added'],
+            'kept': result['extra'],
             'original_keys': original_keys
         }
-    
+
+
 class O_ShapeKeysRenameByOrder(bpy.types.Operator):
     bl_idname = "xqfa.shape_keys_rename_by_order"
     bl_label = "顺序重命名"
@@ -769,8 +587,9 @@ class O_ShapeKeysRenameByOrder(bpy.types.Operator):
 class O_ShapeKeysSelectAffectedVertices(bpy.types.Operator):
     bl_idname = "xqfa.shape_keys_select_affected_vertices"
     bl_label = "选中影响顶点"
-    bl_description = ("选中当前形态键影响的顶点\n"
-                     "选中与基础形态键位置有差异的顶点")
+    bl_description = ("选中形态键影响的顶点（与相对形态键位置有差异的顶点）\n"
+                     "可按名称组合多个形态键（并集/交集/差集），结果写入选择、顶点组或布尔属性")
+    bl_options = {'REGISTER', 'UNDO'}
 
     select_threshold: bpy.props.FloatProperty(
         name="阈值",
@@ -781,13 +600,42 @@ class O_ShapeKeysSelectAffectedVertices(bpy.types.Operator):
         precision=5
     )
 
+    key_names: bpy.props.StringProperty(
+        name="形态键",
+        description="参与计算的形态键名称，支持通配符，多个用逗号分隔（留空为活动形态键）",
+        default=""
+    )
+
+    operation: bpy.props.EnumProperty(name="组合", items=MASK_OPERATION_ITEMS, default='UNION')
+
+    output: bpy.props.EnumProperty(
+        name="输出",
+        items=[
+            ('SELECT', "选择", "写入顶点选择"),
+            ('VERTEX_GROUP', "顶点组", "写入顶点组（权重 1.0，仅物体模式）"),
+            ('ATTRIBUTE', "布尔属性", "写入布尔类型的点属性（仅物体模式）"),
+        ],
+        default='SELECT'
+    )
+
+    output_name: bpy.props.StringProperty(
+        name="名称",
+        description="输出顶点组/属性的名称",
+        default="ShapeKeyMask"
+    )
+
     def invoke(self, context, event):
         wm = context.window_manager
-        return wm.invoke_props_dialog(self, width=200)
+        return wm.invoke_props_dialog(self, width=260)
 
     def draw(self, context):
         layout = self.layout
         layout.prop(self, "select_threshold")
+        layout.prop(self, "key_names")
+        layout.prop(self, "operation")
+        layout.prop(self, "output")
+        if self.output != 'SELECT':
+            layout.prop(self, "output_name")
 
     def execute(self, context):
         try:
@@ -804,78 +652,77 @@ class O_ShapeKeysSelectAffectedVertices(bpy.types.Operator):
             if not obj.data.shape_keys.use_relative:
                 self.report({'ERROR'}, "仅支持相对形态键")
                 return {'CANCELLED'}
-            
-            current_sk = obj.active_shape_key
-            if not current_sk:
-                self.report({'ERROR'}, "没有激活的形态键")
-                return {'CANCELLED'}
-            
-            if current_sk == current_sk.relative_key:
-                self.report({'ERROR'}, "当前是基础形态键，请选择其他形态键")
+
+            if self.output != 'SELECT' and obj.mode == 'EDIT':
+                self.report({'ERROR'}, "输出到顶点组或属性时请在物体模式下使用")
                 return {'CANCELLED'}
-            
-            result = self._select_affected_vertices(obj, current_sk, self.select_threshold)
-            
-            self.report({'INFO'}, f"已选中 {result['count']} 个顶点")
+
+            key_blocks = obj.data.shape_keys.key_blocks
+            if self.key_names.strip():
+                names = match_names([sk.name for sk in key_blocks if sk != sk.relative_key], self.key_names)
+                if not names:
+                    self.report({'ERROR'}, "没有符合名称的形态键")
+                    return {'CANCELLED'}
+            else:
+                current_sk = obj.active_shape_key
+                if not current_sk:
+                    self.report({'ERROR'}, "没有激活的形态键")
+                    return {'CANCELLED'}
+                if current_sk == current_sk.relative_key:
+                    self.report({'ERROR'}, "当前是基础形态键，请选择其他形态键")
+                    return {'CANCELLED'}
+                names = [current_sk.name]
+
+            mask = combine_masks(affected_masks(obj, names, self.select_threshold), self.operation)
+            count = int(np.count_nonzero(mask))
+            target = self._write_mask(obj, mask)
+
+            self.report({'INFO'}, f"{len(names)} 个形态键影响 {count}/{len(mask)} 个顶点，已写入{target}")
             return {'FINISHED'}
             
         except Exception as e:
             self.report({'ERROR'}, str(e))
             return {'CANCELLED'}
-    
-    def _select_affected_vertices(self, obj, shape_key, threshold):
-        """选中与基础形态键有差异的顶点"""
+
+    def _write_mask(self, obj, mask):
+        """把顶点掩码写入选择 / 顶点组 / 布尔属性，返回目标描述"""
         mesh = obj.data
-        shape_keys = mesh.shape_keys
-        base_key = shape_key.relative_key
-        
-        # 获取顶点总数
-        total_verts = len(mesh.vertices)
-        
-        # 获取基础形态键顶点坐标
-        base_coords = np.zeros(total_verts * 3)
-        base_key.data.foreach_get('co', base_coords)
-        base_coords = base_coords.reshape(-1, 3)
-        
-        # 获取当前形态键顶点坐标
-        sk_coords = np.zeros(total_verts * 3)
-        shape_key.data.foreach_get('co', sk_coords)
-        sk_coords = sk_coords.reshape(-1, 3)
-        
-        # 计算差异距离
-        diffs = np.linalg.norm(sk_coords - base_coords, axis=1)
-        
-        # 切换到编辑模式（如果还没在）
-        if obj.mode != 'EDIT':
-            bpy.ops.object.mode_set(mode='EDIT')
-        
-        # 首先取消所有选择
-        bpy.ops.mesh.select_all(action='DESELECT')
-        
-        # 切换回对象模式来设置顶点选择
-        bpy.ops.object.mode_set(mode='OBJECT')
-        
-        # 选中有差异的顶点
-        affected_count = 0
-        for i, diff in enumerate(diffs):
-            if diff > threshold:
-                mesh.vertices[i].select = True
-                affected_count += 1
-        
-        # 回到编辑模式
-        bpy.ops.object.mode_set(mode='EDIT')
-        
-        return {
-            'count': affected_count,
-            'total': total_verts
-        }
+        if self.output == 'VERTEX_GROUP':
+            vg = obj.vertex_groups.get(self.output_name) or obj.vertex_groups.new(name=self.output_name)
+            vg.remove(np.flatnonzero(~mask).tolist())
+            vg.add(np.flatnonzero(mask).tolist(), 1.0, 'REPLACE')
+            return f"顶点组 {vg.name}"
+
+        if self.output == 'ATTRIBUTE':
+            attr = mesh.attributes.get(self.output_name)
+            if attr is not None and (attr.data_type != 'BOOLEAN' or attr.domain != 'POINT'):
+                mesh.attributes.remove(attr)
+                attr = None
+            if attr is None:
+                attr = mesh.attributes.new(name=self.output_name, type='BOOLEAN', domain='POINT')
+            attr.data.foreach_set('value', mask)
+            mesh.update()
+            return f"属性 {attr.name}"
+
+        if obj.mode == 'EDIT':
+            # 编辑模式下直接修改 BMesh，不切换模式
+            bm = bmesh.from_edit_mesh(mesh)
+            bm.verts.ensure_lookup_table()
+            for vert, selected in zip(bm.verts, mask.tolist()):
+                vert.select = selected
+            bm.select_flush_mode()
+            bmesh.update_edit_mesh(mesh)
+        else:
+            write_vertex_selection(mesh, mask)
+        return "选择"
 
 
 class O_ShapeKeysClean(bpy.types.Operator):
     bl_idname = "xqfa.shape_keys_clean"
     bl_label = "清理形态键"
-    bl_description = ("删除所有不影响任何顶点的形态键（与基础形态键无差异的形态键）\n"
-                     "仅保留有实际顶点偏移的形态键")
+    bl_description = ("批量清理选中物体的形态键（分块读取偏移量，内存占用有上限）\n"
+                     "删除不影响任何顶点的形态键，可选删除重复形态键、清零低于阈值的噪声顶点")
+    bl_options = {'REGISTER', 'UNDO'}
 
     clean_threshold: bpy.props.FloatProperty(
         name="阈值",
@@ -886,16 +733,46 @@ class O_ShapeKeysClean(bpy.types.Operator):
         precision=5
     )
 
+    duplicate_mode: bpy.props.EnumProperty(
+        name="重复检测",
+        items=[
+            ('NONE', "不检测", "只删除空形态键"),
+            ('EXACT', "完全相同", "偏移量完全相同的形态键只保留第一个"),
+            ('NEAR', "近似相同", "偏移量差值不超过容差的形态键只保留第一个（近似检测，可能漏检）"),
+        ],
+        default='NONE'
+    )
+
+    duplicate_tolerance: bpy.props.FloatProperty(
+        name="重复容差",
+        description="近似重复检测时允许的最大逐顶点差值（米）",
+        default=0.0001,
+        min=0.0,
+        step=0.0001,
+        precision=5
+    )
+
+    zero_noise: bpy.props.BoolProperty(
+        name="清零噪声顶点",
+        description="把位移低于阈值的顶点恢复到相对形态键的位置",
+        default=False
+    )
+
     def invoke(self, context, event):
         wm = context.window_manager
-        return wm.invoke_props_dialog(self, width=200)
+        return wm.invoke_props_dialog(self, width=260)
 
     def draw(self, context):
         layout = self.layout
         layout.prop(self, "clean_threshold")
+        layout.prop(self, "duplicate_mode")
+        if self.duplicate_mode == 'NEAR':
+            layout.prop(self, "duplicate_tolerance")
+        layout.prop(self, "zero_noise")
 
     def execute(self, context):
         try:
+            start_time = time.time()
             selected_objs = [obj for obj in context.selected_objects if obj.type == 'MESH']
 
             if not selected_objs:
@@ -903,7 +780,8 @@ class O_ShapeKeysClean(bpy.types.Operator):
                 return {'CANCELLED'}
 
             total_removed = 0
-            total_kept = 0
+            total_bytes = 0
+            total_noise = 0
             processed = 0
 
             for obj in selected_objs:
@@ -915,23 +793,30 @@ class O_ShapeKeysClean(bpy.types.Operator):
                     print(f"跳过 {obj.name}: 非相对形态键")
                     continue
 
-                result = self._clean_empty_shape_keys(obj, self.clean_threshold)
+                result = clean_shape_keys(obj, self.clean_threshold, self.duplicate_mode,
+                                          self.duplicate_tolerance, self.zero_noise)
                 total_removed += result['removed']
-                total_kept += result['kept']
+                total_bytes += result['bytes_saved']
+                total_noise += result['noise_vertices']
                 processed += 1
 
-                if result['removed_names']:
-                    print(f"\n形态键清理结果 [{obj.name}]:")
-                    for name in result['removed_names']:
-                        print(f"  ✕ {name} (已删除)")
-                    for name in result['kept_names']:
-                        print(f"  ✓ {name} (保留)")
-
+                if result['removed'] or result['zeroed_keys']:
+                    print(f"\n形态键清理结果 [{obj.name}] 节省 {format_bytes(result['bytes_saved'])}:")
+                    for name in result['empty_names']:
+                        print(f"  ✕ {name} (无影响，已删除)")
+                    for name, kept in result['duplicates']:
+                        print(f"  ✕ {name} (与 {kept} 重复，已删除)")
+                    if result['zeroed_keys']:
+                        print(f"  · 清零 {result['noise_vertices']} 个噪声顶点 ({result['zeroed_keys']} 个形态键)")
+                    print(f"  ✓ 保留 {len(result['kept_names'])} 个形态键")
+
+            elapsed = time.time() - start_time
             if processed == 0:
                 self.report({'INFO'}, "没有可处理的物体")
-            elif total_removed > 0:
+            elif total_removed > 0 or total_noise > 0:
                 self.report({'INFO'},
-                           f"已处理 {processed} 个物体，删除 {total_removed} 个无效形态键，保留 {total_kept} 个有效形态键")
+                           f"已处理 {processed} 个物体，删除 {total_removed} 个形态键（节省 {format_bytes(total_bytes)}），"
+                           f"清零 {total_noise} 个噪声顶点 (用时 {elapsed:.2f}s)")
             else:
                 self.report({'INFO'}, f"已处理 {processed} 个物体，所有形态键均有效，无需清理")
 
@@ -941,57 +826,230 @@ class O_ShapeKeysClean(bpy.types.Operator):
             self.report({'ERROR'}, str(e))
             return {'CANCELLED'}
 
-    def _clean_empty_shape_keys(self, obj, threshold):
-        """删除与基础形态键无差异的形态键"""
+
+class O_ShapeKeysMirror(bpy.types.Operator):
+    bl_idname = "xqfa.shape_keys_mirror"
+    bl_label = "镜像形态键"
+    bl_description = ("按对称顶点镜像形态键的偏移量（每个形态键一次数组运算，对称映射按网格内容缓存）\n"
+                     "可写回自身，或写入左右名称交换后的形态键（如 Smile.L → Smile.R）")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    direction: bpy.props.EnumProperty(
+        name="方向",
+        items=[
+            ('FLIP', "翻转", "左右整体翻转"),
+            ('POSITIVE', "+ → -", "用正侧的偏移覆盖负侧"),
+            ('NEGATIVE', "- → +", "用负侧的偏移覆盖正侧"),
+        ],
+        default='FLIP'
+    )
+
+    scope: bpy.props.EnumProperty(
+        name="范围",
+        items=[
+            ('ACTIVE', "活动形态键", "只处理活动形态键"),
+            ('ALL', "全部", "处理所有形态键"),
+        ],
+        default='ACTIVE'
+    )
+
+    output: bpy.props.EnumProperty(
+        name="输出",
+        items=[
+            ('SELF', "自身", "镜像结果写回原形态键"),
+            ('FLIPPED_NAME', "对侧形态键", "写入左右名称交换后的形态键（不存在时新建，名称无左右标记时写回自身）"),
+        ],
+        default='SELF'
+    )
+
+    axis: bpy.props.EnumProperty(name="轴", items=AXIS_ITEMS, default='X')
+
+    tolerance: bpy.props.FloatProperty(
+        name="容差",
+        description="查找对称顶点时允许的最大距离",
+        default=0.0001,
+        min=0.0,
+        step=0.001,
+        precision=5,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and obj.type == 'MESH' and obj.data.shape_keys is not None
+
+    def invoke(self, context, event):
+        wm = context.window_manager
+        return wm.invoke_props_dialog(self, width=260)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "direction", expand=True)
+        layout.prop(self, "scope", expand=True)
+        layout.prop(self, "output", expand=True)
+        layout.prop(self, "axis", expand=True)
+        layout.prop(self, "tolerance")
+
+    def execute(self, context):
+        start_time = time.time()
+        obj = context.active_object
         mesh = obj.data
-        shape_keys = mesh.shape_keys
-        key_blocks = shape_keys.key_blocks
-        base_key = key_blocks[0]  # Basis
+        key_blocks = mesh.shape_keys.key_blocks
+        reference = mesh.shape_keys.reference_key
 
-        total_verts = len(mesh.vertices)
+        if self.scope == 'ACTIVE':
+            keys = [obj.active_shape_key] if obj.active_shape_key else []
+        else:
+            keys = list(key_blocks)
+        keys = [kb for kb in keys if kb != reference]
+        if not keys:
+            self.report({'ERROR'}, "没有可镜像的形态键（基础形态键不能镜像）")
+            return {'CANCELLED'}
 
-        # 获取基础形态键顶点坐标
-        base_coords = np.zeros(total_verts * 3)
-        base_key.data.foreach_get('co', base_coords)
-        base_coords = base_coords.reshape(-1, 3)
+        axis = AXIS_INDEX[self.axis]
+        mirror, side = get_symmetry_map(mesh, self.tolerance, axis)
+        num_verts = len(mesh.vertices)
+
+        # 先读取所有需要的数据，再统一写回，避免写入对侧形态键影响后续读取
+        tensor = ShapeKeyTensor(obj, keys)
+        deltas = tensor.load()
+
+        results = []
+        for k, kb in enumerate(keys):
+            relative_name = tensor.relative_names[k]
+            base = tensor.relative_coords(relative_name)
+            mirrored = mirror_vectors(deltas[k], mirror, side, self.direction, axis)
+            target_name = flip_side_name(kb.name) if self.output == 'FLIPPED_NAME' else kb.name
+            results.append((target_name, relative_name, base + mirrored))
+
+        written = []
+        for target_name, relative_name, co in results:
+            target = key_blocks.get(target_name)
+            if target is None:
+                target = obj.shape_key_add(name=target_name, from_mix=False)
+                target.relative_key = key_blocks[relative_name]
+            target.data.foreach_set('co', co.astype(np.float32).ravel())
+            written.append(target_name)
+        mesh.update()
+
+        unpaired = int(np.count_nonzero(mirror < 0))
+        elapsed = time.time() - start_time
+        print(f"\n镜像形态键 [{obj.name}] (未找到对称点 {unpaired}/{num_verts} 顶点):")
+        for kb, name in zip(keys, written):
+            print(f"  {kb.name} → {name}")
+        level = 'WARNING' if unpaired else 'INFO'
+        self.report({level}, f"已镜像 {len(written)} 个形态键，未找到对称点的顶点 {unpaired} 个 (用时 {elapsed:.2f}s)")
+        return {'FINISHED'}
 
-        # 收集需要删除的形态键名称（从后往前收集，避免删除时索引变化）
-        removed_names = []
-        kept_names = []
 
-        for sk in key_blocks:
-            if sk == sk.relative_key:
-                kept_names.append(sk.name)
-                continue
+class O_ShapeKeysExpression(bpy.types.Operator):
+    bl_idname = "xqfa.shape_keys_expression"
+    bl_label = "形态键运算"
+    bl_description = ("按表达式由已有形态键生成新形态键（加权求和、顶点组遮罩、左右拆分）\n"
+                     "例: Viseme = 0.5 * AA + OH;  Smile_L = Smile @L(0.02);  Jaw = Open @vg(Jaw)\n"
+                     "多条语句用分号分隔，或写在文本编辑器的文本中（每行一条）")
+    bl_options = {'REGISTER', 'UNDO'}
 
-            sk_coords = np.zeros(total_verts * 3)
-            sk.data.foreach_get('co', sk_coords)
-            sk_coords = sk_coords.reshape(-1, 3)
+    expression: bpy.props.StringProperty(
+        name="表达式",
+        description="形态键表达式，多条用分号分隔",
+        default=""
+    )
 
-            diffs = np.linalg.norm(sk_coords - base_coords, axis=1)
-            max_diff = np.max(diffs)
+    text_name: bpy.props.StringProperty(
+        name="文本",
+        description="使用文本编辑器中的文本作为表达式（每行一条，# 开头为注释），优先于表达式",
+        default=""
+    )
 
-            if max_diff <= threshold:
-                removed_names.append(sk.name)
-            else:
-                kept_names.append(sk.name)
+    axis: bpy.props.EnumProperty(name="左右轴", items=AXIS_ITEMS, default='X')
 
-        # 从后往前删除，避免索引变化问题
-        for name in reversed(removed_names):
-            obj.shape_key_remove(key_blocks[name])
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and obj.type == 'MESH' and obj.data.shape_keys is not None
 
-        return {
-            'removed': len(removed_names),
-            'kept': len(kept_names),
-            'removed_names': removed_names,
-            'kept_names': kept_names,
-        }
+    def invoke(self, context, event):
+        wm = context.window_manager
+        return wm.invoke_props_dialog(self, width=420)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "expression")
+        layout.prop_search(self, "text_name", bpy.data, "texts")
+        layout.prop(self, "axis", expand=True)
+
+    def execute(self, context):
+        start_time = time.time()
+        obj = context.active_object
+
+        if self.text_name:
+            text = bpy.data.texts.get(self.text_name)
+            if text is None:
+                self.report({'ERROR'}, f"文本 '{self.text_name}' 不存在")
+                return {'CANCELLED'}
+            source = text.as_string()
+        else:
+            source = self.expression
+
+        try:
+            program = parse_expressions(source)
+            if not program:
+                self.report({'ERROR'}, "表达式为空")
+                return {'CANCELLED'}
+            results = evaluate_expressions(obj, program, AXIS_INDEX[self.axis])
+            created, replaced = write_expression_results(obj, results)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+
+        elapsed = time.time() - start_time
+        print(f"\n形态键运算 [{obj.name}]:")
+        for name in created:
+            print(f"  + {name}")
+        for name in replaced:
+            print(f"  ↻ {name} (已覆盖)")
+        self.report({'INFO'}, f"已生成 {len(created)} 个、覆盖 {len(replaced)} 个形态键 (用时 {elapsed:.2f}s)")
+        return {'FINISHED'}
 
 
 class O_ShapeKeysTransfer(bpy.types.Operator):
     bl_idname = "xqfa.shape_keys_transfer"
     bl_label = "传递形态键"
-    bl_description = "将选择物体A的所有形态键传递给活动物体B（顶点ID需一致）"
+    bl_description = ("将选择物体A的所有形态键传递给活动物体B\n"
+                     "顶点ID：直接复制坐标（顶点数与顺序需一致）\n"
+                     "最近表面：B 的顶点投影到 A 的最近三角形，按重心坐标插值偏移量（拓扑可以不同，对应关系会被缓存）")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    mode: bpy.props.EnumProperty(
+        name="模式",
+        items=[
+            ('INDEX', "顶点ID", "按顶点索引直接复制（顶点数与顺序需一致）"),
+            ('SURFACE', "最近表面", "按最近表面的重心坐标插值偏移量（拓扑无关）"),
+        ],
+        default='INDEX'
+    )
+
+    max_distance: bpy.props.FloatProperty(
+        name="最大距离",
+        description="超过此距离的目标顶点不接收偏移（0 表示不限制）",
+        default=0.0,
+        min=0.0,
+        step=0.1,
+        precision=4,
+        unit='LENGTH',
+    )
+
+    def invoke(self, context, event):
+        wm = context.window_manager
+        return wm.invoke_props_dialog(self, width=250)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "mode", expand=True)
+        row = layout.row()
+        row.enabled = self.mode == 'SURFACE'
+        row.prop(self, "max_distance")
 
     def execute(self, context):
         selected_objs = context.selected_objects
@@ -1018,39 +1076,197 @@ class O_ShapeKeysTransfer(bpy.types.Operator):
 
         src_verts_count = len(source_obj.data.vertices)
         tgt_verts_count = len(target_obj.data.vertices)
-        if src_verts_count != tgt_verts_count:
-            self.report({'ERROR'}, f"顶点数不一致: 源{src_verts_count} ≠ 目标{tgt_verts_count}")
+        if self.mode == 'INDEX' and src_verts_count != tgt_verts_count:
+            self.report({'ERROR'}, f"顶点数不一致: 源{src_verts_count} ≠ 目标{tgt_verts_count}（可使用最近表面模式）")
             return {'CANCELLED'}
 
         # 确保目标物体有形态键基础
         if not target_obj.data.shape_keys:
             target_obj.shape_key_add(name="Basis", from_mix=False)
 
+        if self.mode == 'SURFACE':
+            return self._transfer_surface(source_obj, target_obj)
+
         source_sks = source_obj.data.shape_keys.key_blocks
         target_sks = target_obj.data.shape_keys.key_blocks
 
+        # 源形态键的绝对坐标分块读入同一个 float32 缓冲区
+        tensor = ShapeKeyTensor(source_obj, [sk for sk in source_sks if sk.name != "Basis"],
+                                include_reference=True, relative=False)
+
         transferred = 0
-        for src_sk in source_sks:
-            if src_sk.name == "Basis":
-                continue
+        for start, stop, coords in tensor.chunks():
+            for i, name in enumerate(tensor.names[start:stop]):
+                # 检查目标是否已有同名形态键，没有则创建
+                tgt_sk = target_sks.get(name)
+                if not tgt_sk:
+                    tgt_sk = target_obj.shape_key_add(name=name, from_mix=False)
+
+                # 写入目标形态键
+                tgt_sk.data.foreach_set('co', coords[i].reshape(-1))
+                transferred += 1
+
+        self.report({'INFO'}, f"已传递 {transferred} 个形态键: {source_obj.name} → {target_obj.name}")
+        return {'FINISHED'}
 
-            # 检查目标是否已有同名形态键，没有则创建
-            tgt_sk = target_sks.get(src_sk.name)
-            if not tgt_sk:
-                tgt_sk = target_obj.shape_key_add(name=src_sk.name, from_mix=False)
+    def _transfer_surface(self, source_obj, target_obj):
+        """最近表面模式：偏移量统一相对于基础形态键，插值后叠加到目标的基础形态键上"""
+        start_time = time.time()
+        if not source_obj.data.polygons:
+            self.report({'ERROR'}, f"源物体 ({source_obj.name}) 没有面")
+            return {'CANCELLED'}
 
-            # 获取源形态键顶点数据
-            src_data = np.zeros(src_verts_count * 3, dtype=np.float32)
-            src_sk.data.foreach_get('co', src_data)
+        corners, bary, hit, cached = get_correspondence(source_obj, target_obj, self.max_distance)
+
+        source_key = source_obj.data.shape_keys
+        target_key = target_obj.data.shape_keys
+        target_sks = target_key.key_blocks
+        target_base = read_key_coords(target_key.reference_key)
+
+        # 源局部偏移 → 全局 → 目标局部（只需线性部分）
+        linear = (np.linalg.inv(np.array(target_obj.matrix_world)[:3, :3])
+                  @ np.array(source_obj.matrix_world)[:3, :3]).astype(np.float32)
+
+        tensor = ShapeKeyTensor(source_obj, base=source_key.reference_key.name)
+        # 插值时的临时数组与输出同为目标顶点数，按两者中较大者限制每块的形态键数
+        max_bytes = DEFAULT_CHUNK_BYTES * len(source_obj.data.vertices) // max(
+            len(source_obj.data.vertices), len(target_obj.data.vertices), 1)
+
+        created = []
+        for start, stop, deltas in tensor.chunks(max(max_bytes, 1)):
+            mapped = map_vectors(deltas, corners, bary) @ linear.T
+            for i, k in enumerate(range(start, stop)):
+                name = tensor.names[k]
+                tgt_sk = target_sks.get(name)
+                if not tgt_sk:
+                    tgt_sk = target_obj.shape_key_add(name=name, from_mix=False)
+                    created.append(name)
+                tgt_sk.data.foreach_set('co', (target_base + mapped[i]).reshape(-1))
+
+        # 相对形态键按名称对应（坐标已相对于基础形态键写入，结果与写入顺序无关）
+        source_sks = source_key.key_blocks
+        for name in tensor.names:
+            relative = target_sks.get(source_sks[name].relative_key.name)
+            if name in created and relative is not None and relative != target_sks[name]:
+                target_sks[name].relative_key = relative
+        target_obj.data.update()
+
+        elapsed = time.time() - start_time
+        cache_msg = "复用缓存的对应关系" if cached else "已计算对应关系"
+        self.report({'INFO'}, f"已传递 {tensor.num_keys} 个形态键: {source_obj.name} → {target_obj.name} "
+                              f"({cache_msg}，{int(hit.sum())}/{len(hit)} 个顶点在范围内，用时 {elapsed:.2f}s)")
+        return {'FINISHED'}
 
-            # 写入目标形态键
-            tgt_sk.data.foreach_set('co', src_data)
+class O_ShapeKeysExportSparse(bpy.types.Operator, ExportHelper):
+    bl_idname = "xqfa.shape_keys_export_sparse"
+    bl_label = "导出形态键"
+    bl_description = ("将活动物体的所有形态键导出为稀疏 .npz 文件\n"
+                     "每个形态键只保存受影响顶点的索引与偏移量，以及名称、相对形态键、滑块范围等信息")
+    filename_ext = ".npz"
+    filter_glob: bpy.props.StringProperty(
+        default="*.npz",
+        options={'HIDDEN'},
+    )
 
-            transferred += 1
+    precision: bpy.props.EnumProperty(name="精度", items=PRECISION_ITEMS, default='FLOAT32')
 
-        self.report({'INFO'}, f"已传递 {transferred} 个形态键: {source_obj.name} → {target_obj.name}")
+    threshold: bpy.props.FloatProperty(
+        name="阈值",
+        description="位移不超过此值的顶点不保存（米）",
+        default=0.0,
+        min=0.0,
+        step=0.0001,
+        precision=5
+    )
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and obj.type == 'MESH' and obj.data.shape_keys is not None
+
+    def execute(self, context):
+        start_time = time.time()
+        obj = context.active_object
+        try:
+            result = export_shape_keys(obj, self.filepath, self.precision, self.threshold)
+        except Exception as e:
+            self.report({'ERROR'}, f"导出形态键失败: {e}")
+            return {'CANCELLED'}
+
+        elapsed = time.time() - start_time
+        density = result['entries'] / max(result['keys'] * result['num_verts'], 1)
+        self.report({'INFO'}, f"已导出 {result['keys']} 个形态键 (受影响顶点占 {density:.1%}, "
+                              f"用时 {elapsed:.2f}s): {self.filepath}")
         return {'FINISHED'}
 
+
+class O_ShapeKeysImportSparse(bpy.types.Operator, ImportHelper):
+    bl_idname = "xqfa.shape_keys_import_sparse"
+    bl_label = "导入形态键"
+    bl_description = ("从稀疏 .npz 文件导入形态键到选中的网格物体（顶点ID需一致）\n"
+                     "只解压需要导入的形态键，偏移量叠加到物体自身的相对形态键上")
+    filename_ext = ".npz"
+    filter_glob: bpy.props.StringProperty(
+        default="*.npz",
+        options={'HIDDEN'},
+    )
+
+    name_filter: bpy.props.StringProperty(
+        name="名称筛选",
+        description="要导入的形态键名称，支持通配符，多个用逗号分隔（留空导入全部）",
+        default=""
+    )
+
+    overwrite: bpy.props.BoolProperty(
+        name="覆盖同名形态键",
+        default=True
+    )
+
+    def execute(self, context):
+        start_time = time.time()
+        if not self.filepath or not os.path.exists(self.filepath):
+            self.report({'ERROR'}, "请选择有效的形态键文件")
+            return {'CANCELLED'}
+
+        target_objs = [o for o in context.selected_objects if o.type == 'MESH']
+        if not target_objs:
+            self.report({'ERROR'}, "请先选择网格物体")
+            return {'CANCELLED'}
+
+        try:
+            shape_file = ShapeKeyFile(self.filepath)
+        except Exception as e:
+            self.report({'ERROR'}, f"读取形态键文件失败: {e}")
+            return {'CANCELLED'}
+
+        try:
+            names = shape_file.select(self.name_filter)
+            if not names:
+                self.report({'WARNING'}, "没有符合筛选条件的形态键")
+                return {'CANCELLED'}
+
+            total = 0
+            failed = []
+            for obj in target_objs:
+                try:
+                    result = import_shape_keys(obj, shape_file, names, self.overwrite)
+                except ValueError as e:
+                    failed.append(f"{obj.name}: {e}")
+                    continue
+                total += len(result['imported'])
+                print(f"导入形态键 [{obj.name}]: 导入 {len(result['imported'])} 个，跳过 {len(result['skipped'])} 个")
+        finally:
+            shape_file.close()
+
+        elapsed = time.time() - start_time
+        for line in failed:
+            print(f"  ✕ {line}")
+        level = 'WARNING' if failed else 'INFO'
+        self.report({level}, f"已导入 {total} 个形态键到 {len(target_objs) - len(failed)} 个物体"
+                             f"{f'，{len(failed)} 个物体失败' if failed else ''} (用时 {elapsed:.2f}s)")
+        return {'FINISHED'}
+
+
 class XQFA_OT_ApplyAsShapekey(bpy.types.Operator):
     bl_idname = "xqfa.apply_as_shapekey"
     bl_label = "应用为形态键"
@@ -1115,10 +1331,160 @@ class XQFA_OT_ApplyAsShapekey(bpy.types.Operator):
         
         return {'FINISHED'}
 
+class XQFA_OT_BakeActionShapeKeys(bpy.types.Operator):
+    bl_idname = "xqfa.bake_action_shape_keys"
+    bl_label = "烘焙动作为形态键"
+    bl_description = ("逐帧读取骨架修改器变形后的网格，把帧范围或标记所在的帧一次性烘焙为形态键\n"
+                     "通过依赖图读取求值结果，不切换模式、不逐帧调用操作符；与基础形态键几乎无差异的帧会被跳过")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    source: bpy.props.EnumProperty(
+        name="帧来源",
+        items=[
+            ('RANGE', "帧范围", "按起始帧、结束帧与步长烘焙"),
+            ('POSE_MARKERS', "姿态标记", "骨架当前动作中的姿态标记，形态键以标记命名"),
+            ('TIMELINE_MARKERS', "时间线标记", "场景时间线标记，形态键以标记命名"),
+        ],
+        default='RANGE'
+    )
+
+    frame_start: bpy.props.IntProperty(name="起始帧", default=1)
+    frame_end: bpy.props.IntProperty(name="结束帧", default=60)
+    frame_step: bpy.props.IntProperty(name="步长", default=1, min=1)
+
+    name_prefix: bpy.props.StringProperty(
+        name="名称前缀",
+        description="帧范围模式下形态键的名称前缀（名称为 前缀 + 帧号）",
+        default="Frame_"
+    )
+
+    threshold: bpy.props.FloatProperty(
+        name="阈值",
+        description="最大位移不超过此值的帧不生成形态键（米）",
+        default=0.0001,
+        min=0.0,
+        step=0.0001,
+        precision=5
+    )
+
+    def invoke(self, context, event):
+        self.frame_start = context.scene.frame_start
+        self.frame_end = context.scene.frame_end
+        wm = context.window_manager
+        return wm.invoke_props_dialog(self, width=260)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "source")
+        if self.source == 'RANGE':
+            row = layout.row(align=True)
+            row.prop(self, "frame_start")
+            row.prop(self, "frame_end")
+            layout.prop(self, "frame_step")
+            layout.prop(self, "name_prefix")
+        layout.prop(self, "threshold")
+
+    def _frames(self, scene, armature):
+        """[(帧号, 形态键名称)]"""
+        if self.source == 'RANGE':
+            last = max(self.frame_end, self.frame_start)
+            return [(f, f"{self.name_prefix}{f:03d}") for f in range(self.frame_start, last + 1, self.frame_step)]
+        if self.source == 'POSE_MARKERS':
+            action = armature.animation_data.action if armature.animation_data else None
+            markers = action.pose_markers if action else []
+        else:
+            markers = scene.timeline_markers
+        return sorted(((m.frame, m.name) for m in markers), key=lambda item: item[0])
+
+    def execute(self, context):
+        start_time = time.time()
+        scene = context.scene
+        obj = scene.sk_source_mesh
+        if obj is None or obj.type != 'MESH':
+            self.report({'ERROR'}, "请先选择编辑形态键的网格物体")
+            return {'CANCELLED'}
+        if obj.mode == 'EDIT':
+            self.report({'ERROR'}, "请先退出编辑模式")
+            return {'CANCELLED'}
+
+        armature_mods = [mod for mod in obj.modifiers if mod.type == 'ARMATURE']
+        if len(armature_mods) != 1 or armature_mods[0].object is None:
+            self.report({'ERROR'}, "物体需要且只能有一个指定了骨架的骨架修改器")
+            return {'CANCELLED'}
+        armature = armature_mods[0].object
+
+        frames = self._frames(scene, armature)
+        if not frames:
+            self.report({'ERROR'}, "没有可烘焙的帧（标记为空）")
+            return {'CANCELLED'}
+
+        if not obj.data.shape_keys:
+            obj.shape_key_add(name="Basis", from_mix=False)
+        key_blocks = obj.data.shape_keys.key_blocks
+        basis = read_key_coords(obj.data.shape_keys.reference_key)
+        num_verts = len(basis)
+        threshold_sq = np.float32(self.threshold) ** 2
+
+        # 只保留骨架变形：临时在视图中禁用其它修改器（生成类修改器会改变顶点数）
+        disabled = [mod for mod in obj.modifiers if mod.type != 'ARMATURE' and mod.show_viewport]
+        for mod in disabled:
+            mod.show_viewport = False
+
+        # 固定显示基础形态键，求值结果不混入当前形态键（被驱动/非零值/上次烘焙的同名键）
+        original_show_only = obj.show_only_shape_key
+        original_active_index = obj.active_shape_key_index
+        obj.show_only_shape_key = True
+
+        original_frame = scene.frame_current
+        co = np.empty((num_verts, 3), dtype=np.float32)
+        baked, skipped = [], []
+        try:
+            for frame, name in frames:
+                obj.active_shape_key_index = 0
+                scene.frame_set(frame)
+                depsgraph = context.evaluated_depsgraph_get()
+                obj_eval = obj.evaluated_get(depsgraph)
+                mesh_eval = obj_eval.to_mesh()
+                try:
+                    if len(mesh_eval.vertices) != num_verts:
+                        raise ValueError(f"求值后的顶点数 ({len(mesh_eval.vertices)}) 与原网格 ({num_verts}) 不一致")
+                    mesh_eval.vertices.foreach_get('co', co.reshape(-1))
+                finally:
+                    obj_eval.to_mesh_clear()
+
+                delta = co - basis
+                if not np.any(np.einsum('vi,vi->v', delta, delta) > threshold_sq):
+                    skipped.append(name)
+                    continue
+
+                kb = key_blocks.get(name)
+                if kb is None:
+                    kb = obj.shape_key_add(name=name, from_mix=False)
+                kb.data.foreach_set('co', co.reshape(-1))
+                baked.append(name)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            for mod in disabled:
+                mod.show_viewport = True
+            obj.show_only_shape_key = original_show_only
+            obj.active_shape_key_index = min(original_active_index, len(key_blocks) - 1)
+            scene.frame_set(original_frame)
+        obj.data.update()
+
+        elapsed = time.time() - start_time
+        print(f"\n烘焙动作为形态键 [{obj.name}] ({armature.name}):")
+        for name in baked:
+            print(f"  ✓ {name}")
+        for name in skipped:
+            print(f"  - {name} (与基础形态键无差异，已跳过)")
+        self.report({'INFO'}, f"已烘焙 {len(baked)} 个形态键，跳过 {len(skipped)} 帧 (用时 {elapsed:.2f}s)")
+        return {'FINISHED'}
+
+
 classes = (
-    XqfaShapeKeyPairItem,
     XqfaShapeKeyMappingItem,
-    SKPairList,
     DATA_PT_shape_key_tools,
     O_ShapeKeysMatchRename,
     O_ShapeKeyMappingRemove,
@@ -1129,7 +1495,12 @@ classes = (
     O_ShapeKeysSelectAffectedVertices,
     O_ShapeKeysClean,
     O_ShapeKeysTransfer,
+    O_ShapeKeysMirror,
+    O_ShapeKeysExpression,
+    O_ShapeKeysExportSparse,
+    O_ShapeKeysImportSparse,
     XQFA_OT_ApplyAsShapekey,
+    XQFA_OT_BakeActionShapeKeys,
 )
 
 def register():
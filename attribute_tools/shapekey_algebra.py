@@ -0,0 +1,209 @@
+# type: ignore
+import bpy
+import re
+import numpy as np
+from typing import Dict, List, Tuple
+from .shapekey_tensor import ShapeKeyTensor, read_key_coords
+from .weight_matrix import VertexWeightMatrix
+
+# 形态键表达式：每行（或以 ; 分隔）一条语句，所有语句都基于执行前的形态键计算
+#   输出名 = 项 (+|- 项)*
+#   项     = [系数 *] 形态键 [* 系数] (@ 遮罩)*
+#   形态键 = 不含空白、运算符与 # 的名称，或用双引号括起的任意名称
+#   遮罩   = vg(顶点组) | L(过渡宽度) | R(过渡宽度)
+# 引号外的 # 之后为注释。
+# 例: Viseme_AO = 0.5 * AA + OH;  Smile_L = Smile @L(0.02);  Smile_R = Smile @R(0.02)
+# L/R 以镜像轴正方向为左侧，过渡区内按 smoothstep 渐变，同一宽度下 L + R 恰好等于原形态键。
+
+_TOKEN_RE = re.compile(r'\s*(?:(?P<number>\d+(?:\.\d*)?|\.\d+)|"(?P<quoted>(?:[^"\\]|\\.)*)"|(?P<comment>#.*)'
+                       r'|(?P<op>[=+\-*@(),;])|(?P<name>[^\s"#=+\-*@(),;]+))')
+
+MASK_FUNCTIONS = ('vg', 'L', 'R')
+
+
+def _tokenize(text: str, line_no: int) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"第 {line_no} 行: 无法解析 '{text[pos:]}'")
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == 'comment':
+            break
+        if kind == 'quoted':
+            kind, value = 'name', value.replace('\\"', '"').replace('\\\\', '\\')
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, str]], line_no: int):
+        self.tokens = tokens
+        self.pos = 0
+        self.line_no = line_no
+
+    def error(self, message: str):
+        raise ValueError(f"第 {self.line_no} 行: {message}")
+
+    def peek(self, value: str = None):
+        if self.pos >= len(self.tokens):
+            return None
+        token = self.tokens[self.pos]
+        return token if value is None or token == ('op', value) else None
+
+    def take(self, kind: str = None, value: str = None):
+        token = self.peek()
+        if token is None or (kind and token[0] != kind) or (value and token[1] != value):
+            expected = value or {'name': "名称", 'number': "数字"}.get(kind, "符号")
+            self.error(f"此处需要 {expected}")
+        self.pos += 1
+        return token[1]
+
+    def statement(self):
+        target = self.take('name')
+        self.take('op', '=')
+        sign = -1.0 if self.peek('-') else 1.0
+        if self.peek('-') or self.peek('+'):
+            self.pos += 1
+        terms = [self.term(sign)]
+        while self.peek() is not None:
+            sign = self.take('op')
+            if sign not in '+-':
+                self.error(f"意外的符号 '{sign}'")
+            terms.append(self.term(1.0 if sign == '+' else -1.0))
+        return target, terms
+
+    def term(self, sign: float):
+        coef = sign
+        if self.peek() and self.peek()[0] == 'number':
+            coef *= float(self.take('number'))
+            self.take('op', '*')
+        key = self.take('name')
+        if self.peek('*'):
+            self.take('op', '*')
+            coef *= float(self.take('number'))
+        masks = []
+        while self.peek('@'):
+            self.take('op', '@')
+            func = self.take('name')
+            if func not in MASK_FUNCTIONS:
+                self.error(f"未知的遮罩 '{func}'（可用: {', '.join(MASK_FUNCTIONS)}）")
+            self.take('op', '(')
+            arg = self.take('name') if func == 'vg' else float(self.take('number'))
+            self.take('op', ')')
+            masks.append((func, arg))
+        return coef, key, masks
+
+
+def parse_expressions(text: str) -> List[Tuple[str, List[tuple]]]:
+    """
+    解析表达式文本，返回 [(输出名, [(系数, 形态键名, [(遮罩, 参数)])])]。
+    空行与 # 开头的注释行被忽略。
+    """
+    program = []
+    for line_no, line in enumerate(text.splitlines(), 1):
+        # 先对整行分词（引号内的 ; 与 # 属于名称），再按 ; 拆分语句
+        statement = []
+        for token in _tokenize(line, line_no) + [('op', ';')]:
+            if token != ('op', ';'):
+                statement.append(token)
+                continue
+            if statement:
+                program.append(_Parser(statement, line_no).statement())
+            statement = []
+    return program
+
+
+def side_weights(coord: np.ndarray, width: float) -> np.ndarray:
+    """正侧（左）的权重：过渡宽度内 smoothstep 渐变，width 为 0 时为硬边界（平面上为 0.5）"""
+    if width <= 0:
+        return np.where(coord > 0, 1.0, np.where(coord < 0, 0.0, 0.5)).astype(np.float32)
+    t = np.clip(coord / width + 0.5, 0.0, 1.0)
+    return (t * t * (3.0 - 2.0 * t)).astype(np.float32)
+
+
+def evaluate_expressions(obj: bpy.types.Object,
+                         program: List[Tuple[str, List[tuple]]],
+                         axis: int = 0) -> Dict[str, np.ndarray]:
+    """
+    在偏移张量上计算所有输出（偏移量统一相对于基础形态键）。
+    只读取被引用的形态键；同一遮罩只计算一次。返回 {输出名: (V, 3) float32 偏移量}。
+    """
+    key = obj.data.shape_keys
+    key_blocks = key.key_blocks
+    reference = key.reference_key
+
+    referenced = []
+    for _target, terms in program:
+        for _coef, name, _masks in terms:
+            if key_blocks.get(name) is None:
+                raise ValueError(f"形态键 '{name}' 不存在")
+            if name not in referenced and name != reference.name:
+                referenced.append(name)
+
+    tensor = ShapeKeyTensor(obj, referenced, base=reference.name)
+    deltas = tensor.load()
+    row = {name: i for i, name in enumerate(tensor.names)}
+
+    rest = read_key_coords(reference)
+    weights = None
+    masks: Dict[tuple, np.ndarray] = {}
+
+    def mask_of(func, arg):
+        nonlocal weights
+        if (func, arg) in masks:
+            return masks[(func, arg)]
+        if func == 'vg':
+            if weights is None:
+                weights = VertexWeightMatrix.from_object(obj)
+            if arg not in weights.group_names:
+                raise ValueError(f"顶点组 '{arg}' 不存在")
+            verts, values = weights.group_entries(weights.group_names.index(arg))
+            mask = np.zeros(len(rest), dtype=np.float32)
+            mask[verts] = values
+        else:
+            mask = side_weights(rest[:, axis], arg)
+            if func == 'R':
+                mask = 1.0 - mask
+        masks[(func, arg)] = mask
+        return mask
+
+    results = {}
+    for target, terms in program:
+        out = np.zeros_like(rest)
+        for coef, name, term_masks in terms:
+            if name == reference.name:
+                continue
+            factor = np.full(len(rest), coef, dtype=np.float32)
+            for func, arg in term_masks:
+                factor *= mask_of(func, arg)
+            out += deltas[row[name]] * factor[:, None]
+        results[target] = out
+    return results
+
+
+def write_expression_results(obj: bpy.types.Object, results: Dict[str, np.ndarray]) -> Tuple[List[str], List[str]]:
+    """每个输出形态键一次 foreach_set（基础形态键坐标 + 偏移量），返回 (新建, 覆盖) 名称列表"""
+    key = obj.data.shape_keys
+    key_blocks = key.key_blocks
+    reference = key.reference_key
+    rest = read_key_coords(reference)
+
+    created, replaced = [], []
+    for name, delta in results.items():
+        kb = key_blocks.get(name)
+        if kb == reference:
+            raise ValueError(f"不能写入基础形态键 '{name}'")
+        if kb is None:
+            kb = obj.shape_key_add(name=name, from_mix=False)
+            created.append(name)
+        else:
+            replaced.append(name)
+        kb.relative_key = reference
+        kb.data.foreach_set('co', (rest + delta).reshape(-1))
+    obj.data.update()
+    return created, replaced
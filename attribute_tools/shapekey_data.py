@@ -0,0 +1,294 @@
+# type: ignore
+import bpy
+import re
+import hashlib
+import numpy as np
+from typing import Dict, Iterator, List, Optional
+from .mesh_data import SHAPE_KEY_PROPS
+from .shapekey_tensor import ShapeKeyTensor, DEFAULT_CHUNK_BYTES, read_key_coords
+
+# 在数据层重排形态键：先快照所有形态键（坐标与属性），删除后按目标顺序一次性重建，
+# 每个形态键只调用一次 shape_key_remove / shape_key_add，不经过 bpy.ops（无撤销推送）。
+
+# 引用形态键的数据路径：key_blocks["名称"]... 或 key_blocks[索引]...
+_KEY_PATH_RE = re.compile(r'^key_blocks\[(?:"((?:[^"\\]|\\.)*)"|(\d+))\](.*)$')
+
+# 重建期间暂存动画曲线路径的前缀（防止删除形态键时连带删除其驱动器/动画曲线）
+_PARKED_PATH = "__xqfa_parked__"
+
+
+def snapshot_shape_key(kb: bpy.types.ShapeKey) -> Dict[str, any]:
+    """形态键的完整快照：名称、坐标、相对形态键名称及 SHAPE_KEY_PROPS"""
+    snapshot = {
+        'name': kb.name,
+        'co': read_key_coords(kb),
+        'relative_key': kb.relative_key.name,
+    }
+    for prop in SHAPE_KEY_PROPS:
+        snapshot[prop] = getattr(kb, prop)
+    return snapshot
+
+
+def key_path(name: str, suffix: str = "") -> str:
+    """按名称引用形态键的数据路径"""
+    return f'key_blocks["{bpy.utils.escape_identifier(name)}"]{suffix}'
+
+
+def parse_key_path(path: str, names: List[str]) -> Optional[tuple]:
+    """解析引用形态键的数据路径，返回 (形态键名称, 后缀)；names 用于解析按索引的路径"""
+    m = _KEY_PATH_RE.match(path or "")
+    if not m:
+        return None
+    if m.group(1) is not None:
+        return bpy.utils.unescape_identifier(m.group(1)), m.group(3)
+    index = int(m.group(2))
+    if index >= len(names):
+        return None
+    return names[index], m.group(3)
+
+
+def _key_fcurves(key: bpy.types.Key) -> Iterator[bpy.types.FCurve]:
+    """形态键数据块自身的驱动器与动作曲线"""
+    anim = key.animation_data
+    if anim is None:
+        return
+    yield from anim.drivers
+    action = anim.action
+    fcurves = getattr(action, 'fcurves', None) if action else None
+    if fcurves:
+        yield from fcurves
+
+
+def _driver_targets(key: bpy.types.Key) -> Iterator[bpy.types.DriverTarget]:
+    """所有驱动器变量中指向该形态键数据块的目标"""
+    for collection in (bpy.data.shape_keys, bpy.data.objects, bpy.data.meshes):
+        for owner in collection:
+            anim = owner.animation_data
+            if anim is None:
+                continue
+            for fcurve in anim.drivers:
+                for variable in fcurve.driver.variables:
+                    for target in variable.targets:
+                        if target.id == key:
+                            yield target
+
+
+def animated_key_names(key: bpy.types.Key) -> set:
+    """有动画曲线或驱动器作用于 key_blocks["名称"] 的形态键名称"""
+    names = [kb.name for kb in key.key_blocks]
+    animated = set()
+    for fcurve in _key_fcurves(key):
+        parsed = parse_key_path(fcurve.data_path, names)
+        if parsed:
+            animated.add(parsed[0])
+    return animated
+
+
+def reorder_shape_keys(obj: bpy.types.Object,
+                       order: List[str],
+                       basis: Optional[str] = None) -> Dict[str, int]:
+    """
+    按 order 在数据层一次性重建物体的形态键（O(K) 次 API 调用）：
+    - basis（默认当前基础形态键）排在第一位，复用原基础形态键的数据块
+    - order 中已有的形态键按顺序排列，不存在的名称新建空键
+    - 其余形态键保持原相对顺序放到末尾
+    保留坐标、相对形态键与 SHAPE_KEY_PROPS；驱动器与动画曲线按名称重新指向，
+    按索引引用形态键的路径（包括其它驱动器的变量）改写为按名称引用。
+    返回 {'matched', 'added', 'extra'}。
+    """
+    if not obj.data.shape_keys:
+        obj.shape_key_add(name=basis or "Basis", from_mix=False)
+
+    mesh = obj.data
+    key = mesh.shape_keys
+    key_blocks = key.key_blocks
+    names = [kb.name for kb in key_blocks]
+    basis = basis if basis in names else names[0]
+    active_name = obj.active_shape_key.name if obj.active_shape_key else None
+
+    # 1. 目标顺序
+    final_order = [basis]
+    seen = {basis}
+    matched = added = 0
+    for name in order:
+        if name in seen:
+            continue
+        seen.add(name)
+        final_order.append(name)
+        if name in names:
+            matched += 1
+        else:
+            added += 1
+    extras = [name for name in names if name not in seen]
+    final_order += extras
+
+    if final_order == names:
+        return {'matched': matched, 'added': 0, 'extra': len(extras)}
+
+    # 2. 快照
+    snapshots = {kb.name: snapshot_shape_key(kb) for kb in key_blocks}
+
+    # 3. 自身的动画曲线与指向该数据块的驱动器变量都暂存到无效路径（按索引的路径解析为名称）：
+    #    删除形态键会连带删除其动画曲线，重命名基础形态键时 Blender 会改写所有引用旧名称的路径
+    parked = []
+    for i, fcurve in enumerate(_key_fcurves(key)):
+        parsed = parse_key_path(fcurve.data_path, names)
+        if parsed:
+            parked.append((fcurve, parsed))
+            fcurve.data_path = f"{_PARKED_PATH}{i}"
+
+    for i, target in enumerate(_driver_targets(key)):
+        parsed = parse_key_path(target.data_path, names)
+        if parsed:
+            parked.append((target, parsed))
+            target.data_path = f"{_PARKED_PATH}var{i}"
+
+    # 4. 删除除基础形态键外的全部形态键，再按顺序重建
+    for kb in reversed(key_blocks[1:]):
+        obj.shape_key_remove(kb)
+
+    reference = key_blocks[0]
+    if reference.name != basis:
+        reference.name = basis
+        co = snapshots[basis]['co']
+        reference.data.foreach_set('co', co.ravel())
+        mesh.vertices.foreach_set('co', co.ravel())
+        for prop in SHAPE_KEY_PROPS:
+            setattr(reference, prop, snapshots[basis][prop])
+
+    for name in final_order[1:]:
+        kb = obj.shape_key_add(name=name, from_mix=False)
+        snapshot = snapshots.get(name)
+        if snapshot is None:
+            continue
+        kb.data.foreach_set('co', snapshot['co'].ravel())
+        for prop in SHAPE_KEY_PROPS:
+            setattr(kb, prop, snapshot[prop])
+
+    # 相对形态键在全部重建后再设置（可能引用排在后面的形态键）
+    for kb in key_blocks[1:]:
+        snapshot = snapshots.get(kb.name)
+        if snapshot is not None:
+            relative = key_blocks.get(snapshot['relative_key'])
+            if relative == kb:
+                relative = None
+            kb.relative_key = relative if relative is not None else reference
+
+    # 5. 恢复动画曲线与驱动器变量的路径（统一按名称引用）
+    for owner, (name, suffix) in parked:
+        owner.data_path = key_path(name, suffix)
+
+    if active_name is not None:
+        obj.active_shape_key_index = max(key_blocks.find(active_name), 0)
+    mesh.update()
+
+    return {'matched': matched, 'added': added, 'extra': len(extras)}
+
+
+def _delta_digest(delta: np.ndarray, relative_name: str, tolerance: float, offset: float = 0.0) -> bytes:
+    """
+    偏移量的内容哈希：tolerance > 0 时先按 tolerance 量化（近似重复，offset 为量化网格的偏移，单位为格），
+    否则直接哈希原始字节
+    """
+    h = hashlib.blake2b(relative_name.encode('utf-8'), digest_size=16)
+    if tolerance > 0:
+        h.update(np.floor(delta / tolerance + offset).astype(np.int32).tobytes())
+    else:
+        h.update(np.ascontiguousarray(delta).tobytes())
+    return h.digest()
+
+
+def clean_shape_keys(obj: bpy.types.Object,
+                     threshold: float,
+                     duplicate_mode: str = 'NONE',
+                     duplicate_tolerance: float = 0.0001,
+                     zero_noise: bool = False,
+                     max_bytes: int = DEFAULT_CHUNK_BYTES) -> Dict[str, any]:
+    """
+    分块读取偏移张量，一次遍历完成形态键清理：
+    - 空形态键：最大位移 <= threshold
+    - 重复形态键（duplicate_mode 为 EXACT / NEAR）：相对形态键相同且偏移量的哈希相同，每组只保留第一个。
+      NEAR 模式按 duplicate_tolerance 在两套错开半格的网格上量化并分别哈希，任一命中后再逐顶点校验最大差值。
+      这只是近似检测：差值在容差内、但在两套网格上都有分量跨越量化边界的形态键对会被漏检（不会误删）。
+      只保存哈希，不保留偏移量，内存占用与形态键数量无关
+    - zero_noise：把位移 <= threshold 的顶点写回相对形态键的位置（被其它形态键作为相对形态键的除外）
+    被用作相对形态键的形态键不会被删除；有动画曲线或驱动器的形态键不会作为重复项删除
+    （删除形态键会连带删除其动画曲线/驱动器）。返回删除/清零统计与节省的字节数。
+    """
+    key_blocks = obj.data.shape_keys.key_blocks
+    tensor = ShapeKeyTensor(obj, [sk for sk in key_blocks if sk != sk.relative_key])
+    used_as_relative = {sk.relative_key.name for sk in key_blocks if sk != sk.relative_key}
+    animated = animated_key_names(obj.data.shape_keys)
+    tolerance = duplicate_tolerance if duplicate_mode == 'NEAR' else 0.0
+    threshold_sq = np.float32(threshold) ** 2
+
+    empty_names: List[str] = []
+    duplicates: List[tuple] = []                    # (重复项, 保留项)
+    representatives: Dict[bytes, int] = {}
+    noise_vertices = 0
+    zeroed_keys = 0
+
+    for start, stop, deltas in tensor.chunks(max_bytes):
+        lengths_sq = np.einsum('kvi,kvi->kv', deltas, deltas)
+        for i, k in enumerate(range(start, stop)):
+            name = tensor.names[k]
+            relative_name = tensor.relative_names[k]
+            noise = (lengths_sq[i] <= threshold_sq) & (lengths_sq[i] > 0)
+
+            if not np.any(lengths_sq[i] > threshold_sq):
+                if name not in used_as_relative:
+                    empty_names.append(name)
+                continue
+
+            if zero_noise and name not in used_as_relative and np.any(noise):
+                deltas[i][noise] = 0.0
+                co = tensor.relative_coords(relative_name) + deltas[i]
+                tensor.blocks[k].data.foreach_set('co', co.reshape(-1))
+                noise_vertices += int(np.count_nonzero(noise))
+                zeroed_keys += 1
+
+            if duplicate_mode == 'NONE':
+                continue
+            offsets = (0.0, 0.5) if tolerance > 0 else (0.0,)
+            digests = [_delta_digest(deltas[i], relative_name, tolerance, offset) for offset in offsets]
+            first = next((representatives[d] for d in digests if d in representatives), None)
+            if first is None:
+                for digest in digests:
+                    representatives[digest] = k
+                continue
+            if name in used_as_relative or name in animated:
+                continue
+            if tolerance > 0:
+                # 量化哈希命中后逐顶点校验，避免量化误差累积导致误删
+                kept_delta = read_key_coords(tensor.blocks[first]) - tensor.relative_coords(relative_name)
+                if np.max(np.abs(kept_delta - deltas[i]), initial=0.0) > tolerance:
+                    continue
+            duplicates.append((name, tensor.names[first]))
+
+    removed_names = empty_names + [name for name, _kept in duplicates]
+    removed_set = set(removed_names)
+    for name in reversed([kb.name for kb in key_blocks if kb.name in removed_set]):
+        obj.shape_key_remove(key_blocks[name])
+    if zeroed_keys:
+        obj.data.update()
+
+    return {
+        'removed': len(removed_names),
+        'empty_names': empty_names,
+        'duplicates': duplicates,
+        'kept_names': [kb.name for kb in key_blocks],
+        'noise_vertices': noise_vertices,
+        'zeroed_keys': zeroed_keys,
+        'bytes_saved': len(removed_names) * tensor.num_verts * 3 * 4,
+    }
+
+
+def format_bytes(num_bytes: int) -> str:
+    """字节数的可读格式"""
+    if num_bytes < 1024:
+        return f"{num_bytes} B"
+    size = float(num_bytes)
+    for unit in ("KB", "MB", "GB"):
+        size /= 1024
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
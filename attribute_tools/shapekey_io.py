@@ -0,0 +1,164 @@
+# type: ignore
+import bpy
+import json
+import numpy as np
+from typing import Dict, List
+from .mesh_data import SHAPE_KEY_PROPS
+from .shapekey_tensor import ShapeKeyTensor, read_key_coords, match_names
+
+# 稀疏形态键文件 (.npz)：
+# - meta:      JSON 字符串 {'version', 'num_verts', 'precision', 'basis', 'keys': [{'name', 'relative_key', SHAPE_KEY_PROPS...}]}
+# - k{i}_idx:  第 i 个形态键受影响顶点的索引 (int32)
+# - k{i}_co:   对应顶点相对于相对形态键的偏移量 (n x 3, float16/float32)
+# npz 中每个数组单独压缩，读取时只解压被请求的形态键。
+FORMAT_VERSION = 1
+
+PRECISION_ITEMS = [
+    ('FLOAT32', "Float32", "单精度偏移量（无损）"),
+    ('FLOAT16', "Float16", "半精度偏移量（文件更小，约 3 位有效数字）"),
+]
+
+_PRECISION_DTYPES = {'FLOAT32': np.float32, 'FLOAT16': np.float16}
+
+
+def export_shape_keys(obj: bpy.types.Object,
+                      filepath: str,
+                      precision: str = 'FLOAT32',
+                      threshold: float = 0.0,
+                      compress: bool = True) -> Dict[str, any]:
+    """
+    把物体所有非基础形态键导出为稀疏 .npz：只保存位移 > threshold 的顶点。
+    偏移量分块读取自 ShapeKeyTensor，返回 {'keys', 'entries', 'num_verts'}。
+    """
+    key = obj.data.shape_keys
+    dtype = _PRECISION_DTYPES[precision]
+    tensor = ShapeKeyTensor(obj)
+
+    arrays: Dict[str, np.ndarray] = {}
+    keys_meta: List[Dict[str, any]] = []
+    entries = 0
+    threshold_sq = np.float32(threshold) ** 2
+
+    for start, stop, deltas in tensor.chunks():
+        lengths_sq = np.einsum('kvi,kvi->kv', deltas, deltas)
+        for i, k in enumerate(range(start, stop)):
+            kb = tensor.blocks[k]
+            index = np.flatnonzero(lengths_sq[i] > threshold_sq).astype(np.int32)
+            arrays[f"k{k}_idx"] = index
+            arrays[f"k{k}_co"] = deltas[i][index].astype(dtype)
+            entry = {'name': kb.name, 'relative_key': tensor.relative_names[k]}
+            for prop in SHAPE_KEY_PROPS:
+                entry[prop] = getattr(kb, prop)
+            keys_meta.append(entry)
+            entries += len(index)
+
+    meta = {
+        'version': FORMAT_VERSION,
+        'num_verts': tensor.num_verts,
+        'precision': precision,
+        'basis': key.reference_key.name,
+        'keys': keys_meta,
+    }
+    arrays['meta'] = np.array(json.dumps(meta, ensure_ascii=False))
+
+    save = np.savez_compressed if compress else np.savez
+    with open(filepath, 'wb') as f:
+        save(f, **arrays)
+
+    return {'keys': len(keys_meta), 'entries': entries, 'num_verts': tensor.num_verts}
+
+
+class ShapeKeyFile:
+    """
+    延迟读取的稀疏形态键文件：打开时只解析 meta，
+    delta(name) 时才解压对应形态键的数组。
+    """
+
+    def __init__(self, filepath: str):
+        self.archive = np.load(filepath, allow_pickle=False)
+        self.meta = json.loads(str(self.archive['meta']))
+        if self.meta.get('version', 0) > FORMAT_VERSION:
+            raise ValueError(f"不支持的文件版本: {self.meta.get('version')}")
+        self.num_verts = int(self.meta['num_verts'])
+        self.keys = self.meta['keys']
+        self._index = {entry['name']: i for i, entry in enumerate(self.keys)}
+
+    @property
+    def names(self) -> List[str]:
+        return [entry['name'] for entry in self.keys]
+
+    def select(self, pattern: str = "") -> List[str]:
+        """按通配符筛选形态键名称（逗号分隔多个模式，留空为全部）"""
+        return match_names(self.names, pattern)
+
+    def entry(self, name: str) -> Dict[str, any]:
+        return self.keys[self._index[name]]
+
+    def delta(self, name: str) -> tuple:
+        """(顶点索引, 偏移量 float32)"""
+        i = self._index[name]
+        return self.archive[f"k{i}_idx"], self.archive[f"k{i}_co"].astype(np.float32)
+
+    def close(self) -> None:
+        self.archive.close()
+
+
+def import_shape_keys(obj: bpy.types.Object,
+                      shape_file: ShapeKeyFile,
+                      names: List[str],
+                      overwrite: bool = True) -> Dict[str, any]:
+    """
+    把文件中指定的形态键导入物体：形态键坐标 = 相对形态键坐标 + 偏移量。
+    相对形态键按名称查找，找不到时使用基础形态键。已存在的同名形态键在 overwrite 时覆盖，否则跳过。
+    """
+    mesh = obj.data
+    if len(mesh.vertices) != shape_file.num_verts:
+        raise ValueError(f"顶点数不一致: 文件{shape_file.num_verts} ≠ 物体{len(mesh.vertices)}")
+
+    if not mesh.shape_keys:
+        obj.shape_key_add(name=shape_file.meta.get('basis', "Basis"), from_mix=False)
+    key_blocks = mesh.shape_keys.key_blocks
+
+    # 先创建全部形态键，相对形态键可能是同一批导入的形态键
+    imported: List[str] = []
+    skipped: List[str] = []
+    for name in names:
+        kb = key_blocks.get(name)
+        if kb is not None and (not overwrite or kb == mesh.shape_keys.reference_key):
+            skipped.append(name)
+            continue
+        if kb is None:
+            kb = obj.shape_key_add(name=name, from_mix=False)
+        entry = shape_file.entry(name)
+        for prop in SHAPE_KEY_PROPS:
+            if prop in entry:
+                setattr(kb, prop, entry[prop])
+        imported.append(name)
+
+    for name in imported:
+        kb = key_blocks[name]
+        relative = key_blocks.get(shape_file.entry(name)['relative_key'])
+        kb.relative_key = relative if relative is not None and relative != kb else mesh.shape_keys.reference_key
+
+    # 按相对关系的依赖顺序写入坐标（相对形态键先于依赖它的形态键）
+    pending = set(imported)
+    relative_coords: Dict[str, np.ndarray] = {}
+    while pending:
+        ready = [n for n in imported if n in pending and key_blocks[n].relative_key.name not in pending]
+        if not ready:
+            ready = [n for n in imported if n in pending]
+        for name in ready:
+            pending.discard(name)
+            kb = key_blocks[name]
+            relative_name = kb.relative_key.name
+            if relative_name not in relative_coords:
+                relative_coords[relative_name] = read_key_coords(kb.relative_key)
+            co = relative_coords[relative_name].copy()
+            index, delta = shape_file.delta(name)
+            co[index] += delta
+            kb.data.foreach_set('co', co.reshape(-1))
+            # 后续形态键可能以它为相对形态键
+            relative_coords.pop(name, None)
+
+    mesh.update()
+    return {'imported': imported, 'skipped': skipped}
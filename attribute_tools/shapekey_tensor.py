@@ -0,0 +1,279 @@
+# type: ignore
+import bpy
+import fnmatch
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 分块读取时单块偏移张量的默认内存上限
+DEFAULT_CHUNK_BYTES = 256 * 1024 * 1024
+
+
+def read_key_coords(key_block: bpy.types.ShapeKey, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """用 foreach_get 把形态键坐标读入 float32 (V x 3) 数组，可传入预分配的 out"""
+    num_verts = len(key_block.data)
+    if out is None:
+        out = np.empty((num_verts, 3), dtype=np.float32)
+    key_block.data.foreach_get('co', out.reshape(-1))
+    return out
+
+
+def match_names(names: Sequence[str], pattern: str) -> List[str]:
+    """按通配符筛选名称（逗号分隔多个模式，留空为全部），保持原顺序"""
+    patterns = [p.strip() for p in pattern.split(',') if p.strip()]
+    if not patterns:
+        return list(names)
+    return [name for name in names if any(fnmatch.fnmatchcase(name, p) for p in patterns)]
+
+
+def chunk_size(num_verts: int, max_bytes: int = DEFAULT_CHUNK_BYTES) -> int:
+    """在内存上限内，一块最多容纳的形态键数量"""
+    return max(1, int(max_bytes // max(num_verts * 3 * 4, 1)))
+
+
+class ShapeKeyTensor:
+    """
+    形态键偏移张量：deltas 为预分配的 float32 (K, V, 3)，
+    deltas[k] = key_k.co - key_k.relative_key.co（relative=False 时为绝对坐标，
+    给定 base 时统一相对于名为 base 的形态键）。
+
+    - names / indices: 各形态键的名称与在 key_blocks 中的索引
+    - relative_names:  各形态键的相对（参考）形态键名称
+    - 相对形态键的坐标按名称缓存，多块读取时只读一次
+    """
+
+    def __init__(self, obj: bpy.types.Object, keys: Optional[Sequence] = None,
+                 include_reference: bool = False, relative: bool = True, base: Optional[str] = None):
+        shape_keys = obj.data.shape_keys
+        key_blocks = shape_keys.key_blocks
+        reference = shape_keys.reference_key
+
+        if keys is None:
+            blocks = list(key_blocks)
+        else:
+            blocks = [key_blocks[k] if isinstance(k, (str, int)) else k for k in keys]
+        if not include_reference:
+            blocks = [kb for kb in blocks if kb != reference]
+
+        self.obj = obj
+        self.blocks = blocks
+        self.names: List[str] = [kb.name for kb in blocks]
+        self.indices: List[int] = [key_blocks.find(kb.name) for kb in blocks]
+        self.relative_names: List[str] = [base if base else kb.relative_key.name for kb in blocks]
+        self.relative = relative
+        self.num_verts = len(obj.data.vertices)
+        self.deltas = np.zeros((0, self.num_verts, 3), dtype=np.float32)
+        self._relative_cache: Dict[str, np.ndarray] = {}
+
+    @property
+    def num_keys(self) -> int:
+        return len(self.blocks)
+
+    def relative_coords(self, name: str) -> np.ndarray:
+        """相对形态键的坐标（缓存）"""
+        co = self._relative_cache.get(name)
+        if co is None:
+            co = read_key_coords(self.obj.data.shape_keys.key_blocks[name])
+            self._relative_cache[name] = co
+        return co
+
+    def fill(self, start: int, stop: int, out: np.ndarray) -> np.ndarray:
+        """把第 start..stop 个形态键读入 out[:stop-start]（不分配新内存）"""
+        view = out[:stop - start]
+        for i, k in enumerate(range(start, stop)):
+            read_key_coords(self.blocks[k], view[i])
+            if self.relative:
+                view[i] -= self.relative_coords(self.relative_names[k])
+        return view
+
+    def load(self) -> np.ndarray:
+        """一次性读取全部形态键到 (K, V, 3) 张量"""
+        self.deltas = np.empty((self.num_keys, self.num_verts, 3), dtype=np.float32)
+        self.fill(0, self.num_keys, self.deltas)
+        return self.deltas
+
+    def chunks(self, max_bytes: int = DEFAULT_CHUNK_BYTES) -> Iterator[tuple]:
+        """
+        分块读取，产出 (start, stop, deltas)。所有块复用同一个预分配缓冲区，
+        deltas 只在下一次迭代前有效。
+        """
+        size = min(chunk_size(self.num_verts, max_bytes), max(self.num_keys, 1))
+        buffer = np.empty((size, self.num_verts, 3), dtype=np.float32)
+        for start in range(0, self.num_keys, size):
+            stop = min(start + size, self.num_keys)
+            yield start, stop, self.fill(start, stop, buffer)
+
+
+# ========== 偏移特征（用于形态键匹配） ==========
+
+# 影响范围位图的位数与空间网格的划分数（网格边长 = 包围盒对角线 / FOOTPRINT_GRID）
+FOOTPRINT_BITS = 4096
+FOOTPRINT_GRID = 48
+
+# 各特征在组合距离中的权重
+DEFAULT_SIGNATURE_WEIGHTS = {
+    'centroid': 1.0,
+    'displacement': 1.0,
+    'magnitude': 0.5,
+    'footprint': 1.0,
+}
+
+
+def footprint_cell(*objects: bpy.types.Object) -> float:
+    """多个物体共用的影响范围网格边长（取全局包围盒对角线的最大值）"""
+    diagonal = 0.0
+    for obj in objects:
+        co = read_key_coords(obj.data.shape_keys.reference_key).astype(np.float64)
+        if not len(co):
+            continue
+        matrix = np.array(obj.matrix_world)
+        world = co @ matrix[:3, :3].T + matrix[:3, 3]
+        diagonal = max(diagonal, float(np.linalg.norm(world.max(axis=0) - world.min(axis=0))))
+    return max(diagonal / FOOTPRINT_GRID, 1e-6)
+
+
+def _footprint_buckets(world_co: np.ndarray, cell: float, bits: int) -> np.ndarray:
+    """把全局坐标按网格量化后哈希到 [0, bits) 的桶（与拓扑无关）"""
+    grid = np.floor(world_co / cell).astype(np.int64)
+    hashed = (grid[:, 0] * 73856093) ^ (grid[:, 1] * 19349663) ^ (grid[:, 2] * 83492791)
+    return np.mod(hashed, bits)
+
+
+def delta_signatures(obj: bpy.types.Object,
+                     cell: float,
+                     min_delta: float = 1e-4,
+                     relative_min: float = 0.01,
+                     bits: int = FOOTPRINT_BITS) -> Dict[str, np.ndarray]:
+    """
+    分块读取偏移张量，向量化计算每个非基础形态键的偏移特征（全局坐标）：
+    - centroid:     (K, 3) 以位移长度加权的静止位置中心
+    - displacement: (K, 3) 以位移长度加权的平均位移向量（区分同一区域的不同动作）
+    - magnitude:    (K,)   最大位移长度
+    - radius:       (K,)   受影响区域的加权分布半径（用于把无量纲特征换算为长度）
+    - footprint:    (K, bits) 受影响顶点（位移 > max(min_delta, relative_min × 最大位移)）
+                    所在网格单元的哈希位图
+    另附 names（形态键名称列表）。cell 为网格边长，两个物体比较时必须相同。
+    """
+    key_blocks = obj.data.shape_keys.key_blocks
+    tensor = ShapeKeyTensor(obj, [sk for sk in key_blocks if sk != sk.relative_key])
+    num_keys = tensor.num_keys
+
+    matrix = np.array(obj.matrix_world)
+    rotation = matrix[:3, :3].astype(np.float32)
+    translation = matrix[:3, 3].astype(np.float32)
+
+    centroid = np.zeros((num_keys, 3))
+    displacement = np.zeros((num_keys, 3))
+    magnitude = np.zeros(num_keys)
+    radius = np.zeros(num_keys)
+    footprint = np.zeros((num_keys, bits), dtype=bool)
+
+    # 每个相对形态键的全局静止坐标与哈希桶只计算一次
+    rest: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def rest_of(name):
+        if name not in rest:
+            world = (tensor.relative_coords(name) @ rotation.T + translation).astype(np.float64)
+            rest[name] = (world, (world ** 2).sum(axis=1), _footprint_buckets(world, cell, bits))
+        return rest[name]
+
+    for start, stop, deltas in tensor.chunks():
+        world_deltas = deltas @ rotation.T
+        lengths = np.linalg.norm(world_deltas, axis=2)             # (k, V)
+        totals = lengths.sum(axis=1, dtype=np.float64)
+        safe_totals = np.where(totals > 0, totals, 1.0)
+        peaks = lengths.max(axis=1, initial=0.0)
+
+        displacement[start:stop] = np.einsum('kv,kvi->ki', lengths, world_deltas) / safe_totals[:, None]
+        magnitude[start:stop] = peaks
+
+        cutoff = np.maximum(min_delta, relative_min * peaks)
+        affected = lengths > cutoff[:, None]
+
+        for name in set(tensor.relative_names[start:stop]):
+            local = np.array([k - start for k in range(start, stop) if tensor.relative_names[k] == name])
+            world, squared, buckets = rest_of(name)
+            weights = lengths[local]
+            center = (weights @ world) / safe_totals[local, None]
+            centroid[start + local] = center
+            # 加权方差 = E[|x|²] - |E[x]|²
+            variance = (weights @ squared) / safe_totals[local] - (center ** 2).sum(axis=1)
+            radius[start + local] = np.sqrt(np.maximum(variance, 0.0))
+
+            rows, verts = np.nonzero(affected[local])
+            footprint[start + local[rows], buckets[verts]] = True
+
+    return {
+        'names': tensor.names,
+        'centroid': centroid,
+        'displacement': displacement,
+        'magnitude': magnitude,
+        'radius': radius,
+        'footprint': footprint,
+    }
+
+
+def footprint_jaccard(footprint_b: np.ndarray, footprint_a: np.ndarray) -> np.ndarray:
+    """两组位图之间的 Jaccard 相似度矩阵 (N_b x N_a)，用一次矩阵乘法求交集"""
+    fb = footprint_b.astype(np.float32)
+    fa = footprint_a.astype(np.float32)
+    intersection = fb @ fa.T
+    union = fb.sum(axis=1)[:, None] + fa.sum(axis=1)[None, :] - intersection
+    # 两个都为空（无位移）的形态键视为范围相同
+    return np.where(union > 0, intersection / np.maximum(union, 1.0), 1.0)
+
+
+def signature_distance(sig_b: Dict[str, np.ndarray],
+                       sig_a: Dict[str, np.ndarray],
+                       feature_weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    两组偏移特征之间的组合距离矩阵 (N_b x N_a，长度单位)，用于相似度 = 1 / (1 + 距离)。
+    - centroid:     加权中心距离
+    - displacement: 平均位移向量之差
+    - magnitude:    最大位移之差
+    - footprint:    (1 - Jaccard)，乘以两者的平均分布半径换算为长度
+    """
+    if feature_weights is None:
+        feature_weights = DEFAULT_SIGNATURE_WEIGHTS
+
+    def pairwise(key):
+        return np.linalg.norm(sig_b[key][:, None, :] - sig_a[key][None, :, :], axis=2)
+
+    distance = feature_weights.get('centroid', 0.0) * pairwise('centroid')
+    distance += feature_weights.get('displacement', 0.0) * pairwise('displacement')
+    distance += feature_weights.get('magnitude', 0.0) * np.abs(sig_b['magnitude'][:, None] - sig_a['magnitude'][None, :])
+
+    w = feature_weights.get('footprint', 0.0)
+    if w:
+        scale = 0.5 * (sig_b['radius'][:, None] + sig_a['radius'][None, :])
+        distance += w * scale * (1.0 - footprint_jaccard(sig_b['footprint'], sig_a['footprint']))
+    return distance
+
+
+# ========== 偏移掩码（用于选择） ==========
+
+MASK_OPERATION_ITEMS = [
+    ('UNION', "并集", "任一形态键影响的顶点"),
+    ('INTERSECTION', "交集", "所有形态键都影响的顶点"),
+    ('DIFFERENCE', "差集", "第一个形态键影响、其余形态键都不影响的顶点"),
+]
+
+
+def affected_masks(obj: bpy.types.Object, keys: Sequence, threshold: float) -> np.ndarray:
+    """各形态键的受影响顶点掩码 (K, V)：相对于相对形态键的位移 > threshold"""
+    tensor = ShapeKeyTensor(obj, keys)
+    masks = np.zeros((tensor.num_keys, tensor.num_verts), dtype=bool)
+    threshold_sq = np.float32(threshold) ** 2
+    for start, stop, deltas in tensor.chunks():
+        masks[start:stop] = np.einsum('kvi,kvi->kv', deltas, deltas) > threshold_sq
+    return masks
+
+
+def combine_masks(masks: np.ndarray, operation: str) -> np.ndarray:
+    """按 UNION / INTERSECTION / DIFFERENCE 合并多个顶点掩码"""
+    if len(masks) == 0:
+        return np.zeros(masks.shape[1] if masks.ndim == 2 else 0, dtype=bool)
+    if operation == 'INTERSECTION':
+        return masks.all(axis=0)
+    if operation == 'DIFFERENCE':
+        return masks[0] & ~masks[1:].any(axis=0)
+    return masks.any(axis=0)
@@ -0,0 +1,350 @@
+# type: ignore
+import bpy
+import itertools
+import numpy as np
+from typing import List, Optional, Tuple
+from .mesh_data import read_topology, corner_neighbors
+from .uv_islands import connected_components
+
+# 平滑法线烘焙（描边用）：全部在数组上完成
+# 1. 按拐角角度加权累加面法线得到平滑法线（按顶点索引，或按距离焊接后累加）
+# 2. 用 loops 的切线/副切线/法线构成 TBN，批量求解得到切线空间法线
+# 3. 编码（八面体展开或原始 XYZ），按目标精度量化后写入 UV / 颜色 / 属性
+
+
+def corner_angles(co: np.ndarray, corner_verts: np.ndarray, prev_corner: np.ndarray, next_corner: np.ndarray) -> np.ndarray:
+    """每个拐角的内角（弧度），相邻边退化时为 0"""
+    p = co[corner_verts]
+    e1 = co[corner_verts[next_corner]] - p
+    e2 = co[corner_verts[prev_corner]] - p
+    l1 = np.linalg.norm(e1, axis=1)
+    l2 = np.linalg.norm(e2, axis=1)
+    valid = (l1 > 1e-6) & (l2 > 1e-6)
+    cos = np.einsum('ij,ij->i', e1, e2) / np.where(valid, l1 * l2, 1.0)
+    return np.where(valid, np.arccos(np.clip(cos, -1.0, 1.0)), 0.0)
+
+
+def normalize_rows(vectors: np.ndarray, eps: float = 1e-6) -> np.ndarray:
+    """逐行归一化，长度过小的行保持不变"""
+    length = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.where(length > eps, vectors / np.maximum(length, eps), vectors)
+
+
+def accumulate_normals(keys: np.ndarray, num_keys: int, face_normals: np.ndarray,
+                       corner_face: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """按 keys（每个拐角所属的顶点或焊接组）用 bincount 累加角度加权的面法线并归一化"""
+    weighted = face_normals[corner_face] * weights[:, None]
+    result = np.empty((num_keys, 3))
+    for axis in range(3):
+        result[:, axis] = np.bincount(keys, weights=weighted[:, axis], minlength=num_keys)
+    return normalize_rows(result)
+
+
+def corner_weight_data(mesh: bpy.types.Mesh, matrix: Optional[np.ndarray] = None) -> Tuple[np.ndarray, ...]:
+    """
+    平滑法线累加所需的数据：(顶点坐标 (V,3), corner_verts, corner_face, 拐角角度, 面法线 (P,3))。
+    给出 matrix (4x4) 时坐标与面法线变换到该空间（面法线使用逆转置矩阵）。
+    """
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', co)
+    co = co.reshape(-1, 3).astype(np.float64)
+    face_normals = np.empty(len(mesh.polygons) * 3, dtype=np.float32)
+    mesh.polygons.foreach_get('normal', face_normals)
+    face_normals = face_normals.reshape(-1, 3).astype(np.float64)
+    if matrix is not None:
+        co = co @ matrix[:3, :3].T + matrix[:3, 3]
+        face_normals = normalize_rows(face_normals @ np.linalg.inv(matrix[:3, :3]))
+
+    corner_verts, face_starts, face_sizes = read_topology(mesh)
+    corner_face, prev_corner, next_corner = corner_neighbors(face_starts, face_sizes)
+    weights = corner_angles(co, corner_verts, prev_corner, next_corner)
+    return co, corner_verts, corner_face, weights, face_normals
+
+
+def calc_smooth_normals(mesh: bpy.types.Mesh) -> np.ndarray:
+    """按顶点索引计算角度加权的平滑法线 (V x 3)"""
+    co, corner_verts, corner_face, weights, face_normals = corner_weight_data(mesh)
+    return accumulate_normals(corner_verts, len(co), face_normals, corner_face, weights)
+
+
+def weld_groups(positions: np.ndarray, distance: float) -> Tuple[np.ndarray, int]:
+    """
+    按距离焊接：坐标按 distance 量化到网格（空间哈希），只比较同一格与相邻格内的点，
+    欧氏距离 <= distance 的点相连，再按连通分量分组（焊接可以传递）。
+    distance <= 0 时只焊接坐标完全相同的点。返回 (每个点的组索引, 组数)。
+    """
+    if len(positions) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    if distance <= 0:
+        _unique, groups = np.unique(positions, axis=0, return_inverse=True)
+        groups = groups.reshape(-1)
+        return groups, int(groups.max()) + 1
+
+    cells = np.floor(positions / distance).astype(np.int64)
+    cell_keys, cell_of = np.unique(cells, axis=0, return_inverse=True)
+    cell_of = cell_of.reshape(-1)
+    order = np.argsort(cell_of, kind='stable')
+    counts = np.bincount(cell_of, minlength=len(cell_keys))
+    starts = np.cumsum(counts) - counts
+    points = np.arange(len(positions))
+    distance_sq = distance * distance
+
+    pairs_a, pairs_b = [], []
+    # 半个邻域（含自身格）即可覆盖所有无序点对
+    for offset in itertools.product((-1, 0, 1), repeat=3):
+        if offset < (0, 0, 0):
+            continue
+        if offset == (0, 0, 0):
+            neighbor = cell_of
+        else:
+            # 相邻格 → 格索引（不存在的格为 -1）
+            merged, inverse = np.unique(np.concatenate([cell_keys, cells + offset]), axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            lookup = np.full(len(merged), -1)
+            lookup[inverse[:len(cell_keys)]] = np.arange(len(cell_keys))
+            neighbor = lookup[inverse[len(cell_keys):]]
+        valid = neighbor >= 0
+        a = points[valid]
+        neighbor = neighbor[valid]
+        # 展开 a 与相邻格内所有点的组合
+        repeats = counts[neighbor]
+        a = np.repeat(a, repeats)
+        local = np.arange(len(a)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        b = order[np.repeat(starts[neighbor], repeats) + local]
+        keep = a < b if offset == (0, 0, 0) else np.ones(len(a), dtype=bool)
+        diff = positions[a[keep]] - positions[b[keep]]
+        close = np.einsum('ij,ij->i', diff, diff) <= distance_sq
+        pairs_a.append(a[keep][close])
+        pairs_b.append(b[keep][close])
+
+    return connected_components(len(positions), np.concatenate(pairs_a), np.concatenate(pairs_b))
+
+
+def calc_welded_normals(meshes: List[bpy.types.Mesh],
+                        matrices: List[Optional[np.ndarray]],
+                        distance: float = 0.0001) -> List[np.ndarray]:
+    """
+    按位置焊接的平滑法线：UV 接缝、硬边处拆开的顶点（以及 matrices 给出世界矩阵时不同网格的重合顶点）
+    先按距离合并，再统一累加角度加权的面法线，接缝两侧得到相同的平滑法线。
+    返回每个网格各自空间下的顶点法线 (V_i x 3)。
+    """
+    data = [corner_weight_data(mesh, matrix) for mesh, matrix in zip(meshes, matrices)]
+    offsets = np.cumsum([0] + [len(d[0]) for d in data])
+    face_offsets = np.cumsum([0] + [len(d[4]) for d in data])
+
+    groups, num_groups = weld_groups(np.concatenate([d[0] for d in data]), distance)
+    keys = np.concatenate([groups[offset + d[1]] for offset, d in zip(offsets, data)])
+    corner_face = np.concatenate([offset + d[2] for offset, d in zip(face_offsets, data)])
+    weights = np.concatenate([d[3] for d in data])
+    face_normals = np.concatenate([d[4] for d in data])
+    group_normals = accumulate_normals(keys, num_groups, face_normals, corner_face, weights)
+
+    results = []
+    for i, matrix in enumerate(matrices):
+        normals = group_normals[groups[offsets[i]:offsets[i + 1]]]
+        if matrix is not None:
+            # 法线从世界空间回到物体空间：n_obj ∝ M^T · n_world
+            normals = normalize_rows(normals @ matrix[:3, :3])
+        results.append(normals)
+    return results
+
+
+def read_tangent_frames(mesh: bpy.types.Mesh) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """计算并读取每个拐角的 (tangent, bitangent, normal)，读取后释放切线数据"""
+    mesh.calc_tangents()
+    num_loops = len(mesh.loops)
+    frames = []
+    for prop in ('tangent', 'bitangent', 'normal'):
+        values = np.empty(num_loops * 3, dtype=np.float32)
+        mesh.loops.foreach_get(prop, values)
+        frames.append(values.reshape(-1, 3).astype(np.float64))
+    mesh.free_tangents()
+    return tuple(frames)
+
+
+def to_tangent_space(normals: np.ndarray, tangent: np.ndarray, bitangent: np.ndarray,
+                     normal: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    批量求解 TBN · x = n（TBN 的列为切线、副切线、法线），得到切线空间下的单位法线。
+    不可逆的 TBN 使用 (0, 0, 1)。返回 (结果, 不可逆数量)。
+    """
+    tbn = np.stack([tangent, bitangent, normal], axis=2)
+    singular = np.abs(np.linalg.det(tbn)) < 1e-12
+    tbn[singular] = np.eye(3)
+    result = np.linalg.solve(tbn, normals[:, :, None])[:, :, 0]
+    result[singular] = (0.0, 0.0, 1.0)
+    return normalize_rows(result, 1e-10), int(np.count_nonzero(singular))
+
+
+def octahedral_encode(normals: np.ndarray) -> np.ndarray:
+    """
+    单位向量 → 八面体展开坐标 (N x 2)，范围 [-1, 1]。
+    z < 0 的半球按 (1 - |y|)·sign(x), (1 - |x|)·sign(y) 折叠；零向量编码为 (0, 0)。
+    """
+    l1 = np.abs(normals).sum(axis=1)
+    valid = l1 > 1e-10
+    safe = np.where(valid, l1, 1.0)
+    x = normals[:, 0] / safe
+    y = normals[:, 1] / safe
+    lower = normals[:, 2] < 0
+    folded_x = (1.0 - np.abs(y)) * np.copysign(1.0, x)
+    folded_y = (1.0 - np.abs(x)) * np.copysign(1.0, y)
+    encoded = np.stack([np.where(lower, folded_x, x), np.where(lower, folded_y, y)], axis=1)
+    encoded[~valid] = 0.0
+    return encoded
+
+
+# 输出目标：(存储分量数, 每个存储分量的取值范围)
+# - UV:          八面体 (x, y + 1)，x ∈ [-1, 1]，y + 1 ∈ [0, 2]
+# - COLOR_*:     分量映射到 [0, 1]（c * 0.5 + 0.5），不足三个分量补 0.5，alpha 为 1
+# - ATTRIBUTE:   原始有符号分量，不足三个分量补 0
+OUTPUT_TARGET_ITEMS = [
+    ('UV', "UV贴图", "写入二维UV层（仅支持八面体编码）"),
+    ('COLOR_BYTE', "字节颜色", "写入面拐角的字节颜色属性（固定 8 位精度）"),
+    ('COLOR_FLOAT', "浮点颜色", "写入面拐角的浮点颜色属性"),
+    ('ATTRIBUTE', "浮点向量属性", "写入面拐角的浮点向量属性"),
+]
+
+ENCODING_ITEMS = [
+    ('OCTAHEDRAL', "八面体", "切线空间法线的八面体展开（两个分量）"),
+    ('XYZ', "XYZ", "切线空间法线的原始三个分量"),
+]
+
+QUANTIZATION_ITEMS = [
+    ('FLOAT32', "Float32", "单精度（不量化）"),
+    ('HALF', "Half", "模拟 16 位半精度浮点"),
+    ('FIXED16', "16位定点", "模拟在分量取值范围内的 16 位定点数"),
+    ('FIXED8', "8位定点", "模拟在分量取值范围内的 8 位定点数"),
+]
+
+_COLOR_TARGETS = {'COLOR_BYTE': 'BYTE_COLOR', 'COLOR_FLOAT': 'FLOAT_COLOR'}
+
+
+def octahedral_decode(encoded: np.ndarray) -> np.ndarray:
+    """八面体展开坐标 (N x 2) → 单位向量 (N x 3)，octahedral_encode 的逆变换"""
+    x = encoded[:, 0].astype(np.float64)
+    y = encoded[:, 1].astype(np.float64)
+    z = 1.0 - np.abs(x) - np.abs(y)
+    lower = z < 0
+    unfolded_x = (1.0 - np.abs(y)) * np.copysign(1.0, x)
+    unfolded_y = (1.0 - np.abs(x)) * np.copysign(1.0, y)
+    normals = np.stack([np.where(lower, unfolded_x, x), np.where(lower, unfolded_y, y), z], axis=1)
+    return normalize_rows(normals, 1e-10)
+
+
+def encode_normals(normals: np.ndarray, encoding: str) -> np.ndarray:
+    """单位向量 → 编码分量（八面体 N x 2 或 XYZ N x 3），范围 [-1, 1]"""
+    if encoding == 'OCTAHEDRAL':
+        return octahedral_encode(normals)
+    return normals.copy()
+
+
+def decode_normals(components: np.ndarray, encoding: str) -> np.ndarray:
+    """编码分量 → 单位向量"""
+    if encoding == 'OCTAHEDRAL':
+        return octahedral_decode(components)
+    return normalize_rows(components.astype(np.float64), 1e-10)
+
+
+def _stored_range(target: str, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """存储分量的取值范围 (下限, 上限)"""
+    if target == 'UV':
+        return np.array([-1.0, 0.0]), np.array([1.0, 2.0])
+    if target in _COLOR_TARGETS:
+        return np.zeros(width), np.ones(width)
+    return np.full(width, -1.0), np.ones(width)
+
+
+def pack_output(components: np.ndarray, target: str) -> np.ndarray:
+    """编码分量 → 目标中存储的值（UV 为 N x 2，颜色为 N x 4，属性为 N x 3）"""
+    num, width = components.shape
+    if target == 'UV':
+        if width != 2:
+            raise ValueError("UV贴图只能存储两个分量，请使用八面体编码")
+        stored = components.copy()
+        stored[:, 1] += 1.0
+        return stored
+    if target in _COLOR_TARGETS:
+        stored = np.full((num, 4), 0.5)
+        stored[:, :width] = components * 0.5 + 0.5
+        stored[:, 3] = 1.0
+        return stored
+    stored = np.zeros((num, 3))
+    stored[:, :width] = components
+    return stored
+
+
+def unpack_output(stored: np.ndarray, target: str, width: int) -> np.ndarray:
+    """pack_output 的逆变换，返回 width 个编码分量"""
+    if target == 'UV':
+        components = stored[:, :2].copy()
+        components[:, 1] -= 1.0
+        return components
+    if target in _COLOR_TARGETS:
+        return stored[:, :width] * 2.0 - 1.0
+    return stored[:, :width].copy()
+
+
+def quantize_output(stored: np.ndarray, target: str, quantization: str) -> np.ndarray:
+    """
+    模拟目标精度：Half 为 float16 往返；定点按每个存储分量的取值范围均匀量化。
+    字节颜色本身就是 8 位存储，至少按 8 位定点量化。
+    """
+    if target == 'COLOR_BYTE' and quantization in ('FLOAT32', 'HALF', 'FIXED16'):
+        quantization = 'FIXED8'
+    if quantization == 'FLOAT32':
+        return stored.astype(np.float32).astype(np.float64)
+    if quantization == 'HALF':
+        return stored.astype(np.float16).astype(np.float64)
+    steps = 65535.0 if quantization == 'FIXED16' else 255.0
+    lo, hi = _stored_range(target, stored.shape[1])
+    span = hi - lo
+    return lo + np.rint((np.clip(stored, lo, hi) - lo) / span * steps) / steps * span
+
+
+def angular_error(normals: np.ndarray, decoded: np.ndarray) -> np.ndarray:
+    """逐行两个单位向量间的夹角（度）"""
+    cos = np.clip(np.einsum('ij,ij->i', normals, decoded), -1.0, 1.0)
+    return np.degrees(np.arccos(cos))
+
+
+def encode_for_target(normals: np.ndarray, target: str, encoding: str,
+                      quantization: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    单位向量 → 量化后的存储值，并解码回来计算往返误差。
+    返回 (存储值 float32, 每个向量的角度误差（度）)。
+    """
+    components = encode_normals(normals, encoding)
+    stored = quantize_output(pack_output(components, target), target, quantization)
+    decoded = decode_normals(unpack_output(stored, target, components.shape[1]), encoding)
+    return stored.astype(np.float32), angular_error(normalize_rows(normals, 1e-10), decoded)
+
+
+def write_corner_output(mesh: bpy.types.Mesh, target: str, name: str, stored: np.ndarray) -> str:
+    """把每个拐角的存储值一次 foreach_set 写入目标层（类型或域不符时重建），返回目标描述"""
+    if target == 'UV':
+        layer = mesh.uv_layers.get(name) or mesh.uv_layers.new(name=name)
+        layer.data.foreach_set('uv', stored.reshape(-1))
+        return f"UV {layer.name}"
+
+    if target in _COLOR_TARGETS:
+        data_type = _COLOR_TARGETS[target]
+        attr = mesh.color_attributes.get(name)
+        if attr is not None and (attr.data_type != data_type or attr.domain != 'CORNER'):
+            mesh.color_attributes.remove(attr)
+            attr = None
+        if attr is None:
+            attr = mesh.color_attributes.new(name=name, type=data_type, domain='CORNER')
+        # 字节颜色按 sRGB 值写入，存储的字节即为 round(值 * 255)，不经过颜色空间转换
+        prop = 'color_srgb' if data_type == 'BYTE_COLOR' else 'color'
+        attr.data.foreach_set(prop, stored.reshape(-1))
+        return f"颜色 {attr.name}"
+
+    attr = mesh.attributes.get(name)
+    if attr is not None and (attr.data_type != 'FLOAT_VECTOR' or attr.domain != 'CORNER'):
+        mesh.attributes.remove(attr)
+        attr = None
+    if attr is None:
+        attr = mesh.attributes.new(name=name, type='FLOAT_VECTOR', domain='CORNER')
+    attr.data.foreach_set('vector', stored.reshape(-1))
+    return f"属性 {attr.name}"
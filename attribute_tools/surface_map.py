@@ -0,0 +1,164 @@
+# type: ignore
+import bpy
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from bpy.app.handlers import persistent
+from mathutils.bvhtree import BVHTree
+from typing import Optional, Tuple
+from .weight_matrix import get_world_coords
+from .symmetry import read_coords
+
+# 按两个网格的内容哈希缓存的表面对应关系：(源哈希, 目标哈希, 最大距离) → (corners, bary, hit)
+_CACHE_SIZE = 16
+_correspondence_cache: "OrderedDict[Tuple[str, str, float], Tuple[np.ndarray, np.ndarray, np.ndarray]]" = OrderedDict()
+
+
+def get_triangles(mesh: bpy.types.Mesh) -> np.ndarray:
+    """网格的三角化结果（loop_triangles）的顶点索引 (T x 3)"""
+    mesh.calc_loop_triangles()
+    tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get('vertices', tris)
+    return tris.reshape(-1, 3)
+
+
+def barycentric(points: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """向量化计算点在三角形 (a, b, c) 上的重心坐标 (N x 3)，结果截断到 [0, 1] 并归一化"""
+    v0 = b - a
+    v1 = c - a
+    v2 = points - a
+    d00 = np.einsum('ij,ij->i', v0, v0)
+    d01 = np.einsum('ij,ij->i', v0, v1)
+    d11 = np.einsum('ij,ij->i', v1, v1)
+    d20 = np.einsum('ij,ij->i', v2, v0)
+    d21 = np.einsum('ij,ij->i', v2, v1)
+    denom = d00 * d11 - d01 * d01
+    degenerate = np.abs(denom) < 1e-20
+    denom = np.where(degenerate, 1.0, denom)
+    v = (d11 * d20 - d01 * d21) / denom
+    w = (d00 * d21 - d01 * d20) / denom
+    bary = np.stack([1.0 - v - w, v, w], axis=1)
+    # 退化三角形：全部权重给第一个顶点
+    bary[degenerate] = (1.0, 0.0, 0.0)
+    bary = np.clip(bary, 0.0, 1.0)
+    return bary / np.maximum(bary.sum(axis=1, keepdims=True), 1e-12)
+
+
+class SurfaceIndex:
+    """
+    源网格表面的空间索引（全局坐标下的三角形 BVH）。
+    构建一次后可对任意多个目标物体的顶点做最近表面投影。
+    """
+
+    def __init__(self, co: np.ndarray, tris: np.ndarray):
+        self.co = co
+        self.tris = tris
+        self.bvh = BVHTree.FromPolygons(co.tolist(), tris.tolist(), all_triangles=True)
+
+    @classmethod
+    def from_object(cls, obj: bpy.types.Object) -> "SurfaceIndex":
+        return cls(get_world_coords(obj), get_triangles(obj.data))
+
+    def project(self, points: np.ndarray, max_distance: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        查找每个点在源表面上的最近点。
+        返回 (tri_index, bary, distance, hit)：找不到（超出 max_distance）的点 hit 为 False。
+        最近点查询逐点调用 BVH，重心坐标在 NumPy 中一次计算。
+        """
+        num = len(points)
+        tri_index = np.zeros(num, dtype=np.int64)
+        location = np.zeros((num, 3))
+        distance = np.full(num, np.inf)
+        hit = np.zeros(num, dtype=bool)
+
+        find_nearest = self.bvh.find_nearest
+        limit = max_distance if max_distance and max_distance > 0 else 1.84467e19
+        for i, p in enumerate(points.tolist()):
+            loc, _normal, index, dist = find_nearest(p, limit)
+            if index is None:
+                continue
+            tri_index[i] = index
+            location[i] = loc
+            distance[i] = dist
+            hit[i] = True
+
+        corners = self.tris[tri_index]
+        bary = barycentric(location, self.co[corners[:, 0]], self.co[corners[:, 1]], self.co[corners[:, 2]])
+        return tri_index, bary, distance, hit
+
+    def corner_vertices(self, tri_index: np.ndarray) -> np.ndarray:
+        """三角形索引 → 三个顶点索引 (N x 3)"""
+        return self.tris[tri_index]
+
+
+def mesh_hash(obj: bpy.types.Object, tris: Optional[np.ndarray] = None) -> str:
+    """物体网格的内容哈希：局部坐标、全局变换，以及（源网格的）三角形"""
+    h = hashlib.blake2b(digest_size=16)
+    co = read_coords(obj.data)
+    h.update(np.int64(len(co)).tobytes())
+    h.update(co.tobytes())
+    h.update(np.array(obj.matrix_world, dtype=np.float32).tobytes())
+    if tris is not None:
+        h.update(np.ascontiguousarray(tris, dtype=np.int32).tobytes())
+    return h.hexdigest()
+
+
+def get_correspondence(source: bpy.types.Object,
+                       target: bpy.types.Object,
+                       max_distance: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, bool]:
+    """
+    目标顶点 → 源表面的对应关系（最近三角形的三个顶点 + 重心坐标），带缓存。
+    缓存键只包含两个网格的基础坐标、变换与拓扑，源物体的形态键变化后仍可复用。
+    返回 (corners (N x 3), bary (N x 3, float32), hit, 是否命中缓存)；
+    未命中（超出 max_distance）的顶点重心坐标为 0。
+    """
+    tris = get_triangles(source.data)
+    key = (mesh_hash(source, tris), mesh_hash(target), float(max_distance or 0.0))
+    cached = _correspondence_cache.get(key)
+    if cached is not None:
+        _correspondence_cache.move_to_end(key)
+        return (*cached, True)
+
+    index = SurfaceIndex(get_world_coords(source), tris)
+    tri_index, bary, _distance, hit = index.project(get_world_coords(target), max_distance)
+    bary = bary.astype(np.float32)
+    bary[~hit] = 0.0
+    result = (index.corner_vertices(tri_index), bary, hit)
+
+    _correspondence_cache[key] = result
+    while len(_correspondence_cache) > _CACHE_SIZE:
+        _correspondence_cache.popitem(last=False)
+    return (*result, False)
+
+
+def clear_correspondence_cache() -> None:
+    _correspondence_cache.clear()
+
+
+@persistent
+def _on_load_post(dummy):
+    """打开文件后释放上一个文件的对应关系缓存"""
+    clear_correspondence_cache()
+
+
+def map_vectors(values: np.ndarray, corners: np.ndarray, bary: np.ndarray) -> np.ndarray:
+    """
+    按对应关系插值一批逐顶点向量：(K, V_src, 3) → (K, N, 3)。
+    等价于与每行 3 个非零元的稀疏插值矩阵相乘；按三角形的三个角分别 gather 累加，
+    临时内存与输出同大小。
+    """
+    result = values[:, corners[:, 0]] * bary[None, :, 0, None]
+    for j in (1, 2):
+        result += values[:, corners[:, j]] * bary[None, :, j, None]
+    return result
+
+
+def register():
+    if _on_load_post not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(_on_load_post)
+
+
+def unregister():
+    if _on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_on_load_post)
+    clear_correspondence_cache()
@@ -0,0 +1,242 @@
+# type: ignore
+import bpy
+import re
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from mathutils.kdtree import KDTree
+from typing import Dict, List, Optional, Tuple
+from .weight_matrix import VertexWeightMatrix
+
+# 镜像轴（供 EnumProperty 使用）
+AXIS_ITEMS = [
+    ('X', "X", "沿 X 轴镜像"),
+    ('Y', "Y", "沿 Y 轴镜像"),
+    ('Z', "Z", "沿 Z 轴镜像"),
+]
+
+AXIS_INDEX = {'X': 0, 'Y': 1, 'Z': 2}
+
+# 按网格内容哈希缓存的对称映射：(内容哈希, 容差, 轴) → (mirror, side)
+_CACHE_SIZE = 32
+_symmetry_cache: "OrderedDict[Tuple[str, float, int], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+
+
+def read_coords(mesh: bpy.types.Mesh) -> np.ndarray:
+    """读取网格局部坐标 (V x 3, float32)"""
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', co)
+    return co.reshape(-1, 3)
+
+
+def content_hash(co: np.ndarray) -> str:
+    """顶点坐标的内容哈希（拓扑不变、坐标不变时哈希相同）"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.int64(len(co)).tobytes())
+    h.update(np.ascontiguousarray(co, dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+def build_symmetry_map(co: np.ndarray, tolerance: float, axis: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    为每个顶点查找其镜像顶点：
+    1. 网格哈希：把坐标与镜像坐标按容差量化，用 np.unique 做一次哈希连接（覆盖绝大多数顶点）
+    2. 剩余的（量化落在格子边界上的）顶点用 KD 树在容差内查找最近点
+    返回 (mirror, side)：mirror[v] 为镜像顶点索引（找不到为 -1），
+    side[v] 为 +1 / -1 / 0（正侧 / 负侧 / 位于对称平面上）。
+    """
+    num_verts = len(co)
+    co = co.astype(np.float64)
+    mirrored = co.copy()
+    mirrored[:, axis] = -mirrored[:, axis]
+
+    side = np.zeros(num_verts, dtype=np.int8)
+    side[co[:, axis] > tolerance] = 1
+    side[co[:, axis] < -tolerance] = -1
+
+    mirror = np.full(num_verts, -1, dtype=np.int64)
+    if num_verts == 0:
+        return mirror, side
+
+    # 1. 网格哈希连接
+    cell = max(tolerance, 1e-9)
+    keys = np.floor(np.concatenate([co, mirrored]) / cell).astype(np.int64)
+    _unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    key_orig, key_mirr = inverse[:num_verts], inverse[num_verts:]
+    owner = np.full(inverse.max() + 1, -1, dtype=np.int64)
+    owner[key_orig[::-1]] = np.arange(num_verts - 1, -1, -1)    # 同一格子取索引最小的顶点
+    candidate = owner[key_mirr]
+    found = candidate >= 0
+    close = np.zeros(num_verts, dtype=bool)
+    close[found] = np.linalg.norm(co[candidate[found]] - mirrored[found], axis=1) <= tolerance
+    mirror[close] = candidate[close]
+
+    # 2. KD 树处理剩余顶点
+    remaining = np.flatnonzero(~close)
+    if len(remaining):
+        tree = KDTree(num_verts)
+        for i, p in enumerate(co.tolist()):
+            tree.insert(p, i)
+        tree.balance()
+        for v in remaining.tolist():
+            _co, index, dist = tree.find(mirrored[v])
+            if index is not None and dist <= tolerance:
+                mirror[v] = index
+
+    return mirror, side
+
+
+def get_symmetry_map(mesh: bpy.types.Mesh, tolerance: float, axis: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """带缓存的对称映射（按网格内容哈希缓存，坐标未变化时直接复用）"""
+    co = read_coords(mesh)
+    key = (content_hash(co), float(tolerance), int(axis))
+    cached = _symmetry_cache.get(key)
+    if cached is not None:
+        _symmetry_cache.move_to_end(key)
+        return cached
+
+    result = build_symmetry_map(co, tolerance, axis)
+    _symmetry_cache[key] = result
+    while len(_symmetry_cache) > _CACHE_SIZE:
+        _symmetry_cache.popitem(last=False)
+    return result
+
+
+def clear_symmetry_cache() -> None:
+    _symmetry_cache.clear()
+
+
+# ========== 左右名称 ==========
+
+_SIDE_WORDS = [('Left', 'Right'), ('left', 'right'), ('LEFT', 'RIGHT'), ('左', '右')]
+_SIDE_LETTERS = {'L': 'R', 'R': 'L', 'l': 'r', 'r': 'l'}
+_SUFFIX_RE = re.compile(r'^(.*[._\- ])([LlRr])((?:\.\d+)?)$')
+_PREFIX_RE = re.compile(r'^([LlRr])([._\- ].*)$')
+
+
+def flip_side_name(name: str) -> str:
+    """交换名称中的左右标记（.L/_R/L_/Left/左 等），没有左右标记时返回原名"""
+    m = _SUFFIX_RE.match(name)
+    if m:
+        return f"{m.group(1)}{_SIDE_LETTERS[m.group(2)]}{m.group(3)}"
+    m = _PREFIX_RE.match(name)
+    if m:
+        return f"{_SIDE_LETTERS[m.group(1)]}{m.group(2)}"
+    for a, b in _SIDE_WORDS:
+        if a in name:
+            return name.replace(a, b, 1)
+        if b in name:
+            return name.replace(b, a, 1)
+    return name
+
+
+def flipped_name_map(names: List[str]) -> Tuple[List[str], np.ndarray]:
+    """
+    为一组名称计算左右交换后的索引映射。交换后的名称不存在时追加到名称列表末尾。
+    返回 (扩展后的名称列表, swap)，swap[i] 为名称 i 交换左右后的索引。
+    """
+    names = list(names)
+    index = {name: i for i, name in enumerate(names)}
+    swap = []
+    for i in range(len(names)):
+        flipped = flip_side_name(names[i])
+        if flipped not in index:
+            index[flipped] = len(names)
+            names.append(flipped)
+        swap.append(index[flipped])
+    # 新追加的名称互为镜像
+    for i in range(len(swap), len(names)):
+        swap.append(index.get(flip_side_name(names[i]), i))
+    return names, np.array(swap, dtype=np.int64)
+
+
+# ========== 镜像数据 ==========
+
+def mirror_source_mask(mirror: np.ndarray, side: np.ndarray, direction: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    根据方向确定 (源顶点, 目标顶点) 掩码：
+    - FLIP:     所有有镜像的顶点既是源也是目标（整体翻转）
+    - POSITIVE: 正侧 → 负侧
+    - NEGATIVE: 负侧 → 正侧
+    """
+    has_mirror = mirror >= 0
+    if direction == 'FLIP':
+        return has_mirror, has_mirror
+    s = 1 if direction == 'POSITIVE' else -1
+    source = has_mirror & (side == s)
+    target = np.zeros(len(mirror), dtype=bool)
+    target[mirror[source]] = True
+    target &= side == -s
+    source &= target[np.maximum(mirror, 0)]
+    return source, target
+
+
+def mirror_vectors(values: np.ndarray,
+                   mirror: np.ndarray,
+                   side: np.ndarray,
+                   direction: str,
+                   axis: int = 0,
+                   flip_axis: bool = True) -> np.ndarray:
+    """
+    镜像逐顶点的向量数据（如形态键偏移量），一次数组操作完成。
+    目标顶点的值取自其镜像源顶点，flip_axis 时镜像轴分量取反。
+    """
+    source, target = mirror_source_mask(mirror, side, direction)
+    result = values.copy()
+    if direction == 'FLIP':
+        result[target] = values[mirror[target]]
+    else:
+        result[mirror[source]] = values[source]
+    if flip_axis:
+        changed = target
+        result[changed, axis] = -result[changed, axis]
+    return result
+
+
+def mirror_weight_matrix(matrix: VertexWeightMatrix,
+                         mirror: np.ndarray,
+                         side: np.ndarray,
+                         direction: str,
+                         groups: Optional[List[str]] = None,
+                         flip_names: bool = True) -> VertexWeightMatrix:
+    """
+    在权重矩阵上镜像顶点组（向量化，所有组一次完成）。
+    groups 为参与镜像的组名（None 表示全部），其左右对应组会一并处理；
+    flip_names 时权重写入左右交换后的组（不存在则新建），否则写回同名组。
+    目标顶点上相关组的原有权重被镜像结果替换，其余条目保持不变。
+    """
+    names, swap = flipped_name_map(matrix.group_names) if flip_names else (
+        list(matrix.group_names), np.arange(matrix.num_groups, dtype=np.int64))
+
+    affected = np.zeros(len(names), dtype=bool)
+    if groups is None:
+        affected[:] = True
+    else:
+        index = {name: i for i, name in enumerate(names)}
+        for name in groups:
+            if name in index:
+                affected[index[name]] = True
+        affected |= affected[swap]
+
+    source, target = mirror_source_mask(mirror, side, direction)
+    group_idx = matrix.group_idx.astype(np.int64)
+    vert_idx = matrix.vert_idx.astype(np.int64)
+
+    keep = ~(affected[group_idx] & target[vert_idx])
+    moved = affected[group_idx] & source[vert_idx]
+
+    result = VertexWeightMatrix.from_entries(
+        matrix.num_verts,
+        np.concatenate([vert_idx[keep], mirror[vert_idx[moved]]]),
+        np.concatenate([group_idx[keep], swap[group_idx[moved]]]),
+        np.concatenate([matrix.weights[keep], matrix.weights[moved]]),
+        names,
+    )
+
+    # 只保留原有的组，以及新建后确实有权重的对侧组
+    wanted = np.arange(len(names)) < matrix.num_groups
+    wanted |= result.group_vertex_counts() > 0
+    old_to_new = np.cumsum(wanted) - 1
+    old_to_new[~wanted] = -1
+    return result.remap_groups(old_to_new.astype(np.int32), [name for name, w in zip(names, wanted) if w])
@@ -1,8 +1,10 @@
 # type: ignore
 import bpy
-import mathutils
-from mathutils import Vector
-import math
+import numpy as np
+from .smooth_normals import (calc_smooth_normals, calc_welded_normals, read_tangent_frames, to_tangent_space,
+                             encode_for_target, write_corner_output,
+                             OUTPUT_TARGET_ITEMS, ENCODING_ITEMS, QUANTIZATION_ITEMS)
+from .uv_islands import read_uvs, uv_island_labels, normalize_islands, write_face_islands
 
 class DATA_PT_uv_map_tools(bpy.types.Panel):
     bl_label = "UV贴图"
@@ -195,189 +197,138 @@ class O_RemoveUVMaps(bpy.types.Operator):
         self.report({'INFO'}, f"处理完成: {processed_objects}个物体, 删除了{removed_maps}个UV贴图")
         return {'FINISHED'}
 
-def unit_vector_to_octahedron(n):
-    """
-    Converts a unit vector to octahedron coordinates.
-    n is a mathutils.Vector
-    """
-    # 确保输入是单位向量
-    if n.length_squared > 1e-10:
-        n.normalize()
-    else:
-        return Vector((0.0, 0.0))
-    
-    # 计算L1范数
-    l1_norm = abs(n.x) + abs(n.y) + abs(n.z)
-    if l1_norm < 1e-10:
-        return Vector((0.0, 0.0))
-    
-    # 投影到八面体平面
-    x = n.x / l1_norm
-    y = n.y / l1_norm
-    
-    # 负半球映射（仅在z<0时应用）
-    if n.z < 0:
-        # 使用精确的符号函数
-        sign_x = math.copysign(1.0, x)
-        sign_y = math.copysign(1.0, y)
-        
-        # 原始映射公式（保留在z=0处的良好行为）
-        new_x = (1.0 - abs(y)) * sign_x
-        new_y = (1.0 - abs(x)) * sign_y
-        
-        # 直接应用新坐标（移除过渡插值）
-        x = new_x
-        y = new_y
-    
-    return Vector((x, y))
-
-def calc_smooth_normals(mesh):
-    """计算平滑法线（角度加权平均）"""
-    vertex_normals = {}
-    
-    # 使用顶点索引作为键（避免浮点精度问题）
-    for i, vert in enumerate(mesh.vertices):
-        vertex_normals[i] = Vector((0, 0, 0))
-    
-    # 计算每个面的法线并加权累加到顶点
-    for poly in mesh.polygons:
-        verts = [mesh.vertices[i] for i in poly.vertices]
-        face_normal = poly.normal
-        
-        for i, vert in enumerate(verts):
-            # 获取相邻边向量
-            v1 = verts[(i+1) % len(verts)].co - vert.co
-            v2 = verts[(i-1) % len(verts)].co - vert.co
-            
-            # 计算角度权重
-            v1_len = v1.length
-            v2_len = v2.length
-            if v1_len > 1e-6 and v2_len > 1e-6:
-                v1.normalize()
-                v2.normalize()
-                weight = math.acos(max(-1.0, min(1.0, v1.dot(v2))))
-            else:
-                weight = 0.0
-            
-            # 累加加权法线
-            vertex_normals[vert.index] += face_normal * weight
-    
-    # 归一化法线
-    for idx in vertex_normals:
-        if vertex_normals[idx].length > 1e-6:
-            vertex_normals[idx].normalize()
-    
-    return vertex_normals
-
 class XQFA_OT_OctahedralUV(bpy.types.Operator):
     """生成切线空间的八面体UV映射"""
     bl_idname = "xqfa.octahedral_uv"
     bl_label = "平滑法线-八面体UV"
     bl_description = ("对所有选中物体\n"
     "平滑法线在切线空间的坐标，投射八面体展开平面\n"
-    "存储在TEXCOORD1\n"
+    "默认存储在TEXCOORD1，也可写入颜色或浮点属性\n"
     "为了计算切线空间，必须要有一个正常展开的uv")
     bl_options = {'REGISTER', 'UNDO'}
     
+    normal_mode: bpy.props.EnumProperty(
+        name="平滑方式",
+        items=[
+            ('VERTEX', "按顶点", "按顶点索引累加，UV接缝/硬边拆开的顶点各自平滑"),
+            ('POSITION', "按位置焊接", "按距离焊接拐角后累加，接缝两侧法线一致，描边不开裂"),
+        ],
+        default='VERTEX',
+    )
+    weld_distance: bpy.props.FloatProperty(
+        name="焊接距离",
+        description="距离不超过该值的顶点视为同一位置（0 为仅焊接坐标完全相同的顶点）",
+        default=0.0001,
+        min=0.0,
+        precision=6,
+        subtype='DISTANCE',
+    )
+    weld_across_objects: bpy.props.BoolProperty(
+        name="跨物体焊接",
+        description="在世界空间中焊接所有选中物体的重合顶点（如头部与身体的接缝）",
+        default=False,
+    )
+    output_target: bpy.props.EnumProperty(
+        name="输出目标",
+        items=OUTPUT_TARGET_ITEMS,
+        default='UV',
+    )
+    output_name: bpy.props.StringProperty(
+        name="名称",
+        description="输出的UV层/颜色属性/属性名称，已存在时覆盖",
+        default="TEXCOORD1.xy",
+    )
+    encoding: bpy.props.EnumProperty(
+        name="编码",
+        items=ENCODING_ITEMS,
+        default='OCTAHEDRAL',
+    )
+    quantization: bpy.props.EnumProperty(
+        name="精度",
+        description="按目标精度量化写入的值，并报告编码-解码往返的角度误差",
+        items=QUANTIZATION_ITEMS,
+        default='FLOAT32',
+    )
     
     @classmethod
     def poll(cls, context):
         """检查是否可以选择网格物体"""
         return context.selected_objects is not None and len(context.selected_objects) > 0
     
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "normal_mode")
+        if self.normal_mode == 'POSITION':
+            layout.prop(self, "weld_distance")
+            layout.prop(self, "weld_across_objects")
+        layout.separator()
+        layout.prop(self, "output_target")
+        layout.prop(self, "output_name")
+        row = layout.row()
+        row.enabled = self.output_target != 'UV'
+        row.prop(self, "encoding")
+        layout.prop(self, "quantization")
+    
+    def compute_normals(self, objects):
+        """每个物体的平滑法线（物体空间，按顶点索引 V x 3）"""
+        if self.normal_mode == 'VERTEX':
+            return [calc_smooth_normals(obj.data) for obj in objects]
+        if self.weld_across_objects:
+            matrices = [np.array(obj.matrix_world) for obj in objects]
+            return calc_welded_normals([obj.data for obj in objects], matrices, self.weld_distance)
+        return [calc_welded_normals([obj.data], [None], self.weld_distance)[0] for obj in objects]
+    
     def execute(self, context):
         """执行操作"""
-        selected_objects = context.selected_objects
-        processed_count = 0
+        objects = [obj for obj in context.selected_objects if obj.type == 'MESH']
+        if not objects:
+            self.report({'WARNING'}, "没有处理任何网格物体，请确保选中了网格物体")
+            return {'CANCELLED'}
+        if not self.output_name:
+            self.report({'ERROR'}, "输出名称不能为空")
+            return {'CANCELLED'}
         
-        for obj in selected_objects:
-            if self.process_object(obj):
-                processed_count += 1
+        # 确保在对象模式（数据一致）
+        if context.object and context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        
+        # 先计算全部物体的平滑法线（跨物体焊接需要所有物体的数据）
+        normals = self.compute_normals(objects)
+        errors = np.concatenate([self.process_object(obj, smooth_normals)
+                                 for obj, smooth_normals in zip(objects, normals)])
         
         # 更新显示
         context.view_layer.update()
-        
-        if processed_count > 0:
-            self.report({'INFO'}, f"切线空间八面体UV映射完成！共处理 {processed_count} 个网格物体")
-            return {'FINISHED'}
-        else:
-            self.report({'WARNING'}, "没有处理任何网格物体，请确保选中了网格物体")
-            return {'CANCELLED'}
+        error_text = f"往返误差 最大{errors.max():.4f}° 平均{errors.mean():.4f}°" if len(errors) else "没有面拐角"
+        self.report({'INFO'}, f"平滑法线烘焙完成！共处理 {len(objects)} 个网格物体, {error_text}")
+        return {'FINISHED'}
     
-    def process_object(self, obj):
-        """处理单个网格物体"""
-        if obj.type != 'MESH':
-            return False
-            
+    def process_object(self, obj, smooth_normals):
+        """处理单个网格物体，smooth_normals 为按顶点索引的平滑法线；返回每个拐角的往返误差（度）"""
         mesh = obj.data
         
-        # 确保在对象模式（数据一致）
-        if bpy.context.object.mode != 'OBJECT':
-            bpy.ops.object.mode_set(mode='OBJECT')
-        
         # 操作前将活动UV设置为第一个（索引0）
         if len(mesh.uv_layers) > 0:
             mesh.uv_layers.active_index = 0
         
-        # 计算平滑法线
-        smooth_normals = calc_smooth_normals(mesh)
-        
         # 确保网格有UV层（计算切线需要）
         if len(mesh.uv_layers) == 0:
             mesh.uv_layers.new(name="UVMap")
         
-        # 计算切线空间（TBN矩阵）
-        mesh.calc_tangents()
-        
-        # 创建/获取UV层
-        uv_layer_name = "TEXCOORD1.xy"
-        if uv_layer_name in mesh.uv_layers:
-            uv_layer = mesh.uv_layers[uv_layer_name]
-        else:
-            uv_layer = mesh.uv_layers.new(name=uv_layer_name)
+        # 每个拐角的TBN（切线、副切线、法线），批量变换到切线空间
+        corner_verts = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get('vertex_index', corner_verts)
+        tangent, bitangent, normal = read_tangent_frames(mesh)
+        tangent_normals, singular = to_tangent_space(smooth_normals[corner_verts], tangent, bitangent, normal)
+        if singular:
+            print(f"警告: 物体 {obj.name} 有 {singular} 个拐角的TBN矩阵不可逆，使用默认法线")
         
-        # 处理每个面的每个顶点
-        for poly in mesh.polygons:
-            for loop_idx in range(poly.loop_start, poly.loop_start + poly.loop_total):
-                loop = mesh.loops[loop_idx]
-                vertex_idx = loop.vertex_index
-                
-                # 获取平滑法线
-                normal = smooth_normals[vertex_idx]
-
-                # 构建TBN矩阵（切线空间到模型空间的变换）
-                tbn_matrix = mathutils.Matrix((
-                    loop.tangent,
-                    loop.bitangent,
-                    loop.normal
-                )).transposed() # 转置以从行向量变为列向量
-                
-                # 检查矩阵是否可逆
-                try:
-                    # 尝试计算逆矩阵
-                    tbn_inverse = tbn_matrix.inverted()
-                    
-                    # 将法线从模型空间转换到切线空间
-                    tangent_normal = tbn_inverse @ normal
-                    tangent_normal.normalize()
-                except ValueError:
-                    # 矩阵不可逆时的回退方案
-                    print(f"警告: 顶点 {vertex_idx} 的TBN矩阵不可逆，使用默认法线")
-                    
-                    tangent_normal = Vector((0, 0, 1))  # 默认使用Z轴作为法线
-                
-                # 八面体投影
-                oct_coords = unit_vector_to_octahedron(tangent_normal)
-                
-                # 设置UV
-                u = oct_coords.x
-                v = oct_coords.y + 1.0
-                uv_layer.data[loop_idx].uv = (u, v)
-        
-        # 释放切线数据
-        mesh.free_tangents()
-        
-        return True
+        # 编码并按目标精度量化，一次写入
+        encoding = 'OCTAHEDRAL' if self.output_target == 'UV' else self.encoding
+        stored, errors = encode_for_target(tangent_normals, self.output_target, encoding, self.quantization)
+        write_corner_output(mesh, self.output_target, self.output_name, stored)
+        mesh.update()
+        return errors
 
 class XQFA_OT_ScaleUVIslands(bpy.types.Operator):
     """将选中物体的活动UV中每个孤岛缩放至0-1范围"""
@@ -386,47 +337,26 @@ class XQFA_OT_ScaleUVIslands(bpy.types.Operator):
     bl_description = "将选中物体的活动UV中每个孤岛独立缩放至0-1范围"
     bl_options = {'REGISTER', 'UNDO'}
 
+    write_island_ids: bpy.props.BoolProperty(
+        name="写入孤岛索引",
+        description="把每个面所属的UV孤岛索引写入整数面属性",
+        default=False,
+    )
+    island_attribute: bpy.props.StringProperty(
+        name="属性名称",
+        default="UVIsland",
+    )
+
     @classmethod
     def poll(cls, context):
         return context.selected_objects is not None and len(context.selected_objects) > 0
 
-    @staticmethod
-    def get_uv_island_bbox(uv_layer, loop_indices):
-        """计算一个UV孤岛的边界框，返回(min_u, min_v, max_u, max_v)"""
-        min_u = float('inf')
-        min_v = float('inf')
-        max_u = float('-inf')
-        max_v = float('-inf')
-
-        for loop_idx in loop_indices:
-            uv = uv_layer.data[loop_idx].uv
-            if uv.x < min_u:
-                min_u = uv.x
-            if uv.y < min_v:
-                min_v = uv.y
-            if uv.x > max_u:
-                max_u = uv.x
-            if uv.y > max_v:
-                max_v = uv.y
-
-        return min_u, min_v, max_u, max_v
-
-    @staticmethod
-    def scale_island_to_01(uv_layer, loop_indices, min_u, min_v, max_u, max_v):
-        """将一个UV孤岛缩放并平移至0-1范围"""
-        range_u = max_u - min_u
-        range_v = max_v - min_v
-
-        # 避免除以零
-        if range_u < 1e-8:
-            range_u = 1.0
-        if range_v < 1e-8:
-            range_v = 1.0
-
-        for loop_idx in loop_indices:
-            uv = uv_layer.data[loop_idx].uv
-            uv.x = (uv.x - min_u) / range_u
-            uv.y = (uv.y - min_v) / range_v
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "write_island_ids")
+        row = layout.row()
+        row.enabled = self.write_island_ids
+        row.prop(self, "island_attribute")
 
     def execute(self, context):
         selected_objects = [obj for obj in context.selected_objects if obj.type == 'MESH']
@@ -435,6 +365,9 @@ class XQFA_OT_ScaleUVIslands(bpy.types.Operator):
             self.report({'WARNING'}, "未选中任何网格物体")
             return {'CANCELLED'}
 
+        if context.object and context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
         total_islands = 0
 
         for obj in selected_objects:
@@ -445,75 +378,20 @@ class XQFA_OT_ScaleUVIslands(bpy.types.Operator):
                 self.report({'WARNING'}, f"物体 {obj.name} 没有活动UV层，已跳过")
                 continue
 
-            # 收集UV孤岛：通过面的连接性分组
-            # 使用并查集(Union-Find)来识别UV孤岛
-            num_loops = len(mesh.loops)
-            parent = list(range(num_loops))
-
-            def find(x):
-                while parent[x] != x:
-                    parent[x] = parent[parent[x]]
-                    x = parent[x]
-                return x
-
-            def union(a, b):
-                ra, rb = find(a), find(b)
-                if ra != rb:
-                    parent[ra] = rb
-
-            # 同一个面的loop属于同一孤岛
-            for poly in mesh.polygons:
-                loops = list(range(poly.loop_start, poly.loop_start + poly.loop_total))
-                for i in range(len(loops) - 1):
-                    union(loops[i], loops[i + 1])
-
-            # 共享相同UV坐标（同一顶点+相同UV位置）的loop也属于同一孤岛
-            # 按顶点索引分组
-            vert_loops = {}
-            for loop in mesh.loops:
-                vi = loop.vertex_index
-                if vi not in vert_loops:
-                    vert_loops[vi] = []
-                vert_loops[vi].append(loop.index)
-
-            for vi, loop_ids in vert_loops.items():
-                # 按UV位置分组（容差比较）
-                groups = []
-                for lid in loop_ids:
-                    uv = uv_layer.data[lid].uv
-                    placed = False
-                    for group in groups:
-                        ref_uv = uv_layer.data[group[0]].uv
-                        if abs(uv.x - ref_uv.x) < 1e-6 and abs(uv.y - ref_uv.y) < 1e-6:
-                            group.append(lid)
-                            placed = True
-                            break
-                    if not placed:
-                        groups.append([lid])
-                # 同一UV位置的loops属于同一孤岛
-                for group in groups:
-                    for i in range(len(group) - 1):
-                        union(group[i], group[i + 1])
-
-            # 按根节点分组得到孤岛
-            islands = {}
-            for i in range(num_loops):
-                root = find(i)
-                if root not in islands:
-                    islands[root] = []
-                islands[root].append(i)
-
-            # 对每个孤岛计算边界框并缩放至0-1
-            obj_island_count = 0
-            for root, loop_indices in islands.items():
-                min_u, min_v, max_u, max_v = self.get_uv_island_bbox(uv_layer, loop_indices)
-                # 跳过退化的孤岛
-                if (max_u - min_u) < 1e-8 and (max_v - min_v) < 1e-8:
-                    continue
-                self.scale_island_to_01(uv_layer, loop_indices, min_u, min_v, max_u, max_v)
-                obj_island_count += 1
-
-            total_islands += obj_island_count
+            # 孤岛标记：同一个面的loop相连，同一顶点且UV相同的loop相连
+            uv = read_uvs(uv_layer)
+            labels, num_islands = uv_island_labels(mesh, uv)
+            if num_islands == 0:
+                continue
+
+            # 每个孤岛按边界框缩放至0-1，退化的孤岛保持不变
+            uv, scaled = normalize_islands(uv, labels, num_islands)
+            uv_layer.data.foreach_set('uv', uv.reshape(-1))
+            if self.write_island_ids and self.island_attribute:
+                write_face_islands(mesh, self.island_attribute, labels)
+            mesh.update()
+
+            total_islands += int(np.count_nonzero(scaled))
 
         if total_islands > 0:
             self.report({'INFO'}, f"已将 {total_islands} 个UV孤岛缩放至0-1范围")
@@ -0,0 +1,100 @@
+# type: ignore
+import bpy
+import numpy as np
+from typing import Tuple
+from .mesh_data import read_topology, corner_neighbors
+
+# UV 孤岛：全部在数组上完成
+# 1. 每个拐角的键 (顶点, 量化 u, 量化 v)，np.unique 得到 UV 顶点（同一顶点且 UV 相同的拐角合并）
+# 2. 面内相邻拐角连边，向量化连通分量得到孤岛
+# 3. 按孤岛排序后 reduceat 求包围盒，一次 foreach_set 写回
+
+
+def connected_components(num_nodes: int, a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    无向图 (a[i], b[i]) 的连通分量：每轮把每条边两端的根挂到较小的根上，再做指针跳跃压缩，
+    直到不再变化。返回 (每个节点的分量索引（按最小节点排序，从 0 连续编号）, 分量数)。
+    """
+    labels = np.arange(num_nodes)
+    while True:
+        root_a = labels[a]
+        root_b = labels[b]
+        changed = root_a != root_b
+        if not np.any(changed):
+            break
+        root_a = root_a[changed]
+        root_b = root_b[changed]
+        np.minimum.at(labels, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    roots, components = np.unique(labels, return_inverse=True)
+    return components.reshape(-1), len(roots)
+
+
+def read_uvs(uv_layer: bpy.types.MeshUVLoopLayer) -> np.ndarray:
+    """UV 层的全部坐标 (L x 2, float32)"""
+    uv = np.empty(len(uv_layer.data) * 2, dtype=np.float32)
+    uv_layer.data.foreach_get('uv', uv)
+    return uv.reshape(-1, 2)
+
+
+def uv_island_labels(mesh: bpy.types.Mesh, uv: np.ndarray, precision: float = 1e-6) -> Tuple[np.ndarray, int]:
+    """
+    每个拐角所属的 UV 孤岛索引：同一顶点且 UV 按 precision 量化后相同的拐角视为相连，
+    同一个面的拐角相连。返回 (拐角孤岛索引 (L,), 孤岛数)。
+    """
+    corner_verts, face_starts, face_sizes = read_topology(mesh)
+    if len(corner_verts) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    keys = np.empty((len(corner_verts), 3), dtype=np.int64)
+    keys[:, 0] = corner_verts
+    keys[:, 1:] = np.rint(uv / precision)
+    uv_vert_keys, uv_verts = np.unique(keys, axis=0, return_inverse=True)
+    uv_verts = uv_verts.reshape(-1)
+
+    _corner_face, _prev_corner, next_corner = corner_neighbors(face_starts, face_sizes)
+    node_labels, num_islands = connected_components(len(uv_vert_keys), uv_verts, uv_verts[next_corner])
+    return node_labels[uv_verts], num_islands
+
+
+def normalize_islands(uv: np.ndarray, labels: np.ndarray, num_islands: int,
+                      eps: float = 1e-8) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把每个孤岛独立缩放并平移至 0-1 范围（单个方向退化时该方向只平移），
+    两个方向都退化的孤岛保持不变。返回 (新 UV, 被缩放的孤岛掩码)。
+    """
+    order = np.argsort(labels, kind='stable')
+    sorted_uv = uv[order].astype(np.float64)
+    starts = np.flatnonzero(np.r_[True, np.diff(labels[order]) != 0])
+    lo = np.minimum.reduceat(sorted_uv, starts, axis=0)
+    hi = np.maximum.reduceat(sorted_uv, starts, axis=0)
+    size = hi - lo
+    scaled = np.any(size >= eps, axis=1)
+    size = np.where(size < eps, 1.0, size)
+
+    island_lo = np.zeros((num_islands, 2))
+    island_size = np.ones((num_islands, 2))
+    island_ids = labels[order][starts]
+    island_lo[island_ids] = np.where(scaled[:, None], lo, 0.0)
+    island_size[island_ids] = np.where(scaled[:, None], size, 1.0)
+    island_scaled = np.zeros(num_islands, dtype=bool)
+    island_scaled[island_ids] = scaled
+
+    result = (uv - island_lo[labels]) / island_size[labels]
+    return result.astype(np.float32), island_scaled
+
+
+def write_face_islands(mesh: bpy.types.Mesh, name: str, labels: np.ndarray) -> None:
+    """把每个面的孤岛索引写入整数面属性（类型或域不符时重建）"""
+    face_starts = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', face_starts)
+    attr = mesh.attributes.get(name)
+    if attr is not None and (attr.data_type != 'INT' or attr.domain != 'FACE'):
+        mesh.attributes.remove(attr)
+        attr = None
+    if attr is None:
+        attr = mesh.attributes.new(name=name, type='INT', domain='FACE')
+    attr.data.foreach_set('value', labels[face_starts].astype(np.int32))
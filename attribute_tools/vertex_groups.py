@@ -4,6 +4,17 @@ import numpy as np
 import time
 from typing import Dict, Tuple, Set, List, Optional
 from bpy.props import EnumProperty
+from .weight_matrix import (VertexWeightMatrix, get_world_coords, reorder_vertex_groups, format_timings,
+                            descriptor_distance, DEFAULT_FEATURE_WEIGHTS, clean_vertex_groups,
+                            condition_weights, apply_weight_changes, replace_vertex_groups)
+from .assignment import MATCH_MODE_ITEMS, optimal_matches, greedy_matches, pruned_matches
+from .mapping_store import (set_pairs, get_pairs, get_lookup, get_order, draw_pairs, draw_library_buttons,
+                            plan_renames, apply_renames, apply_mapping_to_objects)
+from .surface_map import SurfaceIndex
+from .symmetry import AXIS_ITEMS, AXIS_INDEX, get_symmetry_map, mirror_weight_matrix, flip_side_name
+from .mesh_data import (join_objects, separate_by_material, remove_objects, material_statistics,
+                        match_material_signatures)
+from .shapekey import match_rename_shape_keys, store_shape_key_mapping
 
 class DATA_PT_vertex_group_tools(bpy.types.Panel):
     bl_label = "顶点组"
@@ -23,6 +34,9 @@ class DATA_PT_vertex_group_tools(bpy.types.Panel):
         col.operator(O_VertexGroupsCleanZeroWeight.bl_idname, text=O_VertexGroupsCleanZeroWeight.bl_label, icon="GROUP_VERTEX")
         col.operator(O_VertexGroupsDelNoneSelected.bl_idname, text=O_VertexGroupsDelNoneSelected.bl_label, icon="GROUP_VERTEX")
         col.operator(O_VertexGroupsDelAllSelected.bl_idname, text=O_VertexGroupsDelAllSelected.bl_label, icon="GROUP_VERTEX")
+        col.operator(O_VertexGroupsConditionForExport.bl_idname, text=O_VertexGroupsConditionForExport.bl_label, icon="EXPORT")
+        col.operator(O_VertexGroupsMirror.bl_idname, text=O_VertexGroupsMirror.bl_label, icon="MOD_MIRROR")
+        col.operator(O_VertexGroupsTransferWeights.bl_idname, text=O_VertexGroupsTransferWeights.bl_label, icon="MOD_DATA_TRANSFER")
 
         col = layout.column(align=True)
         col.operator(O_VertexGroupsMatchRename.bl_idname, text=O_VertexGroupsMatchRename.bl_label, icon="SORTBYEXT")
@@ -38,12 +52,17 @@ class DATA_PT_vertex_group_tools(bpy.types.Panel):
         mappings = getattr(scene, 'xqfa_vertex_group_mappings', None)
         if mappings is None:
             return
+        layout = self.layout
         if len(mappings) == 0:
+            row = layout.row(align=True)
+            row.label(text="映射记录", icon="COLLAPSEMENU")
+            draw_library_buttons(row, 'VERTEX_GROUP')
             return
-        layout = self.layout
         layout.separator()
         box = layout.box()
-        box.label(text="映射记录", icon="COLLAPSEMENU")
+        row = box.row(align=True)
+        row.label(text="映射记录", icon="COLLAPSEMENU")
+        draw_library_buttons(row, 'VERTEX_GROUP')
         for idx, item in enumerate(mappings):
             row = box.row(align=True)
             icon = "TRIA_DOWN" if item.expanded else "TRIA_RIGHT"
@@ -51,7 +70,7 @@ class DATA_PT_vertex_group_tools(bpy.types.Panel):
             if not item.label:
                 item.label = f"映射 {idx + 1}"
             row.prop(item, "label", text="")
-            row.label(text=f"({len(item.pairs)}项)")
+            row.label(text=f"({item.count}项)")
             row.separator(factor=1.0)
             op_lr = row.operator(O_VertexGroupMappingApply.bl_idname, text="", icon="FORWARD")
             op_lr.index = idx
@@ -67,40 +86,15 @@ class DATA_PT_vertex_group_tools(bpy.types.Panel):
             op_r_order.direction = "RIGHT"
             row.operator(O_VertexGroupMappingRemove.bl_idname, text="", icon="X").index = idx
             if item.expanded:
-                box.template_list(
-                    "VGPairList",
-                    f"vg_pairs_{idx}",
-                    item,
-                    "pairs",
-                    item,
-                    "active_pair_index",
-                    type='DEFAULT',
-                )
-
-
-class XqfaVertexGroupPairItem(bpy.types.PropertyGroup):
-    left_name: bpy.props.StringProperty(name="左")
-    right_name: bpy.props.StringProperty(name="右")
-    similarity: bpy.props.StringProperty(name="相似度", default="")
+                draw_pairs(box, item)
 
 
 class XqfaVertexGroupMappingItem(bpy.types.PropertyGroup):
     expanded: bpy.props.BoolProperty(name="展开", default=False)
     label: bpy.props.StringProperty(name="标题")
-    pairs: bpy.props.CollectionProperty(type=XqfaVertexGroupPairItem)
-    active_pair_index: bpy.props.IntProperty(default=0)
-
-
-class VGPairList(bpy.types.UIList):
-    def draw_item(self, context, layout, data, item, icon, active_data, active_propname):
-        if self.layout_type in {'DEFAULT', 'COMPACT'}:
-            row = layout.row(align=True)
-            row.label(text=item.left_name)
-            row.label(text="↔")
-            row.label(text=item.right_name)
-        elif self.layout_type in {'GRID'}:
-            layout.alignment = 'CENTER'
-            layout.label(text="")
+    data: bpy.props.StringProperty(name="映射数据", description="紧凑存储的映射记录 (JSON)", default="")
+    count: bpy.props.IntProperty(name="数量", default=0)
+    page: bpy.props.IntProperty(name="页", default=0, min=0)
 
 
 class O_VertexGroupMappingRemove(bpy.types.Operator):
@@ -148,33 +142,10 @@ class O_VertexGroupMappingApply(bpy.types.Operator):
             self.report({'ERROR'}, "请先选择有顶点组的网格物体")
             return {'CANCELLED'}
 
-        if self.direction == "LEFT_TO_RIGHT":
-            lookup = [(p.left_name, p.right_name) for p in item.pairs]
-        else:
-            lookup = [(p.right_name, p.left_name) for p in item.pairs]
-
-        total_renamed = 0
-        total_skipped = 0
-        affected_objs = 0
-
-        for obj in selected_objs:
-            vgs = obj.vertex_groups
-            obj_renamed = 0
-            for old_name, new_name in lookup:
-                vg = vgs.get(old_name)
-                if vg is None:
-                    total_skipped += 1
-                    continue
-                try:
-                    vg.name = new_name
-                    obj_renamed += 1
-                except Exception:
-                    total_skipped += 1
-            if obj_renamed > 0:
-                total_renamed += obj_renamed
-                affected_objs += 1
-
-        self.report({'INFO'}, f"影响 {affected_objs}/{len(selected_objs)} 个物体：已重命名 {total_renamed} 项，跳过 {total_skipped} 项")
+        lookup = get_lookup(item, self.direction)
+
+        level, message = apply_mapping_to_objects(selected_objs, lambda obj: obj.vertex_groups, lookup, "顶点组")
+        self.report({level}, message)
         return {'FINISHED'}
 
 
@@ -200,7 +171,7 @@ class O_VertexGroupMappingReorder(bpy.types.Operator):
             return {'CANCELLED'}
 
         item = mappings[self.index]
-        if not item.pairs:
+        if not get_pairs(item):
             self.report({'WARNING'}, "此映射记录为空")
             return {'CANCELLED'}
 
@@ -209,8 +180,9 @@ class O_VertexGroupMappingReorder(bpy.types.Operator):
             self.report({'ERROR'}, "请先选择网格物体")
             return {'CANCELLED'}
 
-        desired_names = [p.left_name if self.direction == "LEFT" else p.right_name for p in item.pairs]
+        desired_names = get_order(item, self.direction)
 
+        start_time = time.time()
         total_matched = 0
         total_added = 0
         total_extra = 0
@@ -220,68 +192,18 @@ class O_VertexGroupMappingReorder(bpy.types.Operator):
             total_added += result['added']
             total_extra += result['extra']
 
+        elapsed_time = time.time() - start_time
         self.report(
             {'INFO'},
-            f"已在 {len(target_objs)} 个物体上调整顺序 (共 {total_matched} 匹配, {total_added} 新建空组, {total_extra} 保留到末尾)"
+            f"已在 {len(target_objs)} 个物体上调整顺序 (共 {total_matched} 匹配, {total_added} 新建空组, {total_extra} 保留到末尾, 耗时: {elapsed_time:.4f}秒)"
         )
         return {'FINISHED'}
 
     def _reorder_vertex_groups(self, target_obj: bpy.types.Object, desired_order: List[str]) -> Dict[str, any]:
-        """按 desired_order 顺序重排顶点组（备份-清空-重建，未在 desired_order 中的组放到末尾）"""
-        target_vgs = target_obj.vertex_groups
-        mesh = target_obj.data
-
-        weight_data: Dict[str, Dict[int, float]] = {}
-        original_names = [vg.name for vg in target_vgs]
-
-        for vert in mesh.vertices:
-            for group in vert.groups:
-                vg_name = original_names[group.group]
-                if group.weight > 0:
-                    if vg_name not in weight_data:
-                        weight_data[vg_name] = {}
-                    weight_data[vg_name][vert.index] = group.weight
-
-        for i in range(len(target_vgs) - 1, -1, -1):
-            target_vgs.remove(target_vgs[i])
-
-        matched_count = 0
-        added_count = 0
-        used_names: Set[str] = set()
-
-        for name in desired_order:
-            if name in used_names:
-                continue
-            used_names.add(name)
-
-            new_vg = target_vgs.new(name=name)
-            if name in weight_data:
-                vg_weights = weight_data.pop(name)
-                for vert_index, weight in vg_weights.items():
-                    new_vg.add([vert_index], weight, 'REPLACE')
-                matched_count += 1
-            else:
-                added_count += 1
-
-        extra_count = 0
-        for extra_name in list(weight_data.keys()):
-            if extra_name in used_names:
-                extra_count += 1
-                continue
-            used_names.add(extra_name)
-            new_vg = target_vgs.new(name=extra_name)
-            vg_weights = weight_data.pop(extra_name)
-            for vert_index, weight in vg_weights.items():
-                new_vg.add([vert_index], weight, 'REPLACE')
-            extra_count += 1
-
-        return {
-            'matched': matched_count,
-            'added': added_count,
-            'extra': extra_count,
-            'original_total': len(original_names),
-            'order_total': len(desired_order),
-        }
+        """按 desired_order 顺序重排顶点组（未在 desired_order 中的组放到末尾）"""
+        result = reorder_vertex_groups(target_obj, desired_order)
+        print(f"[{target_obj.name}] 顶点组重排: {format_timings(result['timings'])}, vg.add 调用 {result['add_calls']} 次")
+        return result
 
 
 class O_VertexGroupsDelAllSelected(bpy.types.Operator):
@@ -330,28 +252,374 @@ class O_VertexGroupsCleanZeroWeight(bpy.types.Operator):
         wm = context.window_manager
         return wm.invoke_props_dialog(self, width=200)
 
+    remove_empty: bpy.props.BoolProperty(
+        name="删除清空的顶点组",
+        description="清理后删除因此变为空的顶点组",
+        default=False,
+    )
+
     def draw(self, context):
         layout = self.layout
         layout.prop(self, "weight_limit")
+        layout.prop(self, "remove_empty")
 
     def execute(self, context):
+        # 直接修改网格数据，不改变选择与活动物体
+        # 确保在对象模式（编辑模式下顶点组数据未同步，vg.remove 会报错）
+        if context.object and context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        start_time = time.time()
         cleaned_count = 0
+        total_entries = 0
+        removed_names = []
         for obj in context.selected_objects:
             if obj.type != 'MESH' or not obj.vertex_groups:
                 continue
-            bpy.ops.object.select_all(action='DESELECT')
-            obj.select_set(True)
-            context.view_layer.objects.active = obj
-            bpy.ops.object.vertex_group_clean(group_select_mode='ALL', limit=self.weight_limit)
+            result = clean_vertex_groups(obj, self.weight_limit, self.remove_empty)
+            if result['removed_entries'] == 0 and not result['removed_groups']:
+                continue
             cleaned_count += 1
+            total_entries += result['removed_entries']
+            removed_names.extend(f"[{obj.name}] {name}" for name in result['removed_groups'])
+            print(f"{obj.name}: 清理 {result['removed_entries']} 个权重条目, "
+                  f"{result['cleaned_groups']} 个顶点组 (vg.remove {result['remove_calls']} 次)")
 
+        elapsed = time.time() - start_time
         if cleaned_count > 0:
-            self.report({'INFO'}, f"已清理 {cleaned_count} 个物体的零权重")
+            message = f"已清理 {cleaned_count} 个物体的 {total_entries} 个零权重 (用时 {elapsed:.2f}s)"
+            if removed_names:
+                message += f"，删除 {len(removed_names)} 个空顶点组: {'; '.join(removed_names)}"
+            self.report({'INFO'}, message)
         else:
             self.report({'INFO'}, "未找到需要清理的物体")
         return {'FINISHED'}
 
 
+class O_VertexGroupsConditionForExport(bpy.types.Operator):
+    """为游戏引擎导出整理选中物体的权重"""
+    bl_idname = "xqfa.vertex_groups_condition_for_export"
+    bl_label = "导出权重整理"
+    bl_description = "限制每个顶点的影响数量、归一化并量化权重（误差扩散保证和为 255），锁定没有形变骨骼的顶点组"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    max_influences: bpy.props.IntProperty(
+        name="最大影响数",
+        description="每个顶点保留的最大骨骼影响数量",
+        default=4,
+        min=1,
+        max=16,
+    )
+
+    normalize: bpy.props.BoolProperty(
+        name="归一化",
+        description="使每个顶点的权重和为 1",
+        default=True,
+    )
+
+    quantize: bpy.props.BoolProperty(
+        name="量化",
+        description="将权重量化到指定位数，并通过误差扩散保证每个顶点的和不变",
+        default=True,
+    )
+
+    bits: bpy.props.IntProperty(
+        name="位数",
+        description="量化位数（8 位即 0-255）",
+        default=8,
+        min=2,
+        max=16,
+    )
+
+    lock_non_deform: bpy.props.BoolProperty(
+        name="锁定非形变组",
+        description="锁定没有对应形变骨骼的顶点组，这些组不参与整理",
+        default=True,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.selected_objects is not None and any(obj.type == 'MESH' for obj in context.selected_objects)
+
+    def invoke(self, context, event):
+        wm = context.window_manager
+        return wm.invoke_props_dialog(self, width=250)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "max_influences")
+        layout.prop(self, "normalize")
+        row = layout.row(align=True)
+        row.prop(self, "quantize")
+        sub = row.row(align=True)
+        sub.enabled = self.quantize
+        sub.prop(self, "bits")
+        layout.prop(self, "lock_non_deform")
+
+    def _deform_group_mask(self, obj) -> Optional[np.ndarray]:
+        """顶点组是否对应形变骨骼；没有骨架修改器时返回 None"""
+        armature = next((mod.object for mod in obj.modifiers
+                         if mod.type == 'ARMATURE' and mod.object and mod.object.type == 'ARMATURE'), None)
+        if armature is None:
+            return None
+        deform_bones = {bone.name for bone in armature.data.bones if bone.use_deform}
+        return np.array([vg.name in deform_bones for vg in obj.vertex_groups], dtype=bool)
+
+    def execute(self, context):
+        # 确保在对象模式（编辑模式下顶点组数据未同步，vg.add/remove 会报错）
+        if context.object and context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        start_time = time.time()
+        bits = self.bits if self.quantize else 0
+        total_objs = 0
+        total_verts = 0
+        total_changed = 0
+        total_locked = 0
+
+        print(f"\n导出权重整理 (最大影响数 {self.max_influences}, 归一化 {self.normalize}, 量化 {bits} 位):")
+        for obj in context.selected_objects:
+            if obj.type != 'MESH' or not obj.vertex_groups:
+                continue
+
+            deform = self._deform_group_mask(obj)
+            if deform is None:
+                # 没有骨架时所有顶点组都参与整理
+                deform = np.ones(len(obj.vertex_groups), dtype=bool)
+            elif self.lock_non_deform:
+                for vg, is_deform in zip(obj.vertex_groups, deform.tolist()):
+                    if not is_deform and not vg.lock_weight:
+                        vg.lock_weight = True
+                        total_locked += 1
+
+            locked = np.array([vg.lock_weight for vg in obj.vertex_groups], dtype=bool)
+            matrix = VertexWeightMatrix.from_object(obj)
+            new_weights, keep, stats = condition_weights(
+                matrix, deform & ~locked, self.max_influences, self.normalize, bits)
+            calls = apply_weight_changes(obj, matrix, new_weights, keep)
+
+            total_objs += 1
+            total_verts += matrix.num_verts
+            total_changed += stats['changed_verts']
+            print(f"  {obj.name}: 超出影响数 {stats['over_limit']} 顶点, 修改 {stats['changed_verts']}/{matrix.num_verts} 顶点, "
+                  f"移除 {stats['removed_entries']} 个影响, 最大量化误差 {stats['max_error']:.4f} (写入调用 {calls} 次)")
+
+        elapsed = time.time() - start_time
+        if total_objs == 0:
+            self.report({'INFO'}, "未找到带顶点组的网格物体")
+            return {'CANCELLED'}
+        message = f"已整理 {total_objs} 个物体：修改 {total_changed}/{total_verts} 个顶点"
+        if total_locked:
+            message += f"，锁定 {total_locked} 个非形变顶点组"
+        self.report({'INFO'}, f"{message} (用时 {elapsed:.2f}s)")
+        return {'FINISHED'}
+
+
+class O_VertexGroupsMirror(bpy.types.Operator):
+    """按顶点对称映射镜像顶点组权重"""
+    bl_idname = "xqfa.vertex_groups_mirror"
+    bl_label = "镜像顶点组"
+    bl_description = "按对称顶点镜像所有选中网格的顶点组权重，并交换 .L/.R 等左右名称（对称映射按网格内容缓存）"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    direction: bpy.props.EnumProperty(
+        name="方向",
+        items=[
+            ('POSITIVE', "+ → -", "用正侧的权重覆盖负侧"),
+            ('NEGATIVE', "- → +", "用负侧的权重覆盖正侧"),
+            ('FLIP', "翻转", "左右整体翻转"),
+        ],
+        default='POSITIVE'
+    )
+
+    scope: bpy.props.EnumProperty(
+        name="范围",
+        items=[
+            ('ALL', "全部", "镜像所有顶点组"),
+            ('ACTIVE', "活动组", "只镜像活动顶点组及其左右对应组"),
+        ],
+        default='ALL'
+    )
+
+    axis: bpy.props.EnumProperty(name="轴", items=AXIS_ITEMS, default='X')
+
+    flip_names: bpy.props.BoolProperty(
+        name="交换左右名称",
+        description="权重写入 .L/.R 交换后的顶点组（不存在时新建）",
+        default=True,
+    )
+
+    tolerance: bpy.props.FloatProperty(
+        name="容差",
+        description="查找对称顶点时允许的最大距离",
+        default=0.0001,
+        min=0.0,
+        step=0.001,
+        precision=5,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.selected_objects is not None and any(obj.type == 'MESH' for obj in context.selected_objects)
+
+    def invoke(self, context, event):
+        wm = context.window_manager
+        return wm.invoke_props_dialog(self, width=250)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "direction", expand=True)
+        layout.prop(self, "scope", expand=True)
+        layout.prop(self, "axis", expand=True)
+        layout.prop(self, "flip_names")
+        layout.prop(self, "tolerance")
+
+    def execute(self, context):
+        # 确保在对象模式（编辑模式下顶点组数据未同步，vg.add/remove 会报错）
+        if context.object and context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        start_time = time.time()
+        axis = AXIS_INDEX[self.axis]
+        processed = 0
+        unpaired_total = 0
+
+        for obj in context.selected_objects:
+            if obj.type != 'MESH' or not obj.vertex_groups:
+                continue
+            groups = None
+            if self.scope == 'ACTIVE':
+                if obj.vertex_groups.active is None:
+                    continue
+                groups = [obj.vertex_groups.active.name]
+
+            mirror, side = get_symmetry_map(obj.data, self.tolerance, axis)
+            matrix = VertexWeightMatrix.from_object(obj)
+            mirrored = mirror_weight_matrix(matrix, mirror, side, self.direction, groups, self.flip_names)
+            # 只写回参与镜像的组（活动组及其左右对应组），其它顶点组保持不动
+            touched = list(mirrored.group_names)
+            if groups is not None:
+                related = set(groups) | {flip_side_name(name) for name in groups}
+                touched = [name for name in touched if name in related]
+            add_calls = replace_vertex_groups(obj, mirrored, touched)
+
+            unpaired = int(np.count_nonzero(mirror < 0))
+            unpaired_total += unpaired
+            processed += 1
+            print(f"{obj.name}: 镜像顶点组 (未找到对称点 {unpaired}/{len(mirror)} 顶点, vg.add {add_calls} 次)")
+
+        elapsed = time.time() - start_time
+        if processed == 0:
+            self.report({'INFO'}, "未找到带顶点组的网格物体")
+            return {'CANCELLED'}
+        level = 'WARNING' if unpaired_total else 'INFO'
+        self.report({level}, f"已镜像 {processed} 个物体的顶点组，未找到对称点的顶点 {unpaired_total} 个 (用时 {elapsed:.2f}s)")
+        return {'FINISHED'}
+
+
+class O_VertexGroupsTransferWeights(bpy.types.Operator):
+    """活动物体的顶点组权重 --> 其它选中物体（最近表面 + 重心坐标插值）"""
+    bl_idname = "xqfa.vertex_groups_transfer_weights"
+    bl_label = "最近表面传递权重"
+    bl_description = ("将活动物体的顶点组权重传递到其它选中的网格物体（拓扑可以不同）\n"
+                      "目标顶点投影到源网格最近的三角形，按重心坐标插值权重；源网格的空间索引只构建一次")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    max_distance: bpy.props.FloatProperty(
+        name="最大距离",
+        description="超过此距离的目标顶点不接收权重（0 表示不限制）",
+        default=0.05,
+        min=0.0,
+        step=0.1,
+        precision=4,
+        unit='LENGTH',
+    )
+
+    use_falloff: bpy.props.BoolProperty(
+        name="距离衰减",
+        description="权重随距离线性衰减，在最大距离处为 0",
+        default=False,
+    )
+
+    min_weight: bpy.props.FloatProperty(
+        name="最小权重",
+        description="低于此值的插值权重不写入",
+        default=0.001,
+        min=0.0,
+        max=1.0,
+        precision=4,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return (obj is not None and obj.type == 'MESH'
+                and any(o.type == 'MESH' and o != obj for o in context.selected_objects))
+
+    def invoke(self, context, event):
+        wm = context.window_manager
+        return wm.invoke_props_dialog(self, width=250)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "max_distance")
+        row = layout.row()
+        row.enabled = self.max_distance > 0
+        row.prop(self, "use_falloff")
+        layout.prop(self, "min_weight")
+
+    def execute(self, context):
+        # 确保在对象模式（编辑模式下顶点组数据未同步，vg.add/remove 会报错）
+        if context.object and context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        source = context.active_object
+        targets = [obj for obj in context.selected_objects if obj.type == 'MESH' and obj != source]
+        if not source.vertex_groups:
+            self.report({'ERROR'}, f"源物体 ({source.name}) 没有顶点组")
+            return {'CANCELLED'}
+
+        timings = {}
+        t0 = time.perf_counter()
+        source_matrix = VertexWeightMatrix.from_object(source)
+        index = SurfaceIndex.from_object(source)
+        timings['extract'] = time.perf_counter() - t0
+        if len(index.tris) == 0:
+            self.report({'ERROR'}, f"源物体 ({source.name}) 没有面")
+            return {'CANCELLED'}
+
+        total_hit = 0
+        total_verts = 0
+        for target in targets:
+            t0 = time.perf_counter()
+            points = get_world_coords(target)
+            tri_index, bary, distance, hit = index.project(points, self.max_distance)
+            if self.use_falloff and self.max_distance > 0:
+                bary *= np.clip(1.0 - distance / self.max_distance, 0.0, 1.0)[:, None]
+            bary[~hit] = 0.0
+            transferred = source_matrix.interpolated(index.corner_vertices(tri_index), bary).filtered(self.min_weight)
+            t1 = time.perf_counter()
+
+            # 目标物体：与源同名的组原地替换，源中有权重的新组追加，其余组保持不变
+            existing = {vg.name for vg in target.vertex_groups}
+            nonempty = transferred.nonempty_mask()
+            touched = [name for g, name in enumerate(transferred.group_names) if name in existing or nonempty[g]]
+            add_calls = replace_vertex_groups(target, transferred, touched)
+            t2 = time.perf_counter()
+
+            timings['remap'] = timings.get('remap', 0.0) + (t1 - t0)
+            timings['write'] = timings.get('write', 0.0) + (t2 - t1)
+            total_hit += int(hit.sum())
+            total_verts += len(points)
+            print(f"{target.name}: 投影命中 {int(hit.sum())}/{len(points)} 顶点, "
+                  f"写入 {int(nonempty.sum())} 个顶点组 (vg.add {add_calls} 次)")
+
+        print(f"最近表面传递权重: {format_timings(timings)}")
+        self.report({'INFO'}, f"已向 {len(targets)} 个物体传递权重，{total_hit}/{total_verts} 个顶点在范围内 "
+                              f"({format_timings(timings)})")
+        return {'FINISHED'}
+
+
 class O_VertexGroupsDelNoneSelected(bpy.types.Operator):
     bl_idname = "xqfa.vertex_groups_del_none_more"
     bl_label = "批量删除空顶点组"
@@ -361,26 +629,16 @@ class O_VertexGroupsDelNoneSelected(bpy.types.Operator):
         total_removed = 0
         removed_names = []
         for obj in context.selected_objects:
-            if obj and obj.type == 'MESH':
-                vertex_groups = obj.vertex_groups
-                mesh = obj.data
-
-                vertex_group_info = {}
-                for group in vertex_groups:
-                    vertex_group_info[group.name] = []
-
-                for vertex in mesh.vertices:
-                    for group in vertex.groups:
-                        group_index = group.group
-                        group_name = vertex_groups[group_index].name
-                        weight = group.weight
-                        vertex_group_info[group_name].append((vertex.index, weight))
-
-                for group_name, vertex_info in vertex_group_info.items():
-                    if not vertex_info:
-                        obj.vertex_groups.remove(obj.vertex_groups[group_name])
-                        removed_names.append(f"[{obj.name}] {group_name}")
-                        total_removed += 1
+            if obj and obj.type == 'MESH' and obj.vertex_groups:
+                matrix = VertexWeightMatrix.from_object(obj)
+                empty_indices = np.flatnonzero(~matrix.nonempty_mask())
+
+                # 从后往前删除，避免索引变化
+                for group_index in empty_indices[::-1].tolist():
+                    obj.vertex_groups.remove(obj.vertex_groups[group_index])
+                for group_index in empty_indices.tolist():
+                    removed_names.append(f"[{obj.name}] {matrix.group_names[group_index]}")
+                total_removed += len(empty_indices)
 
         if total_removed > 0:
             detail = "; ".join(removed_names)
@@ -393,8 +651,113 @@ class O_VertexGroupsDelNoneSelected(bpy.types.Operator):
 # ----------------------------------------------------------------
 # 3. 匹配重命名操作 (Match Rename Operator) - 💥 优化
 # ----------------------------------------------------------------
+def vertex_group_matches(desc_a: Dict[str, np.ndarray],
+                         desc_b: Dict[str, np.ndarray],
+                         threshold: float,
+                         match_mode: str = 'OPTIMAL',
+                         feature_weights: Optional[Dict[str, float]] = None,
+                         kdtree_neighbors: int = 8) -> Tuple[List[Tuple[str, Optional[str], str]], int, int]:
+    """
+    向量化计算相似度并按 match_mode 求匹配（相似度 = 1 / (1 + 组合距离)）。
+    A: 源 (名称来源)
+    B: 目标 (被重命名)
+    """
+    a_names = desc_a['names']
+    b_names = desc_b['names']
+    if not a_names or not b_names:
+        return [], 0, 0
+
+    if feature_weights is None:
+        feature_weights = DEFAULT_FEATURE_WEIGHTS
+
+    # 1. 求匹配
+    if match_mode == 'KDTREE':
+        # 按中心点用KD树筛选候选对，只对候选对计算组合距离
+        def pair_similarity(rows, cols):
+            return 1.0 / (1.0 + descriptor_distance(desc_b, desc_a, feature_weights, rows, cols))
+
+        pairs = pruned_matches(desc_b['centroid'], desc_a['centroid'], pair_similarity, threshold, kdtree_neighbors)
+    else:
+        similarity_matrix = 1.0 / (1.0 + descriptor_distance(desc_b, desc_a, feature_weights)) # N_b x N_a
+
+        if match_mode == 'GREEDY':
+            pairs = greedy_matches(similarity_matrix, threshold)
+        else:
+            pairs = optimal_matches(similarity_matrix, threshold)
+
+    # 2. 整理结果
+    matched_rows = {row: (col, similarity) for row, col, similarity in pairs}
+    matches: List[Tuple[str, Optional[str], str]] = []
+    for i, b_name in enumerate(b_names):
+        if i in matched_rows:
+            col, similarity = matched_rows[i]
+            matches.append((b_name, a_names[col], f"{similarity:.3f}"))
+        else:
+            matches.append((b_name, None, "no match"))
+
+    return matches, len(a_names), len(b_names)
+
+
+def match_rename_vertex_groups(obj_a: bpy.types.Object,
+                               obj_b: bpy.types.Object,
+                               threshold: float = 0.94,
+                               match_mode: str = 'OPTIMAL',
+                               feature_weights: Optional[Dict[str, float]] = None,
+                               kdtree_neighbors: int = 8) -> Dict[str, any]:
+    """
+    按顶点组描述符匹配，用源物体 A 的顶点组名称重命名目标物体 B 的顶点组。
+    不依赖选择与活动物体，可在其它流程中直接调用。
+    """
+    desc_a = VertexWeightMatrix.from_object(obj_a).group_descriptors(get_world_coords(obj_a))
+    desc_b = VertexWeightMatrix.from_object(obj_b).group_descriptors(get_world_coords(obj_b))
+
+    if not desc_a['names']:
+        raise Exception(f"源物体 ({obj_a.name}) 没有非空顶点组")
+    if not desc_b['names']:
+        raise Exception(f"目标物体 ({obj_b.name}) 没有非空顶点组")
+
+    matches, total_a, total_b = vertex_group_matches(
+        desc_a, desc_b, threshold, match_mode, feature_weights, kdtree_neighbors)
+
+    match_lookup: Dict[str, Tuple[Optional[str], str]] = {b_name: (a_name, sim) for b_name, a_name, sim in matches}
+
+    # 两阶段重命名：Arm.L ↔ Arm.R 互换时不会产生 .001 后缀
+    original_vg_names = [vg.name for vg in obj_b.vertex_groups]
+    plan = plan_renames(original_vg_names, {b_name: a_name for b_name, (a_name, _s) in match_lookup.items() if a_name})
+    conflicts = {old_name for old_name, _new_name in plan['conflicts']}
+    renamed_count = apply_renames(obj_b.vertex_groups, plan['renames'])
+
+    pair_items: List[Tuple[str, str, str]] = []
+    for orig_name in original_vg_names:
+        a_name, similarity_str = match_lookup.get(orig_name, (None, "-"))
+        if a_name and orig_name not in conflicts:
+            pair_items.append((orig_name, a_name, similarity_str))
+        else:
+            pair_items.append((orig_name, orig_name, "conflict" if a_name else similarity_str))
+
+    return {
+        'renamed_count': renamed_count,
+        'matches': matches,
+        'pair_items': pair_items,
+        'conflicts': plan['conflicts'],
+        'total_a': total_a,
+        'total_b': total_b
+    }
+
+
+def store_vertex_group_mapping(scene: bpy.types.Scene, label: str, pair_items) -> None:
+    """把匹配结果保存为场景中的顶点组映射记录"""
+    if not hasattr(scene, 'xqfa_vertex_group_mappings'):
+        return
+    mappings = scene.xqfa_vertex_group_mappings
+    item = mappings.add()
+    item.label = label if label else f"映射 {len(mappings)}"
+    item.expanded = False
+    set_pairs(item, pair_items)
+
+
 class O_VertexGroupsMatchRename(bpy.types.Operator):
-    """选择物体的顶点组名称-->活动物体的顶点组名称，按顶点平均位置匹配"""
+    """选择物体的顶点组名称-->活动物体的顶点组名称，按顶点组描述符（中心点、主轴、包围盒等）匹配"""
     bl_idname = "xqfa.vertex_groups_match_rename"
     bl_label = "顶点组名称匹配重命名"
 
@@ -414,13 +777,53 @@ class O_VertexGroupsMatchRename(bpy.types.Operator):
         default=""
     )
 
+    match_mode: bpy.props.EnumProperty(
+        name="匹配算法",
+        items=MATCH_MODE_ITEMS,
+        default='OPTIMAL'
+    )
+
+    kdtree_neighbors: bpy.props.IntProperty(
+        name="候选近邻数",
+        description="KD树剪枝模式下每个顶点组保留的候选数量",
+        default=8,
+        min=1,
+        max=64
+    )
+
+    feature_mode: bpy.props.EnumProperty(
+        name="匹配特征",
+        items=[
+            ('DESCRIPTOR', "多特征", "中心点 + 协方差主轴/分布 + 包围盒 + 权重总和/顶点数"),
+            ('CENTROID', "仅中心点", "只比较加权中心点（旧算法）"),
+        ],
+        default='DESCRIPTOR'
+    )
+
+    weight_centroid: bpy.props.FloatProperty(name="中心点权重", default=DEFAULT_FEATURE_WEIGHTS['centroid'], min=0.0, soft_max=2.0)
+    weight_shape: bpy.props.FloatProperty(name="分布权重", default=DEFAULT_FEATURE_WEIGHTS['shape'], min=0.0, soft_max=2.0)
+    weight_axis: bpy.props.FloatProperty(name="主轴权重", default=DEFAULT_FEATURE_WEIGHTS['axis'], min=0.0, soft_max=2.0)
+    weight_bbox: bpy.props.FloatProperty(name="包围盒权重", default=DEFAULT_FEATURE_WEIGHTS['bbox'], min=0.0, soft_max=2.0)
+    weight_mass: bpy.props.FloatProperty(name="权重/顶点数权重", default=DEFAULT_FEATURE_WEIGHTS['mass'], min=0.0, soft_max=2.0)
+
     def invoke(self, context, event):
         wm = context.window_manager
-        return wm.invoke_props_dialog(self, width=200)
+        return wm.invoke_props_dialog(self, width=260)
 
     def draw(self, context):
         layout = self.layout
         layout.prop(self, "similarity_threshold")
+        layout.prop(self, "match_mode")
+        if self.match_mode == 'KDTREE':
+            layout.prop(self, "kdtree_neighbors")
+        layout.prop(self, "feature_mode")
+        if self.feature_mode == 'DESCRIPTOR':
+            col = layout.column(align=True)
+            col.prop(self, "weight_centroid")
+            col.prop(self, "weight_shape")
+            col.prop(self, "weight_axis")
+            col.prop(self, "weight_bbox")
+            col.prop(self, "weight_mass")
 
     def execute(self, context: bpy.types.Context) -> Set[str]:
         """主执行函数"""
@@ -429,24 +832,26 @@ class O_VertexGroupsMatchRename(bpy.types.Operator):
         try:
             obj_a, obj_b = self._validate_input(context)
 
-            centers_a = self._get_vertex_group_centers(obj_a)
-            centers_b = self._get_vertex_group_centers(obj_b)
-
-            if not centers_a:
-                raise Exception(f"源物体 ({obj_a.name}) 没有非空顶点组")
-            if not centers_b:
-                raise Exception(f"目标物体 ({obj_b.name}) 没有非空顶点组")
-
-            result = self._rename_matching_vertex_groups(obj_a, obj_b, centers_a, centers_b)
+            result = match_rename_vertex_groups(
+                obj_a, obj_b,
+                threshold=self.similarity_threshold,
+                match_mode=self.match_mode,
+                feature_weights=self._feature_weights(),
+                kdtree_neighbors=self.kdtree_neighbors,
+            )
 
             self._print_detailed_results(obj_a, obj_b, result)
 
-            self._store_mapping(context, result)
+            store_vertex_group_mapping(context.scene, self.mapping_name, result['pair_items'])
 
             elapsed_time = time.time() - start_time
             time_msg = f"总耗时: {elapsed_time:.4f}秒"
 
-            if result['renamed_count'] > 0:
+            if result['conflicts']:
+                conflict_msg = '; '.join(f"{old} → {new}" for old, new in result['conflicts'])
+                self.report({'WARNING'}, f"重命名 {result['renamed_count']} 个顶点组，"
+                                         f"{len(result['conflicts'])} 个因名称冲突保留原名: {conflict_msg} ({time_msg})")
+            elif result['renamed_count'] > 0:
                 self.report({'INFO'}, f"成功匹配重命名 {result['renamed_count']} 个顶点组 ({time_msg})")
             else:
                 self.report({'WARNING'}, f"没有找到匹配的顶点组 ({time_msg})")
@@ -458,21 +863,6 @@ class O_VertexGroupsMatchRename(bpy.types.Operator):
             self.report({'ERROR'}, f"{str(e)} (耗时: {elapsed_time:.4f}秒)")
             return {'CANCELLED'}
 
-    def _store_mapping(self, context, result):
-        scene = context.scene
-        if not hasattr(scene, 'xqfa_vertex_group_mappings'):
-            return
-        mappings = scene.xqfa_vertex_group_mappings
-        item = mappings.add()
-        item.label = self.mapping_name if self.mapping_name else f"映射 {len(mappings)}"
-        item.expanded = False
-        pair_items = result.get('pair_items', [])
-        for left_name, right_name, similarity in pair_items:
-            p = item.pairs.add()
-            p.left_name = left_name
-            p.right_name = right_name
-            p.similarity = similarity
-    
     def _validate_input(self, context: bpy.types.Context) -> Tuple[bpy.types.Object, bpy.types.Object]:
         """验证输入并返回两个网格物体"""
         selected_objs = context.selected_objects
@@ -502,175 +892,17 @@ class O_VertexGroupsMatchRename(bpy.types.Operator):
             
         return obj_a, obj_b
     
-    def _get_vertex_group_centers(self, obj: bpy.types.Object) -> Dict[str, np.ndarray]:
-        """
-        优化：向量化获取每个顶点组的中心位置（平均位置）。
-        1. 获取所有顶点的全局坐标 (co * matrix_world)
-        2. 获取所有顶点的所有顶点组权重（Blender API 相对高效的方式）
-        3. 利用 NumPy 广播和求和计算加权平均中心点。
-        """
-        centers: Dict[str, np.ndarray] = {}
-        mesh = obj.data
-        
-        if not obj.vertex_groups:
-            return centers
-
-        # 1. 获取所有顶点的全局坐标
-        num_verts = len(mesh.vertices)
-        verts_co = np.zeros((num_verts, 3))
-        mesh.vertices.foreach_get('co', verts_co.ravel())
-        
-        matrix = np.array(obj.matrix_world)
-        # 将局部坐标转换为全局坐标：V_global = V_local @ R.T + T
-        global_verts = verts_co @ matrix[:3, :3].T + matrix[:3, 3]
-
-        # 2. 获取所有顶点组的名称和索引映射
-        vg_names = [vg.name for vg in obj.vertex_groups]
-        vg_map = {name: i for i, name in enumerate(vg_names)}
-        
-        # 3. 获取所有顶点组的权重。
-        # 使用 bmesh 或 foreach_get 无法直接高效获取所有顶点的所有权重。
-        # 仍需遍历顶点，但可以批量处理，原始方法已是常见高效做法。
-        # 为了进一步优化，我们直接从 Blender 的权重 API 获取并转换为 NumPy 矩阵。
-        
-        # 创建一个 Num_Verts x Num_Groups 的稀疏矩阵来存储权重 (如果大部分权重为0)
-        # 但为了简单和通用性，我们先用一个稠密列表/字典来处理非零权重
-        
-        # 存储每个顶点组的 (总加权位置, 总权重)
-        vg_data: Dict[str, Tuple[np.ndarray, float]] = {name: (np.zeros(3), 0.0) for name in vg_names}
-        
-        # 遍历所有顶点及其权重，计算加权和
-        for i, vertex in enumerate(mesh.vertices):
-            co = global_verts[i]
-            for group in vertex.groups:
-                group_index = group.group
-                weight = group.weight
-                
-                if weight > 0:
-                    group_name = obj.vertex_groups[group_index].name
-                    
-                    # 使用 NumPy 数组进行加法
-                    current_sum, current_weight = vg_data[group_name]
-                    vg_data[group_name] = (current_sum + co * weight, current_weight + weight)
-
-        # 4. 计算平均中心点
-        for name, (weighted_sum, total_weight) in vg_data.items():
-            if total_weight > 0:
-                # 平均位置 = 总加权位置 / 总权重
-                centers[name] = weighted_sum / total_weight
-                
-        return centers
-
-    def _calculate_similarity_vectorized(self, centers_a: Dict[str, np.ndarray], centers_b: Dict[str, np.ndarray], threshold: float) -> Tuple[List[Tuple[str, Optional[str], str]], int, int]:
-        """
-        优化: 向量化计算相似度矩阵并寻找最佳匹配。
-        A: 源 (名称来源)
-        B: 目标 (被重命名)
-        """
-        # 1. 准备数据：转换为 NumPy 数组
-        a_names = list(centers_a.keys())
-        b_names = list(centers_b.keys())
-        a_centers = np.array(list(centers_a.values())) # N_a x 3
-        b_centers = np.array(list(centers_b.values())) # N_b x 3
-        
-        if a_centers.size == 0 or b_centers.size == 0:
-             return [], 0, 0
-        
-        # 2. 向量化计算所有距离 (欧几里得距离)
-        # 使用 NumPy 广播计算距离：Distance Matrix M (N_b x N_a)
-        # M[i, j] = ||b_centers[i] - a_centers[j]||
-        
-        # b_centers (N_b x 3)
-        # a_centers (N_a x 3)
-        
-        # (b_i - a_j)^2 = b_i^2 - 2*b_i*a_j + a_j^2
-        b_sq = np.sum(b_centers**2, axis=1, keepdims=True)  # N_b x 1
-        a_sq = np.sum(a_centers**2, axis=1, keepdims=True).T # 1 x N_a
-        
-        # 2 * b_i * a_j
-        b_dot_a = b_centers @ a_centers.T # N_b x N_a
-        
-        # 距离的平方
-        dist_sq = b_sq - 2 * b_dot_a + a_sq
-        # 避免浮点误差导致的微小负数
-        dist_sq = np.maximum(dist_sq, 0)
-        distances = np.sqrt(dist_sq) # N_b x N_a
-        
-        # 3. 将距离转换为相似度 (相似度 = 1 / (1 + 距离))
-        similarity_matrix = 1.0 / (1.0 + distances) # N_b x N_a
-        
-        # 4. 寻找最佳匹配（贪婪匹配）
-        renamed_count = 0
-        matched_a_indices: Set[int] = set() # 已匹配的 A 组的索引
-        matches: List[Tuple[str, Optional[str], str]] = []
-
-        # 遍历 B 组 (目标组)
-        for i, b_name in enumerate(b_names):
-            best_match_index = -1
-            best_similarity = 0.0
-            
-            # 获取 B 组 i 与所有 A 组的相似度行向量
-            sim_row = similarity_matrix[i, :]
-
-            # 寻找满足阈值的最佳匹配 A 组
-            for j, a_name in enumerate(a_names):
-                if j in matched_a_indices:
-                    continue # 跳过已匹配的 A 组
-                    
-                similarity = sim_row[j]
-                
-                if similarity > best_similarity and similarity >= threshold:
-                    best_similarity = similarity
-                    best_match_index = j
-            
-            # 记录结果
-            if best_match_index != -1:
-                a_name = a_names[best_match_index]
-                matched_a_indices.add(best_match_index) # 标记 A 组已使用
-                renamed_count += 1
-                matches.append((b_name, a_name, f"{best_similarity:.3f}"))
-            else:
-                matches.append((b_name, None, "no match"))
-        
-        return matches, len(a_names), len(b_names)
-
-    def _rename_matching_vertex_groups(self,
-                                     obj_a: bpy.types.Object,
-                                     obj_b: bpy.types.Object,
-                                     centers_a: Dict[str, np.ndarray],
-                                     centers_b: Dict[str, np.ndarray]) -> Dict[str, any]:
-        """匹配并重命名顶点组 (使用向量化匹配)"""
-
-        matches, total_a, total_b = self._calculate_similarity_vectorized(
-            centers_a,
-            centers_b,
-            self.similarity_threshold
-        )
-
-        match_lookup: Dict[str, Tuple[Optional[str], str]] = {b_name: (a_name, sim) for b_name, a_name, sim in matches}
-
-        original_vg_names = [vg.name for vg in obj_b.vertex_groups]
-        renamed_count = 0
-        pair_items: List[Tuple[str, str, str]] = []
-
-        for orig_name in original_vg_names:
-            match_info = match_lookup.get(orig_name, (None, "-"))
-            a_name, similarity_str = match_info
-            if a_name:
-                obj_b.vertex_groups[orig_name].name = a_name
-                pair_items.append((orig_name, a_name, similarity_str))
-                renamed_count += 1
-            else:
-                pair_items.append((orig_name, orig_name, similarity_str))
-
+    def _feature_weights(self) -> Dict[str, float]:
+        if self.feature_mode == 'CENTROID':
+            return {'centroid': 1.0}
         return {
-            'renamed_count': renamed_count,
-            'matches': matches,
-            'pair_items': pair_items,
-            'total_a': total_a,
-            'total_b': total_b
+            'centroid': self.weight_centroid,
+            'shape': self.weight_shape,
+            'axis': self.weight_axis,
+            'bbox': self.weight_bbox,
+            'mass': self.weight_mass,
         }
-    
+
     def _print_detailed_results(self,
                               obj_a: bpy.types.Object,
                               obj_b: bpy.types.Object,
@@ -682,7 +914,7 @@ class O_VertexGroupsMatchRename(bpy.types.Operator):
         print(f"\n{separator}")
         print(header)
         print(separator)
-        print(f"相似度阈值: {self.similarity_threshold:.3f}")
+        print(f"相似度阈值: {self.similarity_threshold:.3f}  匹配算法: {self.match_mode}  匹配特征: {self.feature_mode}")
         print(f"{'B物体原始名称':<30} {'重命名为':<30} {'相似度':<20}")
         print("-" * 80)
 
@@ -765,77 +997,13 @@ class O_VertexGroupsSortMatch(bpy.types.Operator):
     
     def _sort_vertex_groups_optimized(self, target_obj: bpy.types.Object, source_obj: bpy.types.Object) -> Dict[str, any]:
         """
-        优化后的顶点组排序算法。
-        1. 备份目标物体的所有权重数据。
-        2. 清空目标物体的所有顶点组。
-        3. 按照源物体的顺序，重建顶点组并恢复权重。
+        按源物体的顶点组顺序重排目标物体的顶点组。
+        权重一次性提取为矩阵，通过组索引重映射完成置换，再按权重值分批写回。
         """
-        
-        target_vgs = target_obj.vertex_groups
-        source_vgs = source_obj.vertex_groups
-        
-        # 1. 备份目标物体的权重数据
-        weight_data: Dict[str, Dict[int, float]] = {}
-        original_vg_names = [vg.name for vg in target_vgs]
-        
-        mesh = target_obj.data
-        
-        # 遍历所有顶点，收集它们的权重
-        for vert in mesh.vertices:
-            for group in vert.groups:
-                vg_name = original_vg_names[group.group]
-                if group.weight > 0:
-                    if vg_name not in weight_data:
-                        weight_data[vg_name] = {}
-                    # 存储 (顶点索引: 权重)
-                    weight_data[vg_name][vert.index] = group.weight
-
-        # 2. 清空目标物体的所有顶点组
-        for i in range(len(target_vgs) - 1, -1, -1):
-            target_vgs.remove(target_vgs[i])
-            
-        final_list: List[Tuple[str, str]] = [] # (最终名称, 状态)
-        matched_count = 0
-        added_count = 0
-        
-        # 3. 按照源物体的顺序，重建顶点组
-        for desired_index, src_vg in enumerate(source_vgs):
-            new_vg = target_vgs.new(name=src_vg.name)
-            
-            # 恢复权重（如果备份数据中存在）
-            if src_vg.name in weight_data:
-                vg_weights = weight_data.pop(src_vg.name)
-                
-                # 批量设置权重
-                for vert_index, weight in vg_weights.items():
-                    new_vg.add([vert_index], weight, 'REPLACE')
-                
-                matched_count += 1
-                final_list.append((src_vg.name, '已匹配/移动'))
-            else:
-                added_count += 1
-                final_list.append((src_vg.name, '新建空组'))
-                
-        # 4. 处理多余的顶点组
-        extra_count = 0
-        for extra_name, vg_weights in weight_data.items():
-            new_vg = target_vgs.new(name=extra_name)
-            
-            # 恢复权重
-            for vert_index, weight in vg_weights.items():
-                new_vg.add([vert_index], weight, 'REPLACE')
-            
-            extra_count += 1
-            final_list.append((extra_name, '多余/保留'))
-            
-        return {
-            'matched': matched_count,
-            'added': added_count,
-            'extra': extra_count,
-            'original_total': len(original_vg_names),
-            'source_total': len(source_vgs),
-            'final_list': final_list
-        }
+        source_names = [vg.name for vg in source_obj.vertex_groups]
+        result = reorder_vertex_groups(target_obj, source_names)
+        result['source_total'] = len(source_names)
+        return result
 
     def _print_detailed_results(self, 
                               source_obj: bpy.types.Object, 
@@ -865,6 +1033,8 @@ class O_VertexGroupsSortMatch(bpy.types.Operator):
         print(f"  新建空组数量: {result['added']}")
         print(f"  多余并保留数量: {result['extra']}")
         print(f"  最终顶点组总数: {len(result['final_list'])}")
+        print(f"  vg.add 调用次数: {result['add_calls']}")
+        print(f"  耗时: {format_timings(result['timings'])}")
         print(separator)
 
 
@@ -884,6 +1054,16 @@ class XQFA_OT_SyncExtractUnpack(bpy.types.Operator):
         default='MERGE'
     )
 
+    material_tolerance: bpy.props.FloatProperty(
+        name="材质匹配容差",
+        description="合并模式下顶点数不完全相同时，允许的顶点数相对差（0 表示只接受完全相同的签名）",
+        default=0.05,
+        min=0.0,
+        max=0.5,
+        step=1,
+        precision=3,
+    )
+
     @classmethod
     def poll(cls, context):
         return context.active_object is not None and len(context.selected_objects) > 1
@@ -895,6 +1075,8 @@ class XQFA_OT_SyncExtractUnpack(bpy.types.Operator):
     def draw(self, context):
         layout = self.layout
         layout.prop(self, "mode", expand=True)
+        if self.mode == 'MERGE':
+            layout.prop(self, "material_tolerance")
 
     def execute(self, context):
         if self.mode == 'MERGE':
@@ -925,25 +1107,13 @@ class XQFA_OT_SyncExtractUnpack(bpy.types.Operator):
                     return ""
         return prefix
 
-    @staticmethod
-    def _count_vertices_per_material(obj):
-        """统计每个材质索引对应的唯一顶点数"""
-        mesh = obj.data
-        vert_sets = {}
-        for poly in mesh.polygons:
-            mat_idx = poly.material_index
-            if mat_idx not in vert_sets:
-                vert_sets[mat_idx] = set()
-            for vi in poly.vertices:
-                vert_sets[mat_idx].add(vi)
-        return {idx: len(verts) for idx, verts in vert_sets.items()}
-
     @staticmethod
     def _add_armature(context, objs, source_obj):
-        """为物体列表添加骨架修改器（从 source_obj 复制）"""
-        bpy.ops.object.select_all(action='DESELECT')
+        """为物体列表添加骨架修改器（从 source_obj 复制），并选中这些物体"""
+        for obj in context.selected_objects:
+            obj.select_set(False)
         for obj in objs:
-            if obj.type == 'MESH':
+            if obj.type == 'MESH' and obj.name in context.view_layer.objects:
                 obj.select_set(True)
         context.view_layer.objects.active = source_obj
 
@@ -959,6 +1129,34 @@ class XQFA_OT_SyncExtractUnpack(bpy.types.Operator):
                     new_mod.use_deform_preserve_volume = src_mod.use_deform_preserve_volume
                     new_mod.vertex_group = src_mod.vertex_group
 
+    def _match_names(self, scene, source_obj, target_obj, vg_mapping_name, sk_mapping_name, timings, label=""):
+        """直接调用顶点组/形态键匹配重命名（source 提供名称，target 被重命名），并保存映射记录"""
+        suffix = f" ({label})" if label else ""
+        t0 = time.perf_counter()
+        try:
+            result = match_rename_vertex_groups(source_obj, target_obj, match_mode='OPTIMAL')
+            store_vertex_group_mapping(scene, vg_mapping_name, result['pair_items'])
+            if result['conflicts']:
+                self.report({'WARNING'}, f"顶点组重命名冲突{suffix}，保留原名: "
+                                         f"{'; '.join(f'{old} → {new}' for old, new in result['conflicts'])}")
+        except Exception as e:
+            self.report({'WARNING'}, f"顶点组匹配重命名失败{suffix}: {e}")
+        t1 = time.perf_counter()
+        timings['vertex_groups'] = timings.get('vertex_groups', 0.0) + (t1 - t0)
+
+        if target_obj.data.shape_keys and source_obj.data.shape_keys:
+            try:
+                result = match_rename_shape_keys(source_obj, target_obj)
+                store_shape_key_mapping(scene, sk_mapping_name, result['pair_items'])
+            except Exception as e:
+                self.report({'WARNING'}, f"形态键匹配重命名失败{suffix}: {e}")
+        timings['shape_keys'] = timings.get('shape_keys', 0.0) + (time.perf_counter() - t1)
+
+    def _report_timings(self, title, timings):
+        total = sum(timings.values())
+        print(f"\n{title}: {format_timings(timings)} (总计 {total:.3f}s)")
+        self.report({'INFO'}, f"{title} (用时 {total:.2f}s: {format_timings(timings)})")
+
     # ========== 合并模式 ==========
 
     def _execute_merge(self, context):
@@ -969,85 +1167,74 @@ class XQFA_OT_SyncExtractUnpack(bpy.types.Operator):
             self.report({'ERROR'}, "请选择除活动物体外的至少一个网格物体")
             return {'CANCELLED'}
 
-        # 步骤1: 合并 A B C 到 A
+        timings = {}
+
+        # 步骤1: 合并 A B C 到 A（数据层拼接网格）
+        t0 = time.perf_counter()
         target_a = selected_others[0]
-        bpy.ops.object.select_all(action='DESELECT')
-        for obj in selected_others:
-            obj.select_set(True)
-        context.view_layer.objects.active = target_a
-        bpy.ops.object.join()
+        join_objects(target_a, selected_others[1:])
+        timings['join'] = time.perf_counter() - t0
 
         # 步骤2: 匹配材质（按材质顶点数匹配，重命名A的材质，E使用A的材质）
+        t0 = time.perf_counter()
         self._match_materials_merge(target_a, active_e)
+        timings['materials'] = time.perf_counter() - t0
 
         # 计算映射名称
         mapping_name = self._get_mapping_name(active_e.name)
 
-        # 步骤3: 顶点组匹配重命名 (E为源, A为目标)
-        bpy.ops.object.select_all(action='DESELECT')
-        active_e.select_set(True)
-        target_a.select_set(True)
-        context.view_layer.objects.active = target_a
-        try:
-            bpy.ops.xqfa.vertex_groups_match_rename('EXEC_DEFAULT', mapping_name=mapping_name)
-        except Exception as e:
-            self.report({'WARNING'}, f"顶点组匹配重命名失败: {e}")
-
-        # 步骤4: 形态键匹配重命名 (E为源, A为目标)
-        if target_a.data.shape_keys and active_e.data.shape_keys:
-            try:
-                bpy.ops.xqfa.shape_keys_match_rename('EXEC_DEFAULT', mapping_name=mapping_name)
-            except Exception as e:
-                self.report({'WARNING'}, f"形态键匹配重命名失败: {e}")
+        # 步骤3/4: 顶点组、形态键匹配重命名 (E为源, A为目标)
+        self._match_names(context.scene, active_e, target_a, mapping_name, mapping_name, timings)
 
         # 步骤5: 不执行名称排序
 
         # 步骤6: 按材质分离 A (使用材质名作为物体名)
-        bpy.ops.object.select_all(action='DESELECT')
-        target_a.select_set(True)
-        context.view_layer.objects.active = target_a
+        t0 = time.perf_counter()
         try:
-            bpy.ops.xqfa.separate_by_material('EXEC_DEFAULT', naming_mode='MATERIAL')
+            separated_objs = separate_by_material(target_a, naming_mode='MATERIAL')
         except Exception as e:
             self.report({'WARNING'}, f"按材质分离失败: {e}")
-
-        separated_objs = context.selected_objects
+            separated_objs = [target_a]
+        timings['separate'] = time.perf_counter() - t0
 
         # 步骤7: 添加骨架
+        t0 = time.perf_counter()
         self._add_armature(context, separated_objs, active_e)
+        timings['armature'] = time.perf_counter() - t0
 
-        self.report({'INFO'}, "合并模式完成")
+        self._report_timings("合并模式完成", timings)
         return {'FINISHED'}
 
     def _match_materials_merge(self, obj_a, obj_e):
-        """合并模式：按材质顶点数匹配A和E的材质，重命名A的材质，E使用A的材质"""
-        # 统计A和E每个材质的顶点数
-        a_mat_verts = self._count_vertices_per_material(obj_a)
-        e_mat_verts = self._count_vertices_per_material(obj_e)
+        """合并模式：按材质签名匹配A和E的材质，重命名A的材质，E使用A的材质"""
+        # 统计A和E每个材质的顶点数、面数、面积、UV范围
+        a_stats = material_statistics(obj_a)
+        e_stats = material_statistics(obj_e)
 
         # 查找E材质名的公共前缀并去除
         e_mat_names = [mat.name for mat in obj_e.data.materials if mat]
         common_prefix = self._find_common_prefix(e_mat_names)
 
-        # 按顶点数匹配
-        used_e_indices = set()
-        for a_idx, a_mat in enumerate(obj_a.data.materials):
-            if a_mat is None:
-                continue
-            a_count = a_mat_verts.get(a_idx, 0)
-            for e_idx, e_mat in enumerate(obj_e.data.materials):
-                if e_mat is None or e_idx in used_e_indices:
-                    continue
-                e_count = e_mat_verts.get(e_idx, 0)
-                if a_count == e_count and a_count > 0:
-                    # 获取E材质名去除前缀后的后缀
-                    suffix = e_mat.name[len(common_prefix):] if e_mat.name.startswith(common_prefix) else e_mat.name
-                    # 重命名A的材质
-                    a_mat.name = f"{a_mat.name} {suffix}"
-                    # E的对应材质槽直接使用A的材质
-                    obj_e.material_slots[e_idx].material = a_mat
-                    used_e_indices.add(e_idx)
-                    break
+        a_materials = list(obj_a.data.materials)
+        e_materials = list(obj_e.data.materials)
+        a_slots = [i for i, mat in enumerate(a_materials) if mat and a_stats['verts'][i] > 0]
+        e_slots = [i for i, mat in enumerate(e_materials) if mat and e_stats['verts'][i] > 0]
+
+        matches = match_material_signatures(a_stats, e_stats, a_slots, e_slots, self.material_tolerance)
+        matches.sort()
+
+        print(f"\n材质匹配 (A: {obj_a.name}, E: {obj_e.name}, 容差 {self.material_tolerance:.2f}):")
+        for a_idx, e_idx, kind in matches:
+            a_mat = a_materials[a_idx]
+            e_mat = e_materials[e_idx]
+            print(f"  {a_mat.name} ({a_stats['verts'][a_idx]}) ↔ {e_mat.name} ({e_stats['verts'][e_idx]}) "
+                  f"{'精确' if kind == 'EXACT' else '近似'}")
+            # 获取E材质名去除前缀后的后缀
+            suffix = e_mat.name[len(common_prefix):] if e_mat.name.startswith(common_prefix) else e_mat.name
+            # 重命名A的材质
+            a_mat.name = f"{a_mat.name} {suffix}"
+            # E的对应材质槽直接使用A的材质
+            obj_e.material_slots[e_idx].material = a_mat
 
     # ========== 分离模式 ==========
 
@@ -1059,30 +1246,28 @@ class XQFA_OT_SyncExtractUnpack(bpy.types.Operator):
             self.report({'ERROR'}, "请选择除活动物体外的至少一个网格物体")
             return {'CANCELLED'}
 
+        timings = {}
+
         # 计算映射名称前缀
         prefix = self._get_mapping_name(active_e.name)
 
         # 步骤1: 去除E材质名的公共前缀
+        t0 = time.perf_counter()
         e_mat_names = [mat.name for mat in active_e.data.materials if mat]
         common_prefix = self._find_common_prefix(e_mat_names)
         for mat in active_e.data.materials:
             if mat and mat.name.startswith(common_prefix):
                 mat.name = mat.name[len(common_prefix):]
+        timings['materials'] = time.perf_counter() - t0
 
-        # 步骤2: 复制E为F，按材质分离F
-        bpy.ops.object.select_all(action='DESELECT')
-        active_e.select_set(True)
-        context.view_layer.objects.active = active_e
-        bpy.ops.object.duplicate()
-        obj_f = context.selected_objects[0]
-
+        # 步骤2: 从E的网格数据直接按材质生成临时物体（不复制E，也不链接到场景）
+        t0 = time.perf_counter()
         try:
-            bpy.ops.xqfa.separate_by_material('EXEC_DEFAULT', naming_mode='MATERIAL')
+            separated_e_objs = separate_by_material(active_e, naming_mode='MATERIAL', in_place=False)
         except Exception as e:
             self.report({'WARNING'}, f"按材质分离失败: {e}")
             return {'CANCELLED'}
-
-        separated_e_objs = [obj for obj in context.selected_objects if obj.type == 'MESH']
+        timings['separate'] = time.perf_counter() - t0
 
         # 步骤3: 按物体顶点数匹配 A B C 和 分离物体
         others_vert_counts = {obj: len(obj.data.vertices) for obj in selected_others}
@@ -1103,6 +1288,7 @@ class XQFA_OT_SyncExtractUnpack(bpy.types.Operator):
             part_name = sep_obj.name  # 如 "Bangs"
 
             # 重命名 other 的材质（添加后缀），物体也同时添加后缀重命名
+            t0 = time.perf_counter()
             for mat in other_obj.data.materials:
                 if mat:
                     mat.name = f"{mat.name} {part_name}"
@@ -1115,50 +1301,39 @@ class XQFA_OT_SyncExtractUnpack(bpy.types.Operator):
                     if other_obj.data.materials and other_obj.data.materials[0]:
                         active_e.data.materials[i] = other_obj.data.materials[0]
                     break
+            timings['materials'] += time.perf_counter() - t0
 
-            # 步骤3a: 顶点组匹配重命名 (sep_obj为源, other为目标)
+            # 步骤3a: 顶点组、形态键匹配重命名 (sep_obj为源, other为目标)
             vg_mapping_name = prefix + part_name
-            bpy.ops.object.select_all(action='DESELECT')
-            sep_obj.select_set(True)
-            other_obj.select_set(True)
-            context.view_layer.objects.active = other_obj
-            try:
-                bpy.ops.xqfa.vertex_groups_match_rename('EXEC_DEFAULT', mapping_name=vg_mapping_name)
-            except Exception as e:
-                self.report({'WARNING'}, f"顶点组匹配重命名失败 ({part_name}): {e}")
-
-            # 形态键匹配重命名
-            if other_obj.data.shape_keys and sep_obj.data.shape_keys:
-                sk_mapping_name = vg_mapping_name + "_形态键"
-                try:
-                    bpy.ops.xqfa.shape_keys_match_rename('EXEC_DEFAULT', mapping_name=sk_mapping_name)
-                except Exception as e:
-                    self.report({'WARNING'}, f"形态键匹配重命名失败 ({part_name}): {e}")
+            self._match_names(context.scene, sep_obj, other_obj, vg_mapping_name, vg_mapping_name + "_形态键",
+                              timings, label=part_name)
 
         # 步骤4: 不执行名称排序
 
         # 步骤5: 为 A B C 添加骨架
+        t0 = time.perf_counter()
         self._add_armature(context, selected_others, active_e)
+        timings['armature'] = time.perf_counter() - t0
 
         # 清理临时分离物体
-        bpy.ops.object.select_all(action='DESELECT')
-        for sep_obj in separated_e_objs:
-            sep_obj.select_set(True)
-        bpy.ops.object.delete()
+        t0 = time.perf_counter()
+        remove_objects(separated_e_objs)
+        timings['cleanup'] = time.perf_counter() - t0
 
-        self.report({'INFO'}, "分离模式完成")
+        self._report_timings("分离模式完成", timings)
         return {'FINISHED'}
 
 classes = (
     DATA_PT_vertex_group_tools,
-    XqfaVertexGroupPairItem,
     XqfaVertexGroupMappingItem,
-    VGPairList,
     O_VertexGroupMappingRemove,
     O_VertexGroupMappingApply,
     O_VertexGroupMappingReorder,
     O_VertexGroupsDelAllSelected,
     O_VertexGroupsCleanZeroWeight,
+    O_VertexGroupsConditionForExport,
+    O_VertexGroupsMirror,
+    O_VertexGroupsTransferWeights,
     O_VertexGroupsDelNoneSelected,
     O_VertexGroupsMatchRename,
     O_VertexGroupsSortMatch,
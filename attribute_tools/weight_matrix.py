@@ -0,0 +1,653 @@
+# type: ignore
+import bpy
+import numpy as np
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+def get_world_coords(obj: bpy.types.Object) -> np.ndarray:
+    """获取物体所有顶点的全局坐标 (V x 3, float64)"""
+    mesh = obj.data
+    num_verts = len(mesh.vertices)
+    verts_co = np.empty(num_verts * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', verts_co)
+    verts_co = verts_co.reshape(-1, 3).astype(np.float64)
+
+    matrix = np.array(obj.matrix_world)
+    # V_global = V_local @ R.T + T
+    return verts_co @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def expand_ranges(starts: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """把若干 [start, start + size) 区间展开为一个连续的索引数组"""
+    sizes = np.asarray(sizes, dtype=np.int64)
+    total = int(sizes.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.cumsum(sizes) - sizes
+    return np.arange(total, dtype=np.int64) - np.repeat(offsets - np.asarray(starts, dtype=np.int64), sizes)
+
+
+class VertexWeightMatrix:
+    """
+    顶点权重稀疏矩阵（CSR 布局），一次性从网格中提取所有顶点组权重。
+
+    - indptr:    (V+1,)  第 v 个顶点的条目范围为 indptr[v]:indptr[v+1]
+    - vert_idx:  (nnz,)  每个条目所属的顶点索引
+    - group_idx: (nnz,)  每个条目所属的顶点组索引
+    - weights:   (nnz,)  float32 权重
+
+    Blender 没有批量读取顶点组权重的接口，提取时仍需遍历一次 vert.groups，
+    但之后所有查询（中心点、非空组、计数、组→顶点列表）都在 NumPy 上向量化完成。
+    """
+
+    def __init__(self,
+                 indptr: np.ndarray,
+                 group_idx: np.ndarray,
+                 weights: np.ndarray,
+                 group_names: List[str]):
+        self.indptr = indptr
+        self.group_idx = group_idx
+        self.weights = weights
+        self.group_names = group_names
+        self.num_verts = len(indptr) - 1
+        self.num_groups = len(group_names)
+        # 每个条目对应的顶点索引（由 indptr 展开）
+        self.vert_idx = np.repeat(
+            np.arange(self.num_verts, dtype=np.int32),
+            np.diff(indptr).astype(np.int64)
+        )
+        # 按组排序的缓存（CSC 视图），首次按组查询时构建
+        self._group_order: Optional[np.ndarray] = None
+        self._group_ptr: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_object(cls, obj: bpy.types.Object) -> "VertexWeightMatrix":
+        """从网格物体提取权重（单次遍历，不访问顶点组名称）"""
+        mesh = obj.data
+        group_names = [vg.name for vg in obj.vertex_groups]
+        num_verts = len(mesh.vertices)
+
+        counts = np.zeros(num_verts, dtype=np.int64)
+        group_list: List[int] = []
+        weight_list: List[float] = []
+
+        if group_names:
+            append_group = group_list.append
+            append_weight = weight_list.append
+            for i, vert in enumerate(mesh.vertices):
+                groups = vert.groups
+                counts[i] = len(groups)
+                for g in groups:
+                    append_group(g.group)
+                    append_weight(g.weight)
+
+        indptr = np.zeros(num_verts + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        return cls(
+            indptr,
+            np.array(group_list, dtype=np.int32),
+            np.array(weight_list, dtype=np.float32),
+            group_names,
+        )
+
+    @property
+    def nnz(self) -> int:
+        return len(self.weights)
+
+    def name_to_index(self) -> Dict[str, int]:
+        """顶点组名称 → 索引"""
+        return {name: i for i, name in enumerate(self.group_names)}
+
+    # ========== 向量化查询 ==========
+
+    def _entry_mask(self, min_weight: Optional[float]) -> Optional[np.ndarray]:
+        if min_weight is None:
+            return None
+        return self.weights > min_weight
+
+    def group_vertex_counts(self, min_weight: Optional[float] = None) -> np.ndarray:
+        """每个顶点组包含的顶点数 (G,)；min_weight 为 None 时统计所有条目（含 0 权重）"""
+        mask = self._entry_mask(min_weight)
+        groups = self.group_idx if mask is None else self.group_idx[mask]
+        return np.bincount(groups, minlength=self.num_groups)[:self.num_groups]
+
+    def group_total_weights(self) -> np.ndarray:
+        """每个顶点组的权重总和 (G,)"""
+        return np.bincount(self.group_idx, weights=self.weights, minlength=self.num_groups)[:self.num_groups]
+
+    def nonempty_mask(self, min_weight: Optional[float] = None) -> np.ndarray:
+        """非空顶点组掩码 (G,) bool"""
+        return self.group_vertex_counts(min_weight) > 0
+
+    def group_centroids(self, coords: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        每个顶点组的加权中心点。
+        返回 (centroids (G x 3), valid (G,))，权重和为 0 的组 valid 为 False。
+        """
+        totals = self.group_total_weights()
+        centroids = np.zeros((self.num_groups, 3), dtype=np.float64)
+        if self.nnz:
+            weighted = coords[self.vert_idx] * self.weights[:, None]
+            for axis in range(3):
+                centroids[:, axis] = np.bincount(
+                    self.group_idx, weights=weighted[:, axis], minlength=self.num_groups
+                )[:self.num_groups]
+        valid = totals > 0
+        centroids[valid] /= totals[valid, None]
+        return centroids, valid
+
+    def centroids_by_name(self, coords: np.ndarray) -> Dict[str, np.ndarray]:
+        """非空顶点组的 名称 → 中心点"""
+        centroids, valid = self.group_centroids(coords)
+        return {self.group_names[g]: centroids[g] for g in np.flatnonzero(valid)}
+
+    def _ensure_group_order(self) -> None:
+        if self._group_order is not None:
+            return
+        self._group_order = np.argsort(self.group_idx, kind='stable')
+        counts = np.bincount(self.group_idx, minlength=self.num_groups)[:self.num_groups]
+        self._group_ptr = np.zeros(self.num_groups + 1, dtype=np.int64)
+        np.cumsum(counts, out=self._group_ptr[1:])
+
+    def group_entries(self, group_index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """某个顶点组的 (顶点索引, 权重)"""
+        self._ensure_group_order()
+        start, end = self._group_ptr[group_index], self._group_ptr[group_index + 1]
+        entries = self._group_order[start:end]
+        return self.vert_idx[entries], self.weights[entries]
+
+    def group_vertices(self, group_index: int) -> np.ndarray:
+        """某个顶点组包含的顶点索引"""
+        return self.group_entries(group_index)[0]
+
+    def group_descriptors(self, coords: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        一次遍历权重矩阵，计算每个非空顶点组（权重 > 0）的多特征描述符：
+        - centroid:     (N, 3) 加权中心点
+        - axis:         (N, 3) 加权协方差的主轴方向
+        - extents:      (N, 3) 协方差特征值开方（升序），即各主方向上的分布半径
+        - bbox_min/max: (N, 3) 包围盒
+        - total_weight: (N,)   权重总和
+        - count:        (N,)   顶点数
+        另附 names（组名称列表）与 group_index（在原矩阵中的组索引）。
+        """
+        keep = self.weights > 0
+        groups = self.group_idx[keep]
+        weights = self.weights[keep].astype(np.float64)
+        points = coords[self.vert_idx[keep]]
+        num_groups = self.num_groups
+
+        totals = np.bincount(groups, weights=weights, minlength=num_groups)[:num_groups]
+        counts = np.bincount(groups, minlength=num_groups)[:num_groups]
+        valid = totals > 0
+        safe_totals = np.where(valid, totals, 1.0)
+
+        centroid = np.zeros((num_groups, 3))
+        for axis in range(3):
+            centroid[:, axis] = np.bincount(groups, weights=weights * points[:, axis], minlength=num_groups)[:num_groups]
+        centroid /= safe_totals[:, None]
+
+        # 以中心点为原点累加协方差，避免大坐标下的数值抵消
+        diff = points - centroid[groups]
+        cov = np.zeros((num_groups, 3, 3))
+        for i in range(3):
+            for j in range(i, 3):
+                value = np.bincount(groups, weights=weights * diff[:, i] * diff[:, j], minlength=num_groups)[:num_groups]
+                cov[:, i, j] = value
+                cov[:, j, i] = value
+        cov /= safe_totals[:, None, None]
+        eigvals, eigvecs = np.linalg.eigh(cov)
+
+        bbox_min = np.full((num_groups, 3), np.inf)
+        bbox_max = np.full((num_groups, 3), -np.inf)
+        np.minimum.at(bbox_min, groups, points)
+        np.maximum.at(bbox_max, groups, points)
+
+        index = np.flatnonzero(valid)
+        return {
+            'names': [self.group_names[g] for g in index],
+            'group_index': index,
+            'centroid': centroid[index],
+            'axis': eigvecs[index, :, -1],
+            'extents': np.sqrt(np.maximum(eigvals[index], 0.0)),
+            'bbox_min': bbox_min[index],
+            'bbox_max': bbox_max[index],
+            'total_weight': totals[index],
+            'count': counts[index].astype(np.float64),
+        }
+
+    # ========== 重映射与写回 ==========
+
+    def _select_entries(self, keep: np.ndarray, group_idx: np.ndarray, group_names: List[str]) -> "VertexWeightMatrix":
+        """按条目掩码构造新矩阵（vert_idx 已按顶点有序，过滤后仍保持 CSR 顺序）"""
+        counts = np.bincount(self.vert_idx[keep], minlength=self.num_verts)[:self.num_verts]
+        indptr = np.zeros(self.num_verts + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return VertexWeightMatrix(indptr, group_idx[keep].astype(np.int32), self.weights[keep], list(group_names))
+
+    def remap_groups(self, old_to_new: np.ndarray, new_names: List[str]) -> "VertexWeightMatrix":
+        """
+        通过一次索引重映射置换顶点组。
+        old_to_new[g] 为旧组 g 在新顺序中的索引，-1 表示丢弃该组的所有条目。
+        """
+        new_groups = old_to_new[self.group_idx] if self.nnz else self.group_idx
+        return self._select_entries(new_groups >= 0, new_groups, new_names)
+
+    def select_vertices(self, verts: np.ndarray) -> "VertexWeightMatrix":
+        """按顶点取子矩阵，新矩阵的第 i 个顶点对应 verts[i]"""
+        starts = self.indptr[verts]
+        sizes = self.indptr[np.asarray(verts) + 1] - starts
+        entries = expand_ranges(starts, sizes)
+        indptr = np.zeros(len(verts) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=indptr[1:])
+        return VertexWeightMatrix(indptr, self.group_idx[entries], self.weights[entries], list(self.group_names))
+
+    @classmethod
+    def from_entries(cls,
+                     num_verts: int,
+                     vert_idx: np.ndarray,
+                     group_idx: np.ndarray,
+                     weights: np.ndarray,
+                     group_names: List[str]) -> "VertexWeightMatrix":
+        """由 (顶点, 组, 权重) 条目构造矩阵；同一 (顶点, 组) 出现多次时保留第一个"""
+        vert_idx = np.asarray(vert_idx, dtype=np.int64)
+        group_idx = np.asarray(group_idx, dtype=np.int64)
+        keys = vert_idx * max(len(group_names), 1) + group_idx
+        _keys, first = np.unique(keys, return_index=True)    # 按 (顶点, 组) 排序
+        counts = np.bincount(vert_idx[first], minlength=num_verts)[:num_verts]
+        indptr = np.zeros(num_verts + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(indptr, group_idx[first].astype(np.int32), np.asarray(weights, dtype=np.float32)[first],
+                   list(group_names))
+
+    def interpolated(self, corners: np.ndarray, factors: np.ndarray) -> "VertexWeightMatrix":
+        """
+        按插值系数混合若干源顶点的权重得到新矩阵（如按重心坐标插值）：
+        新顶点 i 的权重 = Σ_k factors[i, k] * W[corners[i, k]]
+        """
+        num = len(corners)
+        k = corners.shape[1]
+        src = corners.reshape(-1).astype(np.int64)
+        dst = np.repeat(np.arange(num, dtype=np.int64), k)
+        fac = factors.reshape(-1)
+        nonzero = fac > 0.0
+        src, dst, fac = src[nonzero], dst[nonzero], fac[nonzero]
+
+        starts = self.indptr[src]
+        sizes = self.indptr[src + 1] - starts
+        entries = expand_ranges(starts, sizes)
+        dst = np.repeat(dst, sizes)
+        values = self.weights[entries] * np.repeat(fac, sizes)
+
+        num_groups = max(self.num_groups, 1)
+        keys, inverse = np.unique(dst * num_groups + self.group_idx[entries], return_inverse=True)
+        summed = np.bincount(inverse.reshape(-1), weights=values, minlength=len(keys))
+        return VertexWeightMatrix.from_entries(num, keys // num_groups, keys % num_groups, summed, self.group_names)
+
+    @classmethod
+    def concatenate(cls, matrices: List["VertexWeightMatrix"]) -> "VertexWeightMatrix":
+        """按顶点顺序拼接多个矩阵，同名顶点组合并为一组"""
+        names: List[str] = []
+        name_index: Dict[str, int] = {}
+        indptr_parts = [np.zeros(1, dtype=np.int64)]
+        group_parts = []
+        weight_parts = []
+        offset = 0
+        for m in matrices:
+            for name in m.group_names:
+                if name not in name_index:
+                    name_index[name] = len(names)
+                    names.append(name)
+            old_to_new = np.array([name_index[name] for name in m.group_names], dtype=np.int32)
+            group_parts.append(old_to_new[m.group_idx] if m.nnz else m.group_idx)
+            weight_parts.append(m.weights)
+            indptr_parts.append(m.indptr[1:] + offset)
+            offset += m.nnz
+        return cls(
+            np.concatenate(indptr_parts),
+            np.concatenate(group_parts).astype(np.int32) if group_parts else np.zeros(0, dtype=np.int32),
+            np.concatenate(weight_parts).astype(np.float32) if weight_parts else np.zeros(0, dtype=np.float32),
+            names,
+        )
+
+    def filtered(self, min_weight: float) -> "VertexWeightMatrix":
+        """返回只保留 weight > min_weight 条目的新矩阵"""
+        return self._select_entries(self.weights > min_weight, self.group_idx, self.group_names)
+
+
+def add_group_weights(vg: bpy.types.VertexGroup, vert_indices: np.ndarray, weights: np.ndarray) -> int:
+    """
+    按相同权重值分批写入顶点组，每个不同的权重值只调用一次 vg.add。
+    返回 vg.add 的调用次数。
+    """
+    if len(vert_indices) == 0:
+        return 0
+    values, inverse = np.unique(weights, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(values)))[:-1]
+    for value, chunk in zip(values.tolist(), np.split(vert_indices[order], bounds)):
+        vg.add(chunk.tolist(), value, 'REPLACE')
+    return len(values)
+
+
+def _entries_by_group(matrix: VertexWeightMatrix, entries: np.ndarray):
+    """把条目索引按所属顶点组分组，逐组产出 (group_index, entries)"""
+    if len(entries) == 0:
+        return
+    groups = matrix.group_idx[entries]
+    order = np.argsort(groups, kind='stable')
+    entries, groups = entries[order], groups[order]
+    bounds = np.flatnonzero(np.diff(groups)) + 1
+    for chunk in np.split(entries, bounds):
+        yield int(matrix.group_idx[chunk[0]]), chunk
+
+
+def clean_vertex_groups(obj: bpy.types.Object,
+                        limit: float,
+                        remove_empty: bool = False,
+                        matrix: Optional[VertexWeightMatrix] = None) -> Dict[str, any]:
+    """
+    直接在数据层清理权重不大于 limit 的条目（等同 vertex_group_clean），不改变选择与活动物体。
+    锁定的顶点组不处理。每个受影响的顶点组只调用一次 vg.remove。
+    remove_empty 为 True 时，删除因清理而变空的顶点组。
+    返回 removed_entries / cleaned_groups / remove_calls / removed_groups（名称列表）。
+    """
+    if matrix is None:
+        matrix = VertexWeightMatrix.from_object(obj)
+    vgroups = obj.vertex_groups
+    result = {'removed_entries': 0, 'cleaned_groups': 0, 'remove_calls': 0, 'removed_groups': []}
+    if matrix.nnz == 0:
+        return result
+
+    locked = np.array([vg.lock_weight for vg in vgroups], dtype=bool)
+    remove = (matrix.weights <= limit) & ~locked[matrix.group_idx]
+    if not remove.any():
+        return result
+
+    remove_counts = np.bincount(matrix.group_idx[remove], minlength=matrix.num_groups)
+    touched = np.flatnonzero(remove_counts)
+    for g, entries in _entries_by_group(matrix, np.flatnonzero(remove)):
+        vgroups[g].remove(matrix.vert_idx[entries].tolist())
+
+    result['removed_entries'] = int(remove.sum())
+    result['cleaned_groups'] = len(touched)
+    result['remove_calls'] = len(touched)
+
+    if remove_empty:
+        emptied = touched[remove_counts[touched] == matrix.group_vertex_counts()[touched]]
+        # 从后往前删除，避免索引变化
+        for g in emptied[::-1].tolist():
+            vgroups.remove(vgroups[g])
+        result['removed_groups'] = [matrix.group_names[g] for g in emptied.tolist()]
+    return result
+
+
+def condition_weights(matrix: VertexWeightMatrix,
+                      active_groups: np.ndarray,
+                      max_influences: int,
+                      normalize: bool = True,
+                      bits: int = 8) -> Tuple[np.ndarray, np.ndarray, Dict[str, any]]:
+    """
+    导出游戏引擎前的权重整理（只处理 active_groups 为 True 的顶点组，其余条目保持不变）：
+    1. 每个顶点只保留权重最大的 max_influences 个影响
+    2. 归一化，使每个顶点的权重和为 1
+    3. 量化到 bits 位（8 位即 0..255），沿按权重降序的累积和取整（误差扩散），
+       保证每个顶点量化后的和恰好为 2^bits - 1
+    返回 (new_weights, keep, stats)，keep 为 False 的条目应从顶点组中移除。
+    """
+    new_weights = matrix.weights.astype(np.float64)
+    keep = np.ones(matrix.nnz, dtype=bool)
+    stats = {'over_limit': 0, 'changed_verts': 0, 'removed_entries': 0, 'max_error': 0.0}
+
+    entries = np.flatnonzero(active_groups[matrix.group_idx]) if matrix.nnz else np.zeros(0, dtype=np.int64)
+    if len(entries) == 0:
+        return new_weights.astype(np.float32), keep, stats
+
+    verts = matrix.vert_idx[entries]
+    old = new_weights[entries]
+    # 按 (顶点, 权重降序) 排序，同一顶点的条目连续
+    order = np.lexsort((-old, verts))
+    entries, verts, old = entries[order], verts[order], old[order]
+
+    counts = np.bincount(verts, minlength=matrix.num_verts)
+    starts = np.cumsum(counts) - counts
+    rank = np.arange(len(entries)) - starts[verts]
+    stats['over_limit'] = int(np.count_nonzero(counts > max_influences))
+
+    w = np.where((rank < max_influences) & (old > 0.0), old, 0.0)
+    if normalize:
+        totals = np.bincount(verts, weights=w, minlength=matrix.num_verts)
+        w = np.divide(w, totals[verts], out=w.copy(), where=totals[verts] > 0.0)
+
+    if bits > 0:
+        scale = float((1 << bits) - 1)
+        scaled = w * scale
+        # 顶点内的累积和：全局累积和减去该顶点之前的部分
+        cumulative = np.cumsum(scaled)
+        cumulative -= (cumulative - scaled)[starts[verts]]
+        quantized = np.rint(cumulative) - np.rint(cumulative - scaled)
+        quantized_w = quantized / scale
+        stats['max_error'] = float(np.abs(quantized_w - w).max())
+        w = quantized_w
+
+    new_weights[entries] = w
+    keep[entries] = w > 0.0
+    changed = (np.abs(w - old) > 1e-6) | (w <= 0.0)
+    stats['changed_verts'] = len(np.unique(verts[changed]))
+    stats['removed_entries'] = int(np.count_nonzero(w <= 0.0))
+    return new_weights.astype(np.float32), keep, stats
+
+
+def apply_weight_changes(obj: bpy.types.Object,
+                         matrix: VertexWeightMatrix,
+                         new_weights: np.ndarray,
+                         keep: np.ndarray) -> int:
+    """
+    把整理后的权重写回顶点组：只写入发生变化的条目。
+    移除的条目每组一次 vg.remove，修改的条目按权重值分批 vg.add。
+    返回 vg.add / vg.remove 的调用次数。
+    """
+    vgroups = obj.vertex_groups
+    calls = 0
+    for g, entries in _entries_by_group(matrix, np.flatnonzero(~keep)):
+        vgroups[g].remove(matrix.vert_idx[entries].tolist())
+        calls += 1
+    modified = np.flatnonzero(keep & (new_weights != matrix.weights))
+    for g, entries in _entries_by_group(matrix, modified):
+        calls += add_group_weights(vgroups[g], matrix.vert_idx[entries], new_weights[entries])
+    return calls
+
+
+def write_vertex_groups(obj: bpy.types.Object, matrix: VertexWeightMatrix) -> int:
+    """
+    清空物体的顶点组，并按 matrix.group_names 的顺序重建、写回权重。
+    保留同名组的锁定状态。返回 vg.add 的调用次数。
+    """
+    vgs = obj.vertex_groups
+    locked = {vg.name for vg in vgs if vg.lock_weight}
+    vgs.clear()
+
+    add_calls = 0
+    for g, name in enumerate(matrix.group_names):
+        new_vg = vgs.new(name=name)
+        verts, weights = matrix.group_entries(g)
+        add_calls += add_group_weights(new_vg, verts, weights)
+        if name in locked:
+            new_vg.lock_weight = True
+    return add_calls
+
+
+def replace_vertex_groups(obj: bpy.types.Object, matrix: VertexWeightMatrix, names: List[str]) -> int:
+    """
+    只替换 names 中的顶点组：已有的组原地清空后写回（保留位置与锁定状态），不存在的组新建；
+    其余顶点组与活动索引不受影响。返回 vg.add 的调用次数。
+    """
+    vgs = obj.vertex_groups
+    active_index = vgs.active_index
+    index = matrix.name_to_index()
+    all_verts = list(range(len(obj.data.vertices)))
+
+    add_calls = 0
+    for name in names:
+        vg = vgs.get(name)
+        if vg is None:
+            vg = vgs.new(name=name)
+        else:
+            vg.remove(all_verts)
+        verts, weights = matrix.group_entries(index[name])
+        add_calls += add_group_weights(vg, verts, weights)
+    if 0 <= active_index < len(vgs):
+        vgs.active_index = active_index
+    return add_calls
+
+
+def reorder_vertex_groups(obj: bpy.types.Object, desired_order: List[str]) -> Dict[str, any]:
+    """
+    按 desired_order 重排顶点组（保留权重）。
+    - desired_order 中已有数据的组：移动到对应位置
+    - desired_order 中不存在的组：新建空组
+    - 不在 desired_order 中但有权重的组：保留到末尾；无权重的多余组被丢弃
+    组的置换通过对权重矩阵做一次索引重映射完成，写回时按权重值分批调用 vg.add。
+    """
+    t0 = time.perf_counter()
+    matrix = VertexWeightMatrix.from_object(obj).filtered(0.0)
+    t1 = time.perf_counter()
+
+    original_names = matrix.group_names
+    has_data = matrix.nonempty_mask()
+    name_index = matrix.name_to_index()
+
+    new_names: List[str] = []
+    final_list: List[Tuple[str, str]] = []
+    used_names = set()
+    matched = 0
+    added = 0
+    for name in desired_order:
+        if name in used_names:
+            continue
+        used_names.add(name)
+        new_names.append(name)
+        g = name_index.get(name)
+        if g is not None and has_data[g]:
+            matched += 1
+            final_list.append((name, '已匹配/移动'))
+        else:
+            added += 1
+            final_list.append((name, '新建空组'))
+
+    extra = 0
+    for g, name in enumerate(original_names):
+        if name in used_names or not has_data[g]:
+            continue
+        used_names.add(name)
+        new_names.append(name)
+        extra += 1
+        final_list.append((name, '多余/保留'))
+
+    new_index = {name: i for i, name in enumerate(new_names)}
+    old_to_new = np.array([new_index.get(name, -1) for name in original_names], dtype=np.int32)
+    remapped = matrix.remap_groups(old_to_new, new_names)
+    t2 = time.perf_counter()
+
+    add_calls = write_vertex_groups(obj, remapped)
+    t3 = time.perf_counter()
+
+    return {
+        'matched': matched,
+        'added': added,
+        'extra': extra,
+        'original_total': len(original_names),
+        'order_total': len(desired_order),
+        'final_list': final_list,
+        'add_calls': add_calls,
+        'timings': {
+            'extract': t1 - t0,
+            'remap': t2 - t1,
+            'write': t3 - t2,
+        },
+    }
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    """格式化阶段耗时，如 '提取 0.120s / 重映射 0.003s / 写回 0.050s'"""
+    labels = {
+        'extract': '提取',
+        'remap': '重映射',
+        'write': '写回',
+        'join': '合并',
+        'materials': '材质匹配',
+        'vertex_groups': '顶点组匹配',
+        'shape_keys': '形态键匹配',
+        'separate': '分离',
+        'armature': '骨架',
+        'cleanup': '清理',
+    }
+    return " / ".join(f"{labels.get(k, k)} {v:.3f}s" for k, v in timings.items())
+
+
+# 描述符距离的默认特征权重
+DEFAULT_FEATURE_WEIGHTS = {
+    'centroid': 1.0,
+    'shape': 0.5,
+    'axis': 0.5,
+    'bbox': 0.25,
+    'mass': 0.25,
+}
+
+
+def descriptor_distance(desc_b: Dict[str, np.ndarray],
+                        desc_a: Dict[str, np.ndarray],
+                        feature_weights: Dict[str, float],
+                        rows: Optional[np.ndarray] = None,
+                        cols: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    两组描述符之间的组合距离（长度单位），用于相似度 = 1 / (1 + 距离)。
+    - centroid: 中心点距离
+    - shape:    分布半径 (extents) 的差异
+    - axis:     主轴夹角 (1 - |cos|)，乘以两组的平均分布半径换算为长度
+    - bbox:     包围盒角点的平均偏移
+    - mass:     权重总和与顶点数的对数比，乘以平均分布半径
+    rows/cols 为 None 时返回 (N_b x N_a) 的稠密矩阵，否则只计算给定的配对 (E,)。
+    """
+    dense = rows is None
+    if dense:
+        rows, cols = np.indices((len(desc_b['names']), len(desc_a['names'])))
+        shape = rows.shape
+        rows, cols = rows.ravel(), cols.ravel()
+
+    def pair(key):
+        return desc_b[key][rows], desc_a[key][cols]
+
+    cb, ca = pair('centroid')
+    distance = feature_weights.get('centroid', 0.0) * np.linalg.norm(cb - ca, axis=1)
+
+    eb, ea = pair('extents')
+    scale = 0.5 * (np.linalg.norm(eb, axis=1) + np.linalg.norm(ea, axis=1))
+
+    w = feature_weights.get('shape', 0.0)
+    if w:
+        distance += w * np.linalg.norm(eb - ea, axis=1)
+
+    w = feature_weights.get('axis', 0.0)
+    if w:
+        ab, aa = pair('axis')
+        distance += w * scale * np.maximum(1.0 - np.abs(np.sum(ab * aa, axis=1)), 0.0)
+
+    w = feature_weights.get('bbox', 0.0)
+    if w:
+        minb, mina = pair('bbox_min')
+        maxb, maxa = pair('bbox_max')
+        distance += w * 0.5 * (np.linalg.norm(minb - mina, axis=1) + np.linalg.norm(maxb - maxa, axis=1))
+
+    w = feature_weights.get('mass', 0.0)
+    if w:
+        tb, ta = pair('total_weight')
+        nb, na = pair('count')
+        log_ratio = 0.5 * (np.abs(np.log(tb / ta)) + np.abs(np.log(nb / na)))
+        distance += w * scale * log_ratio
+
+    if dense:
+        distance = distance.reshape(shape)
+    return distance
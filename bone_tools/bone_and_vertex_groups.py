@@ -1,6 +1,7 @@
 # type: ignore
 import bpy 
 import re
+from ..attribute_tools.weight_matrix import VertexWeightMatrix
 
 ########################## Divider ##########################
 
@@ -92,20 +93,10 @@ class O_SelectWeightedBones(bpy.types.Operator):
         except:
             self.report({'ERROR'}, "似乎没有选择对象") 
             return {'FINISHED'}
-        # 创建一个字典来存储顶点组的信息
-        vertex_group_info = {}
-        for group in SourceMesh.vertex_groups:
-            vertex_group_info[group.name] = []
-
-        # 遍历每个顶点
-        for vertex in SourceMesh.data.vertices:
-            for group in vertex.groups: #遍历单个顶点的顶点组
-                group_index = group.group
-                group_name = SourceMesh.vertex_groups[group_index].name
-                weight = group.weight
-
-                # 将顶点和权重信息添加到字典中
-                vertex_group_info[group_name].append((vertex.index, weight))
+        # 一次性提取权重矩阵，得到有顶点的顶点组名称
+        matrix = VertexWeightMatrix.from_object(SourceMesh)
+        nonempty = matrix.nonempty_mask()
+        weighted_names = {name for name, used in zip(matrix.group_names, nonempty.tolist()) if used}
 
         bpy.ops.object.mode_set(mode='OBJECT')
         bpy.context.view_layer.objects.active = SourceArmature
@@ -113,7 +104,7 @@ class O_SelectWeightedBones(bpy.types.Operator):
         selected_count = 0
         for bone in SourceArmature.pose.bones:
             bone.bone.select = False
-            if bone.name in vertex_group_info and vertex_group_info[bone.name]:
+            if bone.name in weighted_names:
                 bone.bone.select = True
                 selected_count += 1
 